@@ -1,20 +1,18 @@
+import sys
 import cv2
-import torch
-from ultralytics import YOLO
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox
 from PIL import Image, ImageTk
 from pathlib import Path
 from datetime import datetime
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.colors import HexColor
-from reportlab.lib.utils import ImageReader
-import tempfile
-import os
+
+# models, scoring and the PDF renderer are shared with the web app
+REPO = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO))
+from aesthetic_engine import (  # noqa: E402
+    AestheticEngine, COLOR_MAP, generate_pdf, register_pdf_font,
+)
 
 # ------------ Configuration ------------
 BTN_BG = "#003366"
@@ -22,46 +20,6 @@ BTN_SELECTED = "#002244"
 BTN_HOVER = "#004080"
 BTN_TEXT = "#e6f2ff"
 
-COLOR_MAP = {
-    "Acne": (0, 0, 255),
-    "Blackheads": (0, 255, 0),
-    "Dark Circles": (255, 0, 0),
-    "Pigmentation": (0, 255, 255),
-    "Wrinkles": (255, 0, 255),
-    "Pore": (255, 255, 0),
-    "Redness": (255, 165, 0),
-}
-THRESHOLDS = {"Acne":0.6, "Blackheads":0.5, "Dark Circles":0.5,
-              "Pigmentation":0.5, "Wrinkles":0.4, "Pore":0.6, "Redness":0.6}
-DROP = {"Acne":9, "Blackheads":8, "Dark Circles":14,
-        "Pigmentation":23, "Wrinkles":18, "Pore":17, "Redness":27}
-EXPLANATIONS = {
-    "Acne":"Acne is caused by clogged pores, bacteria, and excess oil production.",
-    "Blackheads":"Blackheads form when pores are partially clogged with oil and dead skin cells.",
-    "Dark Circles":"Dark circles can be due to genetics, thin under-eye skin, or hyperpigmentation.",
-    "Pigmentation":"Pigmentation irregularities arise from melanin overproduction, triggered by sun exposure.",
-    "Wrinkles":"Wrinkles develop from loss of collagen and elastin over time.",
-    "Pore":"Enlarged pores result from genetics, oiliness, and loss of skin elasticity.",
-    "Redness":"Redness can be caused by irritation, inflammation, or vascular issues.",
-}
-SUGGESTIONS = {
-    "Acne":"Use a gentle salicylic acid wash and consult a dermatologist.",
-    "Blackheads":"Try chemical exfoliation with BHA (salicylic acid).",
-    "Dark Circles":"Ensure sufficient sleep and use cold compresses.",
-    "Pigmentation":"Apply daily SPF 30+ and use topical lightening agents.",
-    "Wrinkles":"Incorporate retinoids at night and protect skin from UV.",
-    "Pore":"Use clay masks weekly and oil-control primers.",
-    "Redness":"Choose fragrance-free, soothing products.",
-}
-
-# Determine quality label
-def quality_label(pct):
-    if pct > 80:
-        return "Good"
-    elif pct >= 40:
-        return "Neutral"
-    else:
-        return "Poor"
 # ---------------------------------------
 
 class App(ctk.CTk):
@@ -71,24 +29,18 @@ class App(ctk.CTk):
         self.geometry("900x700")
 
         # Register custom font for PDF
-        repo = Path(__file__).resolve().parents[2]
-        font_path = repo / "Fonts/League_Spartan/static/LeagueSpartan-SemiBold.ttf"
-        pdfmetrics.registerFont(TTFont("LeagueSpartan", str(font_path)))
+        register_pdf_font(REPO / "Fonts/League_Spartan/static/LeagueSpartan-SemiBold.ttf")
 
         # Load models
-        models_dir = repo / "Modeller" / "Medical Aesthetic"
-        file_names = {
-            "Acne":"acne.pt","Blackheads":"Blackheads.pt","Dark Circles":"Dark Circles.pt",
-            "Pigmentation":"Pigmentation.pt","Wrinkles":"Wrinkles.pt","Pore":"pore.pt","Redness":"redness.pt"
-        }
-        self.models = {name: YOLO(str(models_dir / fname)) for name, fname in file_names.items()}
-        self.current_model = next(iter(self.models))
+        self.engine = AestheticEngine(REPO / "Modeller" / "Medical Aesthetic")
+        self.engine.preload()
+        self.current_model = self.engine.names[0]
 
         # Control panel
         ctrl = ctk.CTkFrame(self)
         ctrl.pack(side="top", fill="x", pady=5)
         self.buttons = {}
-        for name in self.models:
+        for name in self.engine.names:
             btn = ctk.CTkButton(
                 ctrl, text=name, width=120,
                 fg_color=BTN_BG, hover_color=BTN_HOVER, text_color=BTN_TEXT,
@@ -126,9 +78,8 @@ class App(ctk.CTk):
         ret, frame = self.cap.read()
         if ret:
             vis = frame.copy()
-            results = self.models[self.current_model](frame, conf=THRESHOLDS[self.current_model])[0]
-            for box in results.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
+            boxes = self.engine.detect(frame, [self.current_model])[self.current_model]
+            for x1, y1, x2, y2 in boxes.astype(int):
                 cv2.rectangle(vis, (x1, y1), (x2, y2), COLOR_MAP[self.current_model], 2)
                 cv2.putText(vis, self.current_model, (x1, y1 - 5),
                             cv2.FONT_HERSHEY_SIMPLEX, 0.5, COLOR_MAP[self.current_model], 1)
@@ -142,18 +93,9 @@ class App(ctk.CTk):
         ret, frame = self.cap.read()
         if not ret:
             return
-        annotated = frame.copy()
-        report_data = []
         # Process every model
-        for name, model in self.models.items():
-            results = model(frame, conf=THRESHOLDS[name])[0]
-            count = len(results.boxes)
-            pct = max(0, 100 - DROP[name] * count)
-            for box in results.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                cv2.rectangle(annotated, (x1, y1), (x2, y2), COLOR_MAP[name], 2)
-            quality = quality_label(pct)
-            report_data.append((name, quality, EXPLANATIONS[name], SUGGESTIONS[name]))
+        analysis = self.engine.analyze(frame)
+        annotated, report_data = analysis["annotated"], analysis["items"]
 
         # Pop-up report
         popup = ctk.CTkToplevel(self)
@@ -180,7 +122,8 @@ class App(ctk.CTk):
         scrollbar.pack(side="right", fill="y")
 
         # Populate report sections
-        for name, quality, expl, sugg in report_data:
+        for item in report_data:
+            name, quality, expl, sugg = item["name"], item["quality"], item["explanation"], item["suggestion"]
             tk.Label(frame, text=f"{name} - {quality}", font=(None, 14, 'bold')).pack(anchor='w', padx=20)
             tk.Label(frame, height=1).pack()
             bar = ctk.CTkProgressBar(frame, width=600, fg_color="#cccccc", progress_color=BTN_BG)
@@ -204,43 +147,7 @@ class App(ctk.CTk):
     def generate_pdf(self, image, data):
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         pdf_path = Path.cwd() / f"Report_{ts}.pdf"
-        # Save annotated image
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-        cv2.imwrite(tmp.name, image)
-        c = canvas.Canvas(str(pdf_path), pagesize=A4)
-        w, h = A4
-        img_w, img_h = 400, 300
-        x, y = (w - img_w) / 2, h - img_h - 50
-        # Draw image once at top of first page
-        c.drawImage(ImageReader(tmp.name), x, y, img_w, img_h)
-        # Draw each model sequentially below
-        text_y = y - 30
-        for name, quality, expl, sugg in data:
-            # Draw header
-            c.setFont("LeagueSpartan", 12)
-            c.drawString(50, text_y, f"{name} - {quality}")
-            text_y -= 20
-            # Draw bar
-            frac = {'Good':1.0, 'Neutral':0.6, 'Poor':0.2}[quality]
-            bar_len = frac * (w - 100)
-            c.setFillColor(HexColor(BTN_BG))
-            c.rect(50, text_y - 10, bar_len, 15, fill=1, stroke=0)
-            text_y -= 30
-            # Draw explanation and suggestion
-            c.setFillColor(HexColor("#000000"))
-            c.setFont("LeagueSpartan", 10)
-            c.drawString(50, text_y, f"Explanation: {expl}")
-            text_y -= 18
-            c.drawString(50, text_y, f"Suggestion: {sugg}")
-            text_y -= 30
-            # Check if we need a new page
-            if text_y < 80:
-                c.showPage()
-                c.drawImage(ImageReader(tmp.name), x, y, img_w, img_h)
-                text_y = y - 30
-        c.save()
-        tmp.close()
-        os.unlink(tmp.name)
+        generate_pdf(image, pdf_path, data)
         messagebox.showinfo("Saved", f"PDF saved as {pdf_path}")
 
     def on_closing(self):
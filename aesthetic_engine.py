@@ -0,0 +1,660 @@
+"""
+Aesthetic analysis engine shared by the web routes (aesthetic_routes.py) and
+the desktop app (Medikal Estetik/Aesthetic Detector).
+
+AestheticEngine owns the seven condition detectors (or one merged
+multi-class model), the shared preprocessing, concurrent inference, scoring
+with THRESHOLDS / DROP and the PNG / PDF renderers, so caching, concurrency
+and timing live in one place. No FastAPI import: anything that can hand it a
+BGR frame can use it.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from ultralytics import YOLO
+
+from reportlab.pdfgen import canvas as pdf_canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.colors import HexColor
+from reportlab.lib.utils import ImageReader
+
+# COLOR_MAP / DROP live next to the code that draws and scores with them
+from aesthetic_postprocess import COLOR_MAP, DROP, as_xyxy, draw_detections, nms, score_counts
+
+try:
+    import mediapipe as mp
+except ImportError:  # optional: face ROI falls back to OpenCV's Haar cascade
+    mp = None
+
+log = logging.getLogger(__name__)
+
+# -------------------------------------------------------------------
+#  CONFIG
+# -------------------------------------------------------------------
+
+BTN_BG = "#003366"
+
+THRESHOLDS = {
+    "Acne": 0.6,
+    "Blackheads": 0.5,
+    "Dark Circles": 0.5,
+    "Pigmentation": 0.5,
+    "Wrinkles": 0.4,
+    "Pore": 0.6,
+    "Redness": 0.6,
+}
+EXPLANATIONS = {
+    "Acne": "Acne is caused by clogged pores, bacteria, and excess oil production.",
+    "Blackheads": "Blackheads form when pores are partially clogged with oil and dead skin cells.",
+    "Dark Circles": "Dark circles can be due to genetics, thin under-eye skin, or hyperpigmentation.",
+    "Pigmentation": "Pigmentation irregularities arise from melanin overproduction, triggered by sun exposure.",
+    "Wrinkles": "Wrinkles develop from loss of collagen and elastin over time.",
+    "Pore": "Enlarged pores result from genetics, oiliness, and loss of skin elasticity.",
+    "Redness": "Redness can be caused by irritation, inflammation, or vascular issues.",
+}
+SUGGESTIONS = {
+    "Acne": "Use a gentle salicylic acid wash and consult a dermatologist.",
+    "Blackheads": "Try chemical exfoliation with BHA (salicylic acid).",
+    "Dark Circles": "Ensure sufficient sleep and use cold compresses.",
+    "Pigmentation": "Apply daily SPF 30+ and use topical lightening agents.",
+    "Wrinkles": "Incorporate retinoids at night and protect skin from UV.",
+    "Pore": "Use clay masks weekly and oil-control primers.",
+    "Redness": "Choose fragrance-free, soothing products.",
+}
+
+FILE_NAMES = {
+    "Acne": "Acne.pt",
+    "Blackheads": "Blackheads.pt",
+    "Dark Circles": "Dark Circles.pt",
+    "Pigmentation": "Pigmentation.pt",
+    "Wrinkles": "Wrinkles.pt",
+    "Pore": "pore.pt",
+    "Redness": "redness.pt",
+}
+
+
+_FILE_HASHES: Dict[tuple, str] = {}
+
+
+def weights_sha256(path: Path) -> str:
+    """
+    SHA-256 of a weights file, memoized on (path, mtime, size) like main.py's
+    _file_sha256. An exported OpenVINO model is a directory: every file in it
+    is hashed in name order.
+    """
+    path = Path(path)
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    stats = [(str(p), p.stat().st_mtime_ns, p.stat().st_size) for p in files]
+    key = tuple(stats)
+    if key not in _FILE_HASHES:
+        h = hashlib.sha256()
+        for p in files:
+            with open(p, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+        _FILE_HASHES[key] = h.hexdigest()
+    return _FILE_HASHES[key]
+
+
+def quality_label(pct: float) -> str:
+    if pct > 80:
+        return "Good"
+    elif pct >= 40:
+        return "Neutral"
+    else:
+        return "Poor"
+
+
+def register_pdf_font(font_path: Path):
+    if font_path.exists() and "LeagueSpartan" not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont("LeagueSpartan", str(font_path)))
+
+
+# -------------------------------------------------------------------
+#  PREPROCESSING
+# -------------------------------------------------------------------
+
+def letterbox(frame: np.ndarray, size: int = 640, stride: int = 32):
+    """
+    Resize + pad like Ultralytics' own (auto=True) letterbox: the long side
+    becomes `size` and the short side is padded only up to a stride multiple,
+    so a 1280x720 frame becomes 640x384, not a 640x640 square. Returns
+    (canvas, ratio, pad_x, pad_y).
+    """
+    h, w = frame.shape[:2]
+    r = min(size / h, size / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    resized = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nh, nw) != (h, w) else frame
+    dw, dh = ((size - nw) % stride) / 2, ((size - nh) % stride) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    canvas = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return canvas, r, left, top
+
+
+def shared_tensor(frame: np.ndarray, size: int = 640):
+    """BGR frame -> 1x3xHxW RGB float tensor in [0, 1] that every model can consume as-is."""
+    canvas, r, left, top = letterbox(frame, size)
+    chw = np.ascontiguousarray(canvas[..., ::-1].transpose(2, 0, 1))
+    return torch.from_numpy(chw).float().div_(255.0).unsqueeze(0), (r, left, top)
+
+
+def _unletterbox(xyxy: np.ndarray, geometry, shape) -> np.ndarray:
+    r, left, top = geometry
+    out = xyxy.copy()
+    out[:, [0, 2]] = (out[:, [0, 2]] - left) / r
+    out[:, [1, 3]] = (out[:, [1, 3]] - top) / r
+    out[:, [0, 2]] = out[:, [0, 2]].clip(0, shape[1])
+    out[:, [1, 3]] = out[:, [1, 3]].clip(0, shape[0])
+    return out
+
+
+def tile_grid(shape, grid: int, overlap: float = 0.2):
+    """grid x grid overlapping tiles over an H x W image -> list of (x1, y1, x2, y2)."""
+    h, w = shape[:2]
+    tw, th = w / (grid - (grid - 1) * overlap), h / (grid - (grid - 1) * overlap)
+    sx, sy = tw * (1 - overlap), th * (1 - overlap)
+    tiles = []
+    for gy in range(grid):
+        for gx in range(grid):
+            x1, y1 = int(round(gx * sx)), int(round(gy * sy))
+            tiles.append((x1, y1, min(w, int(round(x1 + tw))), min(h, int(round(y1 + th)))))
+    return tiles
+
+
+# -------------------------------------------------------------------
+#  FACE ROI
+# -------------------------------------------------------------------
+
+_FACE_LOCK = threading.Lock()  # FaceMesh / CascadeClassifier are not thread-safe
+_FACE_MESH = None
+_HAAR = None
+
+
+def _face_box_mediapipe(frame: np.ndarray):
+    global _FACE_MESH
+    h, w = frame.shape[:2]
+    with _FACE_LOCK:
+        if _FACE_MESH is None:
+            _FACE_MESH = mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1)
+        res = _FACE_MESH.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    if not res.multi_face_landmarks:
+        return None
+    pts = np.array([(lm.x, lm.y) for lm in res.multi_face_landmarks[0].landmark], dtype=np.float32)
+    (x1, y1), (x2, y2) = pts.min(0) * (w, h), pts.max(0) * (w, h)
+    return x1, y1, x2, y2
+
+
+def _face_box_haar(frame: np.ndarray):
+    global _HAAR
+    if not hasattr(cv2, "CascadeClassifier"):  # OpenCV 5 moved the cascades out of cv2
+        return None
+    h, w = frame.shape[:2]
+    s = min(1.0, 640.0 / max(h, w))
+    gray = cv2.cvtColor(cv2.resize(frame, (int(w * s), int(h * s))) if s < 1 else frame, cv2.COLOR_BGR2GRAY)
+    with _FACE_LOCK:
+        if _HAAR is None:
+            _HAAR = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        faces = _HAAR.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(48, 48))
+    if len(faces) == 0:
+        return None
+    x, y, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+    # the cascade box stops at the brows; extend upwards to keep the forehead
+    return x / s, (y - 0.25 * fh) / s, (x + fw) / s, (y + fh) / s
+
+
+def find_face_roi(frame: np.ndarray, margin: float = 0.15):
+    """Face bounding box (int x1, y1, x2, y2) grown by `margin` per side, or None if no face."""
+    box = _face_box_mediapipe(frame) if mp is not None else _face_box_haar(frame)
+    if box is None:
+        return None
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = box
+    mx, my = (x2 - x1) * margin, (y2 - y1) * margin
+    x1, y1 = max(0, int(x1 - mx)), max(0, int(y1 - my))
+    x2, y2 = min(w, int(x2 + mx)), min(h, int(y2 + my))
+    if x2 - x1 < 32 or y2 - y1 < 32:
+        return None
+    return x1, y1, x2, y2
+
+
+# -------------------------------------------------------------------
+#  RENDERING
+# -------------------------------------------------------------------
+
+def generate_pdf(image, pdf_path, data):
+    """Annotated image (BGR array or file path) + text report -> PDF (path or file-like)."""
+    if not isinstance(image, np.ndarray):
+        image = cv2.imread(str(image))
+    # the in-memory array goes straight to ReportLab, no temp PNG
+    reader = ImageReader(Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+
+    c = pdf_canvas.Canvas(pdf_path if hasattr(pdf_path, "write") else str(pdf_path), pagesize=A4)
+    w, h = A4
+    img_w, img_h = 400, 300
+    x, y = (w - img_w) / 2, h - img_h - 50
+
+    c.drawImage(reader, x, y, img_w, img_h)
+
+    text_y = y - 30
+    for item in data:
+        name = item["name"]
+        quality = item["quality"]
+        expl = item["explanation"]
+        sugg = item["suggestion"]
+
+        font_name = (
+            "LeagueSpartan"
+            if "LeagueSpartan" in pdfmetrics.getRegisteredFontNames()
+            else "Helvetica"
+        )
+
+        c.setFont(font_name, 12)
+        c.setFillColor(HexColor("#000000"))
+        c.drawString(50, text_y, f"{name} - {quality}")
+        text_y -= 20
+
+        frac = {"Good": 1.0, "Neutral": 0.6, "Poor": 0.2}[quality]
+        bar_len = frac * (w - 100)
+        c.setFillColor(HexColor(BTN_BG))
+        c.rect(50, text_y - 10, bar_len, 15, fill=1, stroke=0)
+        text_y -= 30
+
+        c.setFillColor(HexColor("#000000"))
+        c.setFont(font_name, 10)
+        c.drawString(50, text_y, f"Explanation: {expl}")
+        text_y -= 18
+        c.drawString(50, text_y, f"Suggestion: {sugg}")
+        text_y -= 30
+
+        if text_y < 80:
+            c.showPage()
+            c.drawImage(reader, x, y, img_w, img_h)
+            text_y = y - 30
+
+    c.save()
+
+
+# -------------------------------------------------------------------
+#  ENGINE
+# -------------------------------------------------------------------
+
+class AestheticEngine:
+    """
+    Detect -> score -> render for one BGR frame.
+
+    The frame is letterboxed once (stride-aligned rectangle, pixel-identical
+    to Ultralytics' own preprocessing) and every detector runs on that shared
+    tensor. parallel=True runs the detectors concurrently (a thread pool sized
+    to the cores, one lock per model since Ultralytics predictors are not
+    thread-safe) and caps torch's intra-op threads at cores // workers so the
+    pool does not oversubscribe the CPU; `threads` overrides that cap (0 =
+    auto, or torch's default when sequential). merged_model=<path> uses a
+    single multi-class model whose class names are the condition names and
+    applies the per-class THRESHOLDS afterwards. Models load lazily on first
+    use (or all at once via preload / start_preload).
+
+    face_roi=True crops to the face (MediaPipe FaceMesh when installed, else
+    a Haar cascade) so the 640 px input is spent on skin, not background;
+    tiles=N additionally runs the small-lesion `tile_models` on an N x N grid
+    of overlapping tiles (one batched call) merged with NMS. Boxes are always
+    returned in original frame pixels.
+    """
+
+    def __init__(
+        self,
+        models_dir: Path,
+        variant: str = "fp32",
+        backend: str = "onnx",
+        imgsz: int = 640,
+        parallel: bool = True,
+        workers: int = 0,
+        threads: int = 0,
+        merged_model: str = "",
+        cache_size: int = 128,
+        face_roi: bool = False,
+        roi_margin: float = 0.15,
+        tiles: int = 1,
+        tile_models: Iterable[str] = ("Pore", "Blackheads"),
+    ):
+        self.models_dir = Path(models_dir)
+        self.variant = variant
+        self.backend = backend
+        self.imgsz = imgsz
+        self.parallel = parallel
+        self.merged_model_path = merged_model
+        self.face_roi = face_roi
+        self.roi_margin = roi_margin
+        self.tiles = max(1, tiles)
+        self.tile_models = set(tile_models)
+        self.names = list(FILE_NAMES)
+        # loaded lazily on first use (or by preload); nothing touches disk here
+        self.models: Dict[str, YOLO] = {}
+        self.merged_model: Optional[YOLO] = None
+        self.model_state = {name: {"state": "pending", "load_s": None, "error": None} for name in self._load_keys()}
+        self._load_locks = {key: threading.Lock() for key in self._load_keys()}
+        # key -> sha256 of the weights actually loaded (taken once, at load)
+        self._weights: Dict[str, str] = {}
+
+        cores = os.cpu_count() or 1
+        workers = workers or min(len(FILE_NAMES), cores)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aesthetic")
+        if parallel and not threads:
+            threads = max(1, cores // workers)
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self._model_locks = {name: threading.Lock() for name in FILE_NAMES}
+        self._merged_lock = threading.Lock()
+
+        # content id -> (weights fingerprint, detections, items, roi); the
+        # overlay is cheap to redraw
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._stats = {"analyses": 0, "cache_hits": 0, "roi_ms": 0.0, "detect_ms": 0.0, "postprocess_ms": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def model_file(self, fname: str) -> Path:
+        """Weights to load for one model, honoring the fp32/int8 variant."""
+        pt = self.models_dir / fname
+        if self.variant == "fp32":
+            return pt
+        # same naming as main.artifact_path: <stem>-<sha256[:12]>-<imgsz>-<variant>
+        sha = weights_sha256(pt)[:12]
+        suffix = ".onnx" if self.backend == "onnx" else "_openvino_model"
+        quantized = self.models_dir / f"{pt.stem}-{sha}-{self.imgsz}-{self.variant}{suffix}"
+        if not quantized.exists():
+            raise RuntimeError(
+                f"{self.variant.upper()} model not found at {quantized}; run: "
+                f'python quantize.py --weights "{pt}" --images <calibration folder> --backend {self.backend}'
+            )
+        return quantized
+
+    # ---- model loading ----
+
+    def _load_keys(self) -> List[str]:
+        return ["merged"] if self.merged_model_path else list(FILE_NAMES)
+
+    def _weights_path(self, key: str) -> Path:
+        return Path(self.merged_model_path) if key == "merged" else self.model_file(FILE_NAMES[key])
+
+    def _load(self, key: str):
+        path = self._weights_path(key)
+        if not path.exists():
+            raise RuntimeError(f"Aesthetic model not found at: {path}")
+        sha = weights_sha256(path)
+        return YOLO(str(path)), sha
+
+    def get_model(self, key: str):
+        """Model for a condition name (or "merged"), loading it on first use; one load per model."""
+        model = self.merged_model if key == "merged" else self.models.get(key)
+        if model is not None:
+            return model
+        with self._load_locks[key]:
+            model = self.merged_model if key == "merged" else self.models.get(key)
+            if model is not None:
+                return model
+            st = self.model_state[key]
+            st["state"] = "loading"
+            t0 = time.perf_counter()
+            try:
+                model, sha = self._load(key)
+            except Exception as e:
+                st.update(state="failed", error=str(e))
+                raise
+            st.update(state="ready", error=None, load_s=round(time.perf_counter() - t0, 2))
+            self._weights[key] = sha
+            if key == "merged":
+                self.merged_model = model
+            else:
+                self.models[key] = model
+            return model
+
+    def preload(self, workers: int = 0) -> dict:
+        """Load every model in parallel (failures are recorded, not raised); returns readiness()."""
+        keys = self._load_keys()
+
+        def load(key):
+            try:
+                self.get_model(key)
+            except Exception as e:  # already in model_state[key]["error"]
+                log.warning("aesthetic model %s failed to load: %s", key, e)
+
+        with ThreadPoolExecutor(max_workers=workers or len(keys), thread_name_prefix="aesthetic-load") as pool:
+            list(pool.map(load, keys))
+        return self.readiness()
+
+    def start_preload(self) -> threading.Thread:
+        t = threading.Thread(target=self.preload, name="aesthetic-preload", daemon=True)
+        t.start()
+        return t
+
+    def readiness(self) -> dict:
+        models = {key: dict(st) for key, st in self.model_state.items()}
+        return {
+            "ready": all(st["state"] == "ready" for st in models.values()),
+            "models_dir": str(self.models_dir),
+            "models_dir_exists": self.models_dir.exists(),
+            "models": models,
+        }
+
+    # ---- detection ----
+
+    def _detect_one(self, name: str, source, geometry, shape) -> np.ndarray:
+        model = self.get_model(name)
+        with self._model_locks[name]:
+            results = model(source, conf=THRESHOLDS[name], verbose=False)[0]
+        xyxy = as_xyxy(results.boxes)
+        return _unletterbox(xyxy, geometry, shape) if geometry is not None else xyxy
+
+    def _detect_tiled(self, name: str, img: np.ndarray) -> np.ndarray:
+        tiles = tile_grid(img.shape, self.tiles)
+        model = self.get_model(name)
+        with self._model_locks[name]:
+            results = model([img[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles], conf=THRESHOLDS[name], verbose=False)
+        boxes, scores = [], []
+        for (x1, y1, _, _), res in zip(tiles, results):
+            xyxy = as_xyxy(res.boxes)
+            if len(xyxy):
+                boxes.append(xyxy + np.array([x1, y1, x1, y1], dtype=np.float32))
+                scores.append(res.boxes.conf.cpu().numpy())
+        if not boxes:
+            return np.zeros((0, 4), dtype=np.float32)
+        xyxy, conf = np.concatenate(boxes), np.concatenate(scores)
+        return xyxy[nms(xyxy, conf, 0.5)]
+
+    def _detect_merged(self, frame: np.ndarray, names: List[str]) -> Dict[str, np.ndarray]:
+        by_name = {n.lower(): n for n in names}
+        model = self.get_model("merged")
+        with self._merged_lock:
+            results = model(frame, conf=min(THRESHOLDS[n] for n in names), verbose=False)[0]
+        xyxy = as_xyxy(results.boxes)
+        out = {name: [] for name in names}
+        if len(xyxy):
+            confs = results.boxes.conf.cpu().numpy()
+            classes = results.boxes.cls.cpu().numpy().astype(int)
+            for box, conf, cls_id in zip(xyxy, confs, classes):
+                name = by_name.get(str(results.names.get(cls_id, "")).lower())
+                if name is not None and conf >= THRESHOLDS[name]:
+                    out[name].append(box)
+        return {n: np.array(b, dtype=np.float32).reshape(-1, 4) for n, b in out.items()}
+
+    def _detect_image(self, img: np.ndarray, names: List[str]) -> Dict[str, np.ndarray]:
+        if self.merged_model_path:
+            return self._detect_merged(img, names)
+        tiled = [n for n in names if self.tiles > 1 and n in self.tile_models]
+        whole = [n for n in names if n not in tiled]
+        # one letterbox for every whole-frame model instead of one per model
+        source, geometry = shared_tensor(img, self.imgsz) if whole else (None, None)
+        if not self.parallel or len(names) == 1:
+            out = {name: self._detect_one(name, source, geometry, img.shape) for name in whole}
+            out.update({name: self._detect_tiled(name, img) for name in tiled})
+            return {name: out[name] for name in names}
+        futures = {name: self._pool.submit(self._detect_tiled, name, img) for name in tiled}
+        futures.update({name: self._pool.submit(self._detect_one, name, source, geometry, img.shape) for name in whole})
+        return {name: futures[name].result() for name in names}
+
+    def detect(self, frame: np.ndarray, names: Optional[Iterable[str]] = None, roi=None) -> Dict[str, np.ndarray]:
+        """
+        Boxes (N x 4 xyxy, frame pixels) per condition; `names` restricts the
+        models run, `roi` (x1, y1, x2, y2) restricts the pixels looked at.
+        """
+        names = list(names) if names is not None else list(FILE_NAMES)
+        if roi is None:
+            return self._detect_image(frame, names)
+        x1, y1, x2, y2 = roi
+        out = self._detect_image(frame[y1:y2, x1:x2], names)
+        offset = np.array([x1, y1, x1, y1], dtype=np.float32)
+        return {name: xyxy + offset for name, xyxy in out.items()}
+
+    @staticmethod
+    def decode(image_bytes: bytes) -> Optional[np.ndarray]:
+        """Encoded upload -> BGR frame (None if it cannot be decoded)."""
+        return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+    # ---- scoring / analysis ----
+
+    @staticmethod
+    def score(detections: Dict[str, np.ndarray]) -> List[dict]:
+        items = []
+        for name, (count, pct) in score_counts(detections, DROP).items():
+            quality = quality_label(pct)
+            items.append(
+                {
+                    "name": name,
+                    "quality": quality,
+                    "chip_class": quality.lower(),
+                    "score_pct": int(pct),
+                    "count": count,
+                    "explanation": EXPLANATIONS[name],
+                    "suggestion": SUGGESTIONS[name],
+                }
+            )
+        return items
+
+    def weights_fingerprint(self) -> str:
+        """
+        One hash over the weights of every model: the hash taken at load for
+        loaded models, the file on disk for the ones not loaded yet. Retrained
+        weights dropped into models_dir therefore change every content_id.
+        """
+        parts = []
+        for key in self._load_keys():
+            sha = self._weights.get(key)
+            if sha is None:
+                try:
+                    sha = weights_sha256(self._weights_path(key))
+                except (OSError, RuntimeError):
+                    sha = "missing"  # analyze will fail to load it anyway
+            parts.append(f"{key}={sha}")
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+    def content_id(self, image_bytes: bytes) -> str:
+        """Same upload + same model setup and weights -> same id (cache key and result file name)."""
+        h = hashlib.sha256(image_bytes)
+        h.update(
+            f"|{self.variant}|{self.backend}|{self.merged_model_path}|{self.weights_fingerprint()}"
+            f"|{self.face_roi}|{self.roi_margin}|{self.tiles}|{sorted(self.tile_models)}".encode()
+        )
+        return h.hexdigest()[:24]
+
+    def analyze(self, frame: np.ndarray, key: Optional[str] = None) -> dict:
+        """
+        Full pipeline for one BGR frame.
+
+        Returns {"items", "detections", "annotated", "roi", "cached", "timings_ms"};
+        pass `key` (e.g. content_id of the upload) to reuse earlier detections.
+        """
+        cached = None
+        if key is not None:
+            # entries remember the weights they came from: a key reused
+            # across a weights swap is a miss, not a stale hit
+            weights = self.weights_fingerprint()
+            with self._cache_lock:
+                entry = self._cache.get(key)
+                if entry is not None and entry[0] != weights:
+                    del self._cache[key]
+                elif entry is not None:
+                    self._cache.move_to_end(key)
+                    cached = entry[1:]
+
+        t_roi = time.perf_counter()
+        if cached is not None:
+            detections, items, roi = cached
+        else:
+            roi = find_face_roi(frame, self.roi_margin) if self.face_roi else None
+        t0 = time.perf_counter()
+        if cached is None:
+            detections = self.detect(frame, roi=roi)
+        t1 = time.perf_counter()
+        annotated = draw_detections(frame.copy(), detections, COLOR_MAP)
+        if cached is None:
+            items = self.score(detections)
+            if key is not None and self.cache_size > 0:
+                with self._cache_lock:
+                    self._cache[key] = (weights, detections, items, roi)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        t2 = time.perf_counter()
+
+        with self._stats_lock:
+            self._stats["analyses"] += 1
+            self._stats["cache_hits"] += cached is not None
+            self._stats["roi_ms"] += (t0 - t_roi) * 1000
+            self._stats["detect_ms"] += (t1 - t0) * 1000
+            self._stats["postprocess_ms"] += (t2 - t1) * 1000
+        return {
+            "items": items,
+            "detections": detections,
+            "annotated": annotated,
+            "roi": roi,
+            "cached": cached is not None,
+            "timings_ms": {
+                "roi": round((t0 - t_roi) * 1000, 2),
+                "detect": round((t1 - t0) * 1000, 2),
+                "postprocess": round((t2 - t1) * 1000, 2),
+            },
+        }
+
+    # ---- rendering ----
+
+    @staticmethod
+    def render_png(annotated: np.ndarray) -> bytes:
+        ok, png = cv2.imencode(".png", annotated)
+        if not ok:
+            raise RuntimeError("PNG encode failed")
+        return png.tobytes()
+
+    @staticmethod
+    def render_pdf(annotated: np.ndarray, items: List[dict], out=None) -> Optional[bytes]:
+        """Write the report to `out` (path or file-like); returns the bytes when out is None."""
+        if out is not None:
+            generate_pdf(annotated, out, items)
+            return None
+        buf = io.BytesIO()
+        generate_pdf(annotated, buf, items)
+        return buf.getvalue()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            s = dict(self._stats)
+        with self._cache_lock:
+            s["cache_entries"] = len(self._cache)
+        s["roi_ms"] = round(s["roi_ms"], 1)
+        s["detect_ms"] = round(s["detect_ms"], 1)
+        s["postprocess_ms"] = round(s["postprocess_ms"], 1)
+        return s
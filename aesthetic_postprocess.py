@@ -0,0 +1,95 @@
+"""
+Vectorized post-processing for the aesthetic detectors.
+
+Dense models (pores, blackheads) return hundreds of boxes per image; these
+helpers take the N x 4 xyxy array of one model (pulled off the device in a
+single transfer) and score / draw all of it without a per-box Python loop.
+No ultralytics or torch import, so it can be benchmarked standalone.
+"""
+from typing import Dict, Mapping, Tuple
+
+import cv2
+import numpy as np
+
+# BGR box colour and score drop per box, per condition (re-exported by aesthetic_engine)
+COLOR_MAP = {
+    "Acne": (0, 0, 255),
+    "Blackheads": (0, 255, 0),
+    "Dark Circles": (255, 0, 0),
+    "Pigmentation": (0, 255, 255),
+    "Wrinkles": (255, 0, 255),
+    "Pore": (255, 255, 0),
+    "Redness": (255, 165, 0),
+}
+DROP = {
+    "Acne": 9,
+    "Blackheads": 8,
+    "Dark Circles": 14,
+    "Pigmentation": 23,
+    "Wrinkles": 18,
+    "Pore": 17,
+    "Redness": 27,
+}
+
+
+def as_xyxy(boxes) -> np.ndarray:
+    """Ultralytics Boxes / tensor / array -> float32 N x 4 NumPy array (one device transfer)."""
+    if boxes is None:
+        return np.zeros((0, 4), dtype=np.float32)
+    xyxy = getattr(boxes, "xyxy", boxes)
+    if hasattr(xyxy, "cpu"):
+        xyxy = xyxy.cpu().numpy()
+    return np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+
+
+def score_counts(detections: Mapping[str, np.ndarray], drop: Mapping[str, float]) -> Dict[str, Tuple[int, float]]:
+    """{name: boxes} -> {name: (count, pct)} with pct = clip(100 - drop * count, 0, 100)."""
+    names = list(detections)
+    counts = np.fromiter((len(detections[n]) for n in names), dtype=np.int64, count=len(names))
+    drops = np.fromiter((drop[n] for n in names), dtype=np.float64, count=len(names))
+    pcts = np.clip(100.0 - drops * counts, 0.0, 100.0)
+    return {n: (int(c), float(p)) for n, c, p in zip(names, counts, pcts)}
+
+
+def box_polygons(xyxy: np.ndarray) -> np.ndarray:
+    """N x 4 xyxy -> N x 4 x 2 int32 corner polygons for cv2.polylines."""
+    b = xyxy.astype(np.int32)  # truncates like int(), same pixels as cv2.rectangle
+    x1, y1, x2, y2 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    return np.stack(
+        [np.stack([x1, y1], 1), np.stack([x2, y1], 1), np.stack([x2, y2], 1), np.stack([x1, y2], 1)],
+        axis=1,
+    )
+
+
+def draw_boxes(img: np.ndarray, xyxy: np.ndarray, color, thickness: int = 2) -> np.ndarray:
+    """Draw every box of one model in a single cv2.polylines call (in place)."""
+    if len(xyxy):
+        cv2.polylines(img, box_polygons(xyxy), True, color, thickness)
+    return img
+
+
+def draw_detections(img: np.ndarray, detections: Mapping[str, np.ndarray], colors: Mapping[str, tuple],
+                    thickness: int = 2) -> np.ndarray:
+    for name, xyxy in detections.items():
+        draw_boxes(img, xyxy, colors[name], thickness)
+    return img
+
+
+def nms(xyxy: np.ndarray, scores: np.ndarray, iou: float = 0.5) -> np.ndarray:
+    """Greedy NMS; returns kept indices (highest score first). Used to merge overlapping tiles."""
+    if len(xyxy) == 0:
+        return np.zeros(0, dtype=np.int64)
+    x1, y1, x2, y2 = xyxy[:, 0], xyxy[:, 1], xyxy[:, 2], xyxy[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        ih = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = iw * ih
+        overlap = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[overlap <= iou]
+    return np.array(keep, dtype=np.int64)
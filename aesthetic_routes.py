@@ -1,88 +1,24 @@
 from fastapi import APIRouter, UploadFile, File, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, Response
 from fastapi.templating import Jinja2Templates
 
 from pathlib import Path
-from datetime import datetime
-import tempfile
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import threading
+import time
 import os
 
-import cv2
 import numpy as np
-from ultralytics import YOLO
 
-from reportlab.pdfgen import canvas as pdf_canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.colors import HexColor
-from reportlab.lib.utils import ImageReader
+from aesthetic_engine import AestheticEngine, register_pdf_font
+from results_store import ResultStore
 
 
 router = APIRouter()
 
-# -------------------------------------------------------------------
-#  CONFIG
-# -------------------------------------------------------------------
-
-BTN_BG = "#003366"
-
-COLOR_MAP = {
-    "Acne": (0, 0, 255),
-    "Blackheads": (0, 255, 0),
-    "Dark Circles": (255, 0, 0),
-    "Pigmentation": (0, 255, 255),
-    "Wrinkles": (255, 0, 255),
-    "Pore": (255, 255, 0),
-    "Redness": (255, 165, 0),
-}
-THRESHOLDS = {
-    "Acne": 0.6,
-    "Blackheads": 0.5,
-    "Dark Circles": 0.5,
-    "Pigmentation": 0.5,
-    "Wrinkles": 0.4,
-    "Pore": 0.6,
-    "Redness": 0.6,
-}
-DROP = {
-    "Acne": 9,
-    "Blackheads": 8,
-    "Dark Circles": 14,
-    "Pigmentation": 23,
-    "Wrinkles": 18,
-    "Pore": 17,
-    "Redness": 27,
-}
-EXPLANATIONS = {
-    "Acne": "Acne is caused by clogged pores, bacteria, and excess oil production.",
-    "Blackheads": "Blackheads form when pores are partially clogged with oil and dead skin cells.",
-    "Dark Circles": "Dark circles can be due to genetics, thin under-eye skin, or hyperpigmentation.",
-    "Pigmentation": "Pigmentation irregularities arise from melanin overproduction, triggered by sun exposure.",
-    "Wrinkles": "Wrinkles develop from loss of collagen and elastin over time.",
-    "Pore": "Enlarged pores result from genetics, oiliness, and loss of skin elasticity.",
-    "Redness": "Redness can be caused by irritation, inflammation, or vascular issues.",
-}
-SUGGESTIONS = {
-    "Acne": "Use a gentle salicylic acid wash and consult a dermatologist.",
-    "Blackheads": "Try chemical exfoliation with BHA (salicylic acid).",
-    "Dark Circles": "Ensure sufficient sleep and use cold compresses.",
-    "Pigmentation": "Apply daily SPF 30+ and use topical lightening agents.",
-    "Wrinkles": "Incorporate retinoids at night and protect skin from UV.",
-    "Pore": "Use clay masks weekly and oil-control primers.",
-    "Redness": "Choose fragrance-free, soothing products.",
-}
-
-
-def quality_label(pct: float) -> str:
-    if pct > 80:
-        return "Good"
-    elif pct >= 40:
-        return "Neutral"
-    else:
-        return "Poor"
-
-
 # -------------------------------------------------------------------
 #  PATH & MODEL SETUP
 # -------------------------------------------------------------------
@@ -102,88 +38,201 @@ RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 # PDF font
-font_path = ROOT_DIR / "Fonts" / "League_Spartan" / "static" / "LeagueSpartan-SemiBold.ttf"
-if font_path.exists():
-    pdfmetrics.registerFont(TTFont("LeagueSpartan", str(font_path)))
+register_pdf_font(ROOT_DIR / "Fonts" / "League_Spartan" / "static" / "LeagueSpartan-SemiBold.ttf")
 
-# Model klasörü
+# Model klasörü (yoksa import yine çalışır; istekler 503 döner, /api/aesthetic/ready raporlar)
 MODELS_DIR = ROOT_DIR / "Modeller" / "Medical Aesthetic"
-if not MODELS_DIR.exists():
-    raise RuntimeError(f"Medical Aesthetic model folder not found at: {MODELS_DIR}")
 
-file_names = {
-    "Acne": "Acne.pt",
-    "Blackheads": "Blackheads.pt",
-    "Dark Circles": "Dark Circles.pt",
-    "Pigmentation": "Pigmentation.pt",
-    "Wrinkles": "Wrinkles.pt",
-    "Pore": "pore.pt",
-    "Redness": "redness.pt",
-}
-
-MODELS = {name: YOLO(str(MODELS_DIR / fname)) for name, fname in file_names.items()}
+# fp32 = the .pt files; int8 = quantized models written next to them by
+# `python quantize.py --weights <pt> --images <folder> --backend <onnx|openvino>`
+AESTHETIC_MODEL_VARIANT = os.getenv("AESTHETIC_MODEL_VARIANT", "fp32").strip().lower()
+AESTHETIC_BACKEND = os.getenv("AESTHETIC_BACKEND", "onnx").strip().lower()
+AESTHETIC_IMGSZ = 640
+
+# Inference mode (bkz. AestheticEngine ve benchmarks/aesthetic_parallel.py):
+#  - the seven models always share one letterboxed tensor
+#  - AESTHETIC_PARALLEL=1 also runs them concurrently; off by default, it only
+#    pays off with spare cores (on 1 vCPU it measured the same as sequential)
+#  - AESTHETIC_THREADS caps torch intra-op threads (0 = cores // workers when
+#    parallel, torch's default otherwise)
+#  - AESTHETIC_MERGED_MODEL=<path> uses a single multi-class model
+AESTHETIC_PARALLEL = os.getenv("AESTHETIC_PARALLEL", "0") == "1"
+AESTHETIC_WORKERS = int(os.getenv("AESTHETIC_WORKERS", "0"))
+AESTHETIC_THREADS = int(os.getenv("AESTHETIC_THREADS", "0"))
+AESTHETIC_MERGED_MODEL = os.getenv("AESTHETIC_MERGED_MODEL", "")
+AESTHETIC_CACHE_SIZE = int(os.getenv("AESTHETIC_CACHE_SIZE", "128"))
+# Yüz ROI: yalnızca yüz bölgesi modellere gider; AESTHETIC_TILES=N küçük lezyon
+# modellerini (AESTHETIC_TILE_MODELS) kırpılmış yüzde N x N karo üzerinde çalıştırır.
+# Deneysel, varsayılan kapalı: it spends the 640 px on skin, it does not save
+# compute (benchmarks/aesthetic_roi.py on 1 vCPU: full 566 ms, roi 800 ms,
+# roi+tiles2 1371 ms per frame); accuracy is unmeasured until it is run with
+# the real weights and labelled faces.
+AESTHETIC_FACE_ROI = os.getenv("AESTHETIC_FACE_ROI", "0") == "1"
+AESTHETIC_ROI_MARGIN = float(os.getenv("AESTHETIC_ROI_MARGIN", "0.15"))
+AESTHETIC_TILES = int(os.getenv("AESTHETIC_TILES", "1"))
+AESTHETIC_TILE_MODELS = [m.strip() for m in os.getenv("AESTHETIC_TILE_MODELS", "Pore,Blackheads").split(",") if m.strip()]
+
+ENGINE = AestheticEngine(
+    MODELS_DIR,
+    variant=AESTHETIC_MODEL_VARIANT,
+    backend=AESTHETIC_BACKEND,
+    imgsz=AESTHETIC_IMGSZ,
+    parallel=AESTHETIC_PARALLEL,
+    workers=AESTHETIC_WORKERS,
+    threads=AESTHETIC_THREADS,
+    merged_model=AESTHETIC_MERGED_MODEL,
+    cache_size=AESTHETIC_CACHE_SIZE,
+    face_roi=AESTHETIC_FACE_ROI,
+    roi_margin=AESTHETIC_ROI_MARGIN,
+    tiles=AESTHETIC_TILES,
+    tile_models=AESTHETIC_TILE_MODELS,
+)
+MODELS = ENGINE.models  # yalnızca yüklenmiş modeller
+
+# Modeller ilk istekte tek tek yüklenir; AESTHETIC_PRELOAD=1 hepsini startup'ta
+# arka planda paralel yükler (sadece /v1/predict sunan süreçler bedel ödemez)
+AESTHETIC_PRELOAD = os.getenv("AESTHETIC_PRELOAD", "0") == "1"
+
+
+@router.on_event("startup")
+def _preload_aesthetic_models():
+    if AESTHETIC_PRELOAD:
+        ENGINE.start_preload()
 
 # Render URL – JSON API cevabında absolute URL üretmek için
 BASE_URL = "https://pocketdoc-kl0k.onrender.com"
 
 
 # -------------------------------------------------------------------
-#  PDF HELPER
+#  RENDER JOBS (PNG + PDF arka planda)
 # -------------------------------------------------------------------
 
-def generate_pdf(image_path: Path, pdf_path: Path, data):
-    """Annotated image + text raporu PDF'e yazar."""
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    tmp.close()
-
-    img = cv2.imread(str(image_path))
-    cv2.imwrite(tmp.name, img)
-
-    c = pdf_canvas.Canvas(str(pdf_path), pagesize=A4)
-    w, h = A4
-    img_w, img_h = 400, 300
-    x, y = (w - img_w) / 2, h - img_h - 50
-
-    c.drawImage(ImageReader(tmp.name), x, y, img_w, img_h)
-
-    text_y = y - 30
-    for item in data:
-        name = item["name"]
-        quality = item["quality"]
-        expl = item["explanation"]
-        sugg = item["suggestion"]
-
-        font_name = (
-            "LeagueSpartan"
-            if "LeagueSpartan" in pdfmetrics.getRegisteredFontNames()
-            else "Helvetica"
-        )
-
-        c.setFont(font_name, 12)
-        c.setFillColor(HexColor("#000000"))
-        c.drawString(50, text_y, f"{name} - {quality}")
-        text_y -= 20
-
-        frac = {"Good": 1.0, "Neutral": 0.6, "Poor": 0.2}[quality]
-        bar_len = frac * (w - 100)
-        c.setFillColor(HexColor(BTN_BG))
-        c.rect(50, text_y - 10, bar_len, 15, fill=1, stroke=0)
-        text_y -= 30
-
-        c.setFillColor(HexColor("#000000"))
-        c.setFont(font_name, 10)
-        c.drawString(50, text_y, f"Explanation: {expl}")
-        text_y -= 18
-        c.drawString(50, text_y, f"Suggestion: {sugg}")
-        text_y -= 30
+# Skorlar hemen döner; annotated PNG ve PDF bu worker'larda üretilir.
+AESTHETIC_RENDER_WORKERS = int(os.getenv("AESTHETIC_RENDER_WORKERS", "1"))
+AESTHETIC_JOBS_MAX = int(os.getenv("AESTHETIC_JOBS_MAX", "512"))
+# Kuyrukta bekleyen her render tam çözünürlüklü bir frame tutar: sınır aşılınca 503
+AESTHETIC_RENDER_QUEUE_MAX = int(os.getenv("AESTHETIC_RENDER_QUEUE_MAX", "16"))
+AESTHETIC_RETRY_AFTER_S = int(os.getenv("AESTHETIC_RETRY_AFTER_S", "2"))
+
+# Sonuç deposu: disk (static/results) ya da memory; TTL + toplam boyut limiti
+AESTHETIC_RESULTS_STORE = os.getenv("AESTHETIC_RESULTS_STORE", "disk").strip().lower()
+AESTHETIC_RESULTS_TTL_S = float(os.getenv("AESTHETIC_RESULTS_TTL_S", str(24 * 3600)))
+AESTHETIC_RESULTS_MB = int(os.getenv("AESTHETIC_RESULTS_MB", "512"))
+AESTHETIC_RESULTS_SWEEP_S = float(os.getenv("AESTHETIC_RESULTS_SWEEP_S", "60"))
+
+RESULTS = ResultStore(
+    RESULTS_DIR,
+    mode=AESTHETIC_RESULTS_STORE,
+    ttl_s=AESTHETIC_RESULTS_TTL_S,
+    max_bytes=AESTHETIC_RESULTS_MB * 1024 * 1024,
+    sweep_every_s=AESTHETIC_RESULTS_SWEEP_S,
+)
+RESULTS.start_sweeper()
+
+_RENDER_POOL = ThreadPoolExecutor(max_workers=AESTHETIC_RENDER_WORKERS, thread_name_prefix="aesthetic-render")
+JOBS: "OrderedDict[str, dict]" = OrderedDict()
+_JOB_FUTURES = {}
+_JOBS_LOCK = threading.Lock()
+_RENDERS_PENDING = 0  # kuyrukta + çalışan render sayısı (_JOBS_LOCK ile)
+
+
+class RenderQueueFull(Exception):
+    """AESTHETIC_RENDER_QUEUE_MAX render zaten bekliyor."""
+
+
+def result_url(name: str, base: str = "") -> str:
+    if RESULTS.mode == "disk":
+        return f"{base}/static/results/{name}"
+    return f"{base}/api/aesthetic/results/{name}"
+
+
+def _render(job: dict, inputs: dict):
+    global _RENDERS_PENDING
+    job["state"] = "running"
+    try:
+        annotated = inputs["annotated"]
+        RESULTS.write(job["annotated_name"], ENGINE.render_png(annotated))
+        RESULTS.write(job["pdf_name"], ENGINE.render_pdf(annotated, inputs["items"]))
+        job["state"] = "done"
+    except Exception as e:
+        job["state"] = "failed"
+        job["error"] = str(e)
+    finally:
+        # frame'i bırak: executor iş nesnesi inputs'u tutmaya devam edebilir
+        inputs.clear()
+        job["finished"] = time.time()
+        with _JOBS_LOCK:
+            _JOB_FUTURES.pop(job["job_id"], None)
+            _RENDERS_PENDING -= 1
+
+
+def submit_render(rid: str, annotated: np.ndarray, report_data):
+    """Queue PNG + PDF rendering for result id `rid`; returns (job dict, concurrent future).
+
+    Raises RenderQueueFull when AESTHETIC_RENDER_QUEUE_MAX renders are already pending.
+    """
+    global _RENDERS_PENDING
+    with _JOBS_LOCK:
+        # aynı içerik zaten render ediliyor: o işe katıl
+        future = _JOB_FUTURES.get(rid)
+        if future is not None:
+            return JOBS[rid], future
+
+        cached = RESULTS.exists(f"annotated_{rid}.png") and RESULTS.exists(f"Report_{rid}.pdf")
+        if not cached and _RENDERS_PENDING >= AESTHETIC_RENDER_QUEUE_MAX:
+            raise RenderQueueFull()
+
+        job = {
+            "job_id": rid,
+            "state": "pending",
+            "annotated_name": f"annotated_{rid}.png",
+            "pdf_name": f"Report_{rid}.pdf",
+            "error": None,
+            "created": time.time(),
+            "finished": None,
+        }
+        JOBS[rid] = job
+        JOBS.move_to_end(rid)
+        # en eski bitmiş işleri unut (dosyalar depoda kalır); bekleyenler
+        # AESTHETIC_RENDER_QUEUE_MAX ile sınırlı
+        for old in list(JOBS):
+            if len(JOBS) <= AESTHETIC_JOBS_MAX:
+                break
+            if JOBS[old]["state"] not in ("pending", "running"):
+                JOBS.pop(old)
+
+        # daha önce üretilmiş: tekrar yazmadan yaşını tazele
+        if cached:
+            RESULTS.touch(job["annotated_name"])
+            RESULTS.touch(job["pdf_name"])
+            job["state"] = "done"
+            job["finished"] = job["created"]
+            future = Future()
+            future.set_result(None)
+            return job, future
+
+        _RENDERS_PENDING += 1
+        future = _JOB_FUTURES[rid] = _RENDER_POOL.submit(_render, job, {"annotated": annotated, "items": report_data})
+    return job, future
+
+
+def _render_busy() -> JSONResponse:
+    return JSONResponse(
+        {"error": "Too many reports are being rendered, retry later"},
+        status_code=503,
+        headers={"Retry-After": str(AESTHETIC_RETRY_AFTER_S)},
+    )
 
-        if text_y < 80:
-            c.showPage()
-            c.drawImage(ImageReader(tmp.name), x, y, img_w, img_h)
-            text_y = y - 30
 
-    c.save()
-    os.unlink(tmp.name)
+def job_status(job: dict, base: str = "") -> dict:
+    return {
+        "job_id": job["job_id"],
+        "state": job["state"],
+        "error": job["error"],
+        "annotated_url": result_url(job["annotated_name"], base),
+        "pdf_url": result_url(job["pdf_name"], base),
+        "status_url": f"{base}/api/aesthetic/jobs/{job['job_id']}",
+    }
 
 
 # -------------------------------------------------------------------
@@ -199,12 +248,20 @@ async def aesthetic_index(request: Request):
     )
 
 
+def _decode_upload(image_bytes: bytes):
+    """(frame, content id) ya da (None, None); bloklar: content_id upload'ı ve
+    ilk kullanımda yedi ağırlık dosyasını hash'ler, event loop'ta çalışmamalı."""
+    frame = ENGINE.decode(image_bytes)
+    if frame is None:
+        return None, None
+    return frame, ENGINE.content_id(image_bytes)
+
+
 @router.post("/aesthetic/analyze", response_class=HTMLResponse)
 async def aesthetic_analyze(request: Request, file: UploadFile = File(...)):
     """HTML formundan gelen upload'ı işleyip aynı template'i doldurur."""
     image_bytes = await file.read()
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    frame, rid = await run_in_threadpool(_decode_upload, image_bytes)
 
     if frame is None:
         return templates.TemplateResponse(
@@ -212,51 +269,31 @@ async def aesthetic_analyze(request: Request, file: UploadFile = File(...)):
             {"request": request, "result": None, "error": "Image could not be read."},
         )
 
-    annotated = frame.copy()
-    report_data = []
-
-    for name, model in MODELS.items():
-        results = model(frame, conf=THRESHOLDS[name])[0]
-        count = len(results.boxes)
-        pct = max(0, 100 - DROP[name] * count)
-        pct = max(0, min(100, pct))
-
-        color = COLOR_MAP[name]
-        for box in results.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
-
-        quality = quality_label(pct)
-        chip_class = (
-            "good" if quality == "Good"
-            else "neutral" if quality == "Neutral"
-            else "poor"
+    try:
+        analysis = await run_in_threadpool(ENGINE.analyze, frame, rid)
+    except (RuntimeError, OSError) as e:
+        return templates.TemplateResponse(
+            "aesthetic.html",
+            {"request": request, "result": None, "error": f"Models unavailable: {e}"},
+            status_code=503,
         )
+    annotated, report_data = analysis["annotated"], analysis["items"]
 
-        report_data.append(
-            {
-                "name": name,
-                "quality": quality,
-                "chip_class": chip_class,
-                "score_pct": int(pct),
-                "explanation": EXPLANATIONS[name],
-                "suggestion": SUGGESTIONS[name],
-            }
+    # HTML sayfası linkleri hemen gösterdiği için render'ı bekler
+    try:
+        job, future = submit_render(rid, annotated, report_data)
+    except RenderQueueFull:
+        return templates.TemplateResponse(
+            "aesthetic.html",
+            {"request": request, "result": None, "error": "Server busy, please retry in a few seconds."},
+            status_code=503,
+            headers={"Retry-After": str(AESTHETIC_RETRY_AFTER_S)},
         )
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    annotated_name = f"annotated_{ts}.png"
-    annotated_path = RESULTS_DIR / annotated_name
-    cv2.imwrite(str(annotated_path), annotated)
-
-    pdf_name = f"Report_{ts}.pdf"
-    pdf_path = RESULTS_DIR / pdf_name
-    generate_pdf(annotated_path, pdf_path, report_data)
+    await asyncio.wrap_future(future)
 
     result = {
-        "annotated_url": f"/static/results/{annotated_name}",
-        "pdf_url": f"/static/results/{pdf_name}",
+        "annotated_url": result_url(job["annotated_name"]),
+        "pdf_url": result_url(job["pdf_name"]),
         "items": report_data,
     }
 
@@ -278,56 +315,76 @@ async def api_aesthetic(file: UploadFile = File(...)):
     Response: annotated_url, pdf_url ve items listesi.
     """
     image_bytes = await file.read()
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    frame, rid = await run_in_threadpool(_decode_upload, image_bytes)
 
     if frame is None:
         return JSONResponse({"error": "Image could not be read."}, status_code=400)
 
-    annotated = frame.copy()
-    report_data = []
-
-    for name, model in MODELS.items():
-        results = model(frame, conf=THRESHOLDS[name])[0]
-        count = len(results.boxes)
-        pct = max(0, 100 - DROP[name] * count)
-        pct = max(0, min(100, pct))
-
-        color = COLOR_MAP[name]
-        for box in results.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
-
-        quality = quality_label(pct)
-        chip_class = (
-            "good" if quality == "Good"
-            else "neutral" if quality == "Neutral"
-            else "poor"
-        )
-
-        report_data.append(
-            {
-                "name": name,
-                "quality": quality,
-                "chip_class": chip_class,
-                "score_pct": int(pct),
-                "explanation": EXPLANATIONS[name],
-                "suggestion": SUGGESTIONS[name],
-            }
-        )
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    annotated_name = f"annotated_{ts}.png"
-    annotated_path = RESULTS_DIR / annotated_name
-    cv2.imwrite(str(annotated_path), annotated)
-
-    pdf_name = f"Report_{ts}.pdf"
-    pdf_path = RESULTS_DIR / pdf_name
-    generate_pdf(annotated_path, pdf_path, report_data)
-
-    return {
-        "annotated_url": f"{BASE_URL}/static/results/{annotated_name}",
-        "pdf_url": f"{BASE_URL}/static/results/{pdf_name}",
-        "items": report_data,
-    }
+    try:
+        analysis = await run_in_threadpool(ENGINE.analyze, frame, rid)
+    except (RuntimeError, OSError) as e:
+        return JSONResponse({"error": f"Models unavailable: {e}"}, status_code=503)
+    annotated, report_data = analysis["annotated"], analysis["items"]
+
+    # PNG/PDF arka planda; URL'ler job bitince geçerli olur (status_url ile takip)
+    try:
+        job, _ = submit_render(rid, annotated, report_data)
+    except RenderQueueFull:
+        return _render_busy()
+
+    return {**job_status(job, BASE_URL), "items": report_data, "roi": analysis["roi"]}
+
+
+@router.get("/api/aesthetic/ready")
+async def api_aesthetic_ready():
+    """Model yükleme durumu; hepsi hazır değilse 503 (yükleme tetiklemez)."""
+    report = ENGINE.readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@router.get("/api/aesthetic/jobs/{job_id}")
+async def api_aesthetic_job(job_id: str):
+    """Render job durumu: pending | running | done | failed."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    return job_status(job, BASE_URL)
+
+
+@router.get("/api/aesthetic/jobs/{job_id}/{kind}")
+async def api_aesthetic_job_file(job_id: str, kind: str):
+    """Job çıktısını indirir: kind = png | pdf. Hazır değilse 202 döner."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    if kind not in ("png", "pdf"):
+        return JSONResponse({"error": "kind must be png or pdf"}, status_code=400)
+    if job["state"] == "failed":
+        return JSONResponse({"error": job["error"]}, status_code=500)
+    if job["state"] != "done":
+        return JSONResponse(job_status(job, BASE_URL), status_code=202, headers={"Retry-After": "1"})
+    return _serve_result(job["annotated_name"] if kind == "png" else job["pdf_name"])
+
+
+def _serve_result(name: str):
+    media_type = "application/pdf" if name.endswith(".pdf") else "image/png"
+    path = RESULTS.path(name)
+    if path is not None:
+        return FileResponse(path, media_type=media_type)
+    data = RESULTS.read(name)
+    if data is None:
+        return JSONResponse({"error": "Result expired or not found"}, status_code=404)
+    return Response(content=data, media_type=media_type)
+
+
+@router.get("/api/aesthetic/results/{name}")
+async def api_aesthetic_result(name: str):
+    """Depodaki PNG/PDF'i servis eder (memory modunda tek erişim yolu)."""
+    if "/" in name or name.startswith("."):
+        return JSONResponse({"error": "Invalid name"}, status_code=400)
+    return _serve_result(name)
+
+
+@router.get("/api/aesthetic/results")
+async def api_aesthetic_results_stats():
+    return {**RESULTS.stats(), "engine": ENGINE.stats()}
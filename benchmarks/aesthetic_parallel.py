@@ -0,0 +1,133 @@
+"""
+Aesthetic detector scheduling benchmark: the seven models one after another
+on the raw frame (each letterboxing it itself, the pre-engine path) vs one
+shared letterboxed tensor, sequential and in the engine's thread pool.
+
+    python benchmarks/aesthetic_parallel.py --images ./faces --repeat 10
+    python benchmarks/aesthetic_parallel.py --synthetic yolov8n --size 1280x720
+
+Reports warm p50 / p95 detect latency per mode, the torch intra-op threads
+the mode ran with, and how many boxes of the legacy path each mode
+reproduces (IoU >= 0.5). --synthetic builds untrained copies of an
+Ultralytics architecture in a temp dir when the Medical Aesthetic weights
+are not at hand: timings are real, detections are not (expect 0 boxes).
+"""
+import argparse
+import glob
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aesthetic_roi import match  # noqa: E402
+
+
+def synthetic_models(arch: str, out: str):
+    from ultralytics import YOLO
+
+    from aesthetic_engine import FILE_NAMES
+
+    base = os.path.join(out, "base.pt")
+    YOLO(f"{arch}.yaml").save(base)
+    for fname in FILE_NAMES.values():
+        shutil.copy(base, os.path.join(out, fname))
+
+
+def time_mode(fn, frames, repeat: int):
+    fn(frames[0])  # warm: predictor setup, Conv+BN fusion
+    latency, detections = [], []
+    for _ in range(repeat):
+        for frame in frames:
+            t0 = time.perf_counter()
+            out = fn(frame)
+            latency.append((time.perf_counter() - t0) * 1000)
+    for frame in frames:
+        detections.append(fn(frame))
+    return sorted(latency), detections
+
+
+def agreement(run: list, reference: list):
+    tp = n_pred = n_ref = 0
+    for pred, ref in zip(run, reference):
+        for name, ref_boxes in ref.items():
+            t, p, r = match(pred[name], ref_boxes)
+            tp, n_pred, n_ref = tp + t, n_pred + p, n_ref + r
+    return n_pred, (round(tp / n_ref, 3) if n_ref else None)
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--images", default="", help="folder of face photos (default: one synthetic frame)")
+    ap.add_argument("--models-dir", default="", help="default: <repo>/Modeller/Medical Aesthetic")
+    ap.add_argument("--synthetic", default="", help="untrained architecture to build instead, e.g. yolov8n")
+    ap.add_argument("--size", default="1280x720", help="WxH of the synthetic frame")
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--limit", type=int, default=10)
+    ap.add_argument("--workers", type=int, default=0, help="parallel pool size (0 = min(7, cores))")
+    args = ap.parse_args()
+
+    import torch
+
+    from aesthetic_engine import FILE_NAMES, AestheticEngine
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    tmp = None
+    models_dir = args.models_dir or os.path.join(repo, "Modeller", "Medical Aesthetic")
+    if args.synthetic:
+        tmp = tempfile.mkdtemp(prefix="pd-aesthetic-")
+        synthetic_models(args.synthetic, tmp)
+        models_dir = tmp
+
+    frames = []
+    if args.images:
+        paths = sorted(p for ext in ("png", "jpg", "jpeg") for p in glob.glob(os.path.join(args.images, f"*.{ext}")))
+        for p in paths[:args.limit]:
+            frame = AestheticEngine.decode(open(p, "rb").read())
+            if frame is not None:
+                frames.append(frame)
+        if not frames:
+            sys.exit(f"no readable images in {args.images}")
+    else:
+        w, h = (int(v) for v in args.size.lower().split("x"))
+        frames.append(np.random.default_rng(0).integers(0, 255, (h, w, 3), dtype=np.uint8))
+
+    names = list(FILE_NAMES)
+    default_threads = torch.get_num_threads()
+    try:
+        sequential = AestheticEngine(models_dir, parallel=False, cache_size=0)
+        sequential.preload()
+
+        def legacy(frame):
+            return {n: sequential._detect_one(n, frame, None, frame.shape) for n in names}
+
+        runs = {
+            "legacy": (*time_mode(legacy, frames, args.repeat), default_threads),
+            "shared": (*time_mode(sequential.detect, frames, args.repeat), torch.get_num_threads()),
+        }
+        # the parallel engine caps torch's (process-wide) threads when it is built
+        parallel = AestheticEngine(models_dir, parallel=True, workers=args.workers, cache_size=0)
+        parallel.preload()
+        runs["parallel"] = (*time_mode(parallel.detect, frames, args.repeat), torch.get_num_threads())
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    shape = f"{frames[0].shape[1]}x{frames[0].shape[0]}"
+    print(f"{len(frames)} frame(s) ({shape}), {os.cpu_count()} cores, {args.repeat} repeats; "
+          f"models: {args.synthetic + ' (untrained)' if args.synthetic else models_dir}")
+    print(f"{'mode':<9} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'threads':>8} {'boxes':>6} {'recall':>7}")
+    base = statistics.median(runs["legacy"][0])
+    for mode, (lat, detections, threads) in runs.items():
+        p50 = statistics.median(lat)
+        boxes, recall = agreement(detections, runs["legacy"][1])
+        print(f"{mode:<9} {p50:>8.1f} {lat[int(0.95 * (len(lat) - 1))]:>8.1f} {base / p50:>7.2f}x "
+              f"{threads:>8} {boxes:>6} {str(recall):>7}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,121 @@
+"""
+Aesthetic post-processing benchmark: per-box Python loop vs vectorized.
+
+Builds dense synthetic detections (pore/blackhead models routinely return
+hundreds of boxes), then times the original handler loop (iterate boxes,
+convert each ``box.xyxy[0]``, one cv2.rectangle per box) against
+aesthetic_postprocess (one transfer per model, vectorized scores, one
+cv2.polylines per model). Both overlays are compared pixel for pixel.
+
+    python benchmarks/aesthetic_postprocess.py --boxes 400 --repeat 50
+
+Runs without ultralytics. When torch is installed the legacy path iterates
+real tensors, as in production; otherwise it iterates NumPy rows, which
+understates the legacy cost.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aesthetic_postprocess import COLOR_MAP, DROP, as_xyxy, draw_detections, score_counts  # noqa: E402
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+# share of the box budget per model: pores and blackheads dominate
+DENSITY = {"Pore": 0.45, "Blackheads": 0.25, "Acne": 0.1, "Pigmentation": 0.08,
+           "Wrinkles": 0.06, "Redness": 0.04, "Dark Circles": 0.02}
+
+
+class _Box:
+    def __init__(self, row):
+        self.xyxy = row[None]
+
+
+class FakeBoxes:
+    """Mimics ultralytics Boxes: len(), iteration yielding .xyxy, and a batched .xyxy."""
+
+    def __init__(self, xyxy):
+        self.xyxy = torch.from_numpy(xyxy) if torch is not None else xyxy
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __iter__(self):
+        for row in self.xyxy:
+            yield _Box(row)
+
+
+def synthetic(total: int, w: int, h: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    out = {}
+    for name, share in DENSITY.items():
+        n = max(1, int(total * share))
+        x1 = rng.uniform(0, w - 40, n)
+        y1 = rng.uniform(0, h - 40, n)
+        size = rng.uniform(4, 40, (n, 2))
+        out[name] = FakeBoxes(np.stack([x1, y1, x1 + size[:, 0], y1 + size[:, 1]], 1).astype(np.float32))
+    return out
+
+
+def legacy(frame, boxes_by_model):
+    annotated = frame.copy()
+    scores = {}
+    for name, boxes in boxes_by_model.items():
+        count = len(boxes)
+        pct = max(0, 100 - DROP[name] * count)
+        pct = max(0, min(100, pct))
+        for box in boxes:
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), COLOR_MAP[name], 2)
+        scores[name] = (count, pct)
+    return annotated, scores
+
+
+def vectorized(frame, boxes_by_model):
+    annotated = frame.copy()
+    detections = {name: as_xyxy(boxes) for name, boxes in boxes_by_model.items()}
+    draw_detections(annotated, detections, COLOR_MAP)
+    return annotated, score_counts(detections, DROP)
+
+
+def time_ms(fn, repeat: int, *args) -> list:
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--boxes", default="50,200,400,1000", help="total boxes per image (comma list)")
+    ap.add_argument("--size", default="1280x960", help="WxH of the frame")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    frame = np.full((h, w, 3), 180, dtype=np.uint8)
+
+    print(f"legacy boxes backed by: {'torch tensors' if torch is not None else 'numpy rows'}")
+    print(f"{'boxes':>6} {'legacy p50':>11} {'vector p50':>11} {'speedup':>8}  same pixels")
+    for total in (int(v) for v in args.boxes.split(",")):
+        data = synthetic(total, w, h)
+        a, sa = legacy(frame, data)
+        b, sb = vectorized(frame, data)
+        same = bool((a == b).all()) and all(sa[n][0] == sb[n][0] and sa[n][1] == sb[n][1] for n in sa)
+        t_old = statistics.median(time_ms(legacy, args.repeat, frame, data))
+        t_new = statistics.median(time_ms(vectorized, args.repeat, frame, data))
+        print(f"{total:>6} {t_old:>9.2f}ms {t_new:>9.2f}ms {t_old / t_new:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,145 @@
+"""
+Face-ROI benchmark for the aesthetic detectors: full frame vs face crop
+(vs face crop + tiled small-lesion models).
+
+Runs AestheticEngine.analyze on every image in a folder under each mode and
+reports latency plus detection quality. With --labels (JSON: {image file
+name: {condition: [[x1, y1, x2, y2], ...]}} in original pixels) quality is
+precision / recall at IoU 0.5 against those labels; without labels the
+full-frame detections are the reference, so recall shows what the crop
+loses and "extra" what it finds that the full frame missed.
+
+    python benchmarks/aesthetic_roi.py --images ./faces --tiles 2 --out roi.json
+
+Needs ultralytics and the Medical Aesthetic weights; MediaPipe is used for
+the face box when installed, OpenCV's Haar cascade otherwise.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    ix = (np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])).clip(0)
+    iy = (np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])).clip(0)
+    inter = ix * iy
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match(pred: np.ndarray, ref: np.ndarray, thr: float = 0.5):
+    """Greedy one-to-one matching; returns (true positives, n pred, n ref)."""
+    iou = iou_matrix(pred, ref)
+    tp = 0
+    while iou.size and iou.max() >= thr:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        tp += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return tp, len(pred), len(ref)
+
+
+def run_mode(engine, images, face_roi: bool, tiles: int) -> dict:
+    engine.face_roi, engine.tiles = face_roi, tiles
+    engine.analyze(images[0][1])  # warm
+    out = {"latency_ms": [], "face_ms": [], "detections": {}, "roi_found": 0}
+    for name, frame in images:
+        t0 = time.perf_counter()
+        res = engine.analyze(frame)
+        out["latency_ms"].append((time.perf_counter() - t0) * 1000)
+        out["face_ms"].append(res["timings_ms"]["roi"])
+        out["detections"][name] = res["detections"]
+        out["roi_found"] += res["roi"] is not None
+    return out
+
+
+def quality(run: dict, reference: dict) -> dict:
+    tp = n_pred = n_ref = 0
+    for image, ref in reference.items():
+        pred = run["detections"].get(image, {})
+        for cond, ref_boxes in ref.items():
+            t, p, r = match(np.asarray(pred.get(cond, np.zeros((0, 4))), np.float32).reshape(-1, 4),
+                            np.asarray(ref_boxes, np.float32).reshape(-1, 4))
+            tp, n_pred, n_ref = tp + t, n_pred + p, n_ref + r
+    return {
+        "precision": round(tp / n_pred, 3) if n_pred else None,
+        "recall": round(tp / n_ref, 3) if n_ref else None,
+        "boxes": n_pred,
+        "reference_boxes": n_ref,
+    }
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--images", required=True, help="folder of face photos")
+    ap.add_argument("--labels", default="", help="optional ground-truth JSON (see module docstring)")
+    ap.add_argument("--models-dir", default="", help="default: <repo>/Modeller/Medical Aesthetic")
+    ap.add_argument("--tiles", type=int, default=2, help="grid for the tiled mode (<2 skips it)")
+    ap.add_argument("--margin", type=float, default=0.15)
+    ap.add_argument("--limit", type=int, default=50)
+    ap.add_argument("--out", default="", help="write JSON results here")
+    args = ap.parse_args()
+
+    from aesthetic_engine import AestheticEngine
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    engine = AestheticEngine(args.models_dir or os.path.join(repo, "Modeller", "Medical Aesthetic"),
+                             roi_margin=args.margin, cache_size=0)
+    engine.preload()
+
+    paths = sorted(p for ext in ("png", "jpg", "jpeg") for p in glob.glob(os.path.join(args.images, f"*.{ext}")))
+    images = []
+    for p in paths[:args.limit]:
+        frame = engine.decode(open(p, "rb").read())
+        if frame is not None:
+            images.append((os.path.basename(p), frame))
+    if not images:
+        sys.exit(f"no readable images in {args.images}")
+
+    modes = [("full", False, 1), ("roi", True, 1)]
+    if args.tiles > 1:
+        modes.append((f"roi+tiles{args.tiles}", True, args.tiles))
+    runs = {label: run_mode(engine, images, roi, tiles) for label, roi, tiles in modes}
+
+    if args.labels:
+        with open(args.labels) as f:
+            reference = json.load(f)
+        ref_label = "labels"
+    else:
+        reference = runs["full"]["detections"]
+        ref_label = "full-frame detections"
+
+    print(f"{len(images)} images; quality reference: {ref_label}")
+    print(f"{'mode':<14} {'p50 ms':>8} {'p95 ms':>8} {'face ms':>8} {'faces':>6} {'precision':>10} {'recall':>7} {'boxes':>6}")
+    rows = []
+    for label, run in runs.items():
+        lat = sorted(run["latency_ms"])
+        row = {
+            "mode": label,
+            "p50_ms": round(statistics.median(lat), 1),
+            "p95_ms": round(lat[int(0.95 * (len(lat) - 1))], 1),
+            "face_p50_ms": round(statistics.median(run["face_ms"]), 1),
+            "faces_found": run["roi_found"],
+            **quality(run, reference),
+        }
+        rows.append(row)
+        print(f"{label:<14} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['face_p50_ms']:>8} {row['faces_found']:>6} "
+              f"{str(row['precision']):>10} {str(row['recall']):>7} {row['boxes']:>6}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"images": len(images), "reference": ref_label, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,148 @@
+"""
+Compare inference backends (torch / onnx / openvino) on the served models.
+
+Loads each task through main.load_model with the catalog's backend switched,
+times single-image and batched forward passes on a folder of images (or
+synthetic X-ray-like frames), and checks that the top-1 label matches the
+torch backend, plus the IoU and confidence drift of the top box.
+
+    python benchmarks/backends.py --tasks fracture,gonarthrosis --images ./samples --threads 4
+
+--conf overrides the catalog threshold: with untrained stand-in weights
+(no boxes at the usual thresholds) --conf 0.001 still gives every image a
+top box to compare.
+
+Needs ultralytics plus onnx/onnxruntime and/or openvino for the non-torch
+rows; unavailable backends are reported and skipped.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+
+
+def load_images(folder: str, n: int) -> list:
+    if folder:
+        paths = sorted(p for ext in ("png", "jpg", "jpeg") for p in glob.glob(os.path.join(folder, f"*.{ext}")))
+        if paths:
+            import main
+            return [main._decode_rgb(open(p, "rb").read())[0] for p in paths[:n]]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (1024, 1024, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def top_box(res):
+    """(xyxy, conf) of the highest-confidence box, None without boxes."""
+    boxes = res.boxes
+    if boxes is None or len(boxes) == 0:
+        return None
+    conf = boxes.conf.cpu().numpy()
+    i = int(np.argmax(conf))
+    return boxes.xyxy.cpu().numpy()[i], float(conf[i])
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def compare(reference: dict, row: dict):
+    """Top-1 label agreement, mean top-box IoU and max confidence drift against the reference row."""
+    row["top1_agreement"] = round(
+        sum(a == b for a, b in zip(reference["labels"], row.pop("labels"))) / float(len(reference["labels"])), 3
+    )
+    pairs = [(a, b) for a, b in zip(reference["top"], row.pop("top")) if a is not None and b is not None]
+    row["top_box_iou"] = round(statistics.mean(box_iou(a[0], b[0]) for a, b in pairs), 3) if pairs else None
+    row["max_conf_drift"] = round(max(abs(a[1] - b[1]) for a, b in pairs), 5) if pairs else None
+
+
+def bench_backend(main, task: str, backend: str, images: list, repeat: int, batch: int) -> dict:
+    main.TASKS[task]["backend"] = backend
+    main._unload(task)
+    t0 = time.perf_counter()
+    model = main.load_model(task)
+    load_s = time.perf_counter() - t0
+    kwargs = main._predict_kwargs(task)
+    model(images[0], **kwargs)  # warm
+
+    single = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        model(images[i % len(images)], **kwargs)
+        single.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    done = 0
+    for i in range(0, len(images), batch):
+        model(images[i:i + batch], **kwargs)
+        done += len(images[i:i + batch])
+    batch_s = time.perf_counter() - t0
+
+    results = model(images, **kwargs)
+    return {
+        "task": task,
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "p50_ms": round(statistics.median(single), 1),
+        "p95_ms": round(sorted(single)[int(0.95 * (len(single) - 1))], 1),
+        "batched_img_per_s": round(done / batch_s, 1),
+        "labels": [main._summarize(task, r)["label"] for r in results],
+        "top": [top_box(r) for r in results],
+    }
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--tasks", default="fracture,gonarthrosis")
+    ap.add_argument("--backends", default="torch,onnx,openvino")
+    ap.add_argument("--images", default="", help="folder of sample images (default: synthetic)")
+    ap.add_argument("--n-images", type=int, default=16)
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--batch", type=int, default=8)
+    ap.add_argument("--threads", type=int, default=0, help="sets INFER_THREADS")
+    ap.add_argument("--conf", type=float, default=None, help="override the tasks' confidence threshold")
+    ap.add_argument("--out", default="", help="write JSON results here")
+    args = ap.parse_args()
+
+    if args.threads:
+        os.environ["INFER_THREADS"] = str(args.threads)
+    import main
+
+    images = load_images(args.images, args.n_images)
+    rows = []
+    for task in [t.strip() for t in args.tasks.split(",") if t.strip()]:
+        if args.conf is not None:
+            main.TASKS[task]["conf"] = args.conf
+        reference = None
+        for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            try:
+                row = bench_backend(main, task, backend, images, args.repeat, args.batch)
+            except Exception as e:
+                print(f"{task:<14} {backend:<9} skipped: {e}")
+                continue
+            if reference is None:
+                reference = {"labels": row["labels"], "top": row["top"]}
+            compare(reference, row)
+            rows.append(row)
+            print(f"{task:<14} {backend:<9} load {row['load_s']:>6}s  p50 {row['p50_ms']:>7} ms  "
+                  f"p95 {row['p95_ms']:>7} ms  batched {row['batched_img_per_s']:>6} img/s  "
+                  f"agreement {row['top1_agreement']}  box IoU {row['top_box_iou']}  "
+                  f"conf drift {row['max_conf_drift']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
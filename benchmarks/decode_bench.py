@@ -0,0 +1,113 @@
+"""
+Decode benchmark: legacy full-resolution decode vs main._decode_rgb.
+
+Generates large synthetic JPEG/PNG uploads (phone photos of a lightbox are
+typically ~4000x3000) and times both paths.
+
+    python benchmarks/decode_bench.py --size 4000x3000 --repeat 20
+
+Besides RGB JPEG/PNG it decodes the PNG/GIF modes Image.reduce() rejects or
+mishandles (palette, 1-bit, 16-bit, alpha), as exported from DICOM viewers,
+and exits non-zero if the fast path fails on any of them or drifts from
+the legacy decode.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+import main  # noqa: E402
+
+
+def legacy_decode(data: bytes) -> np.ndarray:
+    """The original /v1/predict decode path."""
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    return np.array(img)
+
+
+# (format, PIL mode of the saved file)
+CASES = (
+    ("JPEG", "RGB"), ("PNG", "RGB"), ("PNG", "L"), ("PNG", "LA"), ("PNG", "RGBA"),
+    ("PNG", "P"), ("PNG", "I;16"), ("PNG", "1"), ("GIF", "P"),
+)
+
+
+def synthetic_upload(w: int, h: int, fmt: str, mode: str = "RGB") -> bytes:
+    # smooth gradient + noise, roughly as compressible as a radiograph photo
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, w, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+    gray = (0.5 * x + 0.5 * y + rng.normal(0, 12, (h, w))).clip(0, 255).astype(np.uint8)
+    if mode == "I;16":
+        # 12-bit values in 16 bits, like a radiograph exported as 16-bit PNG
+        img = Image.fromarray(gray.astype(np.uint16) * 16)
+    elif mode == "RGB":
+        img = Image.fromarray(np.stack([gray] * 3, axis=-1))
+    else:
+        img = Image.fromarray(gray).convert(mode)
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=90)
+    return buf.getvalue()
+
+
+def drift(data: bytes, fast: np.ndarray) -> float:
+    """Mean abs difference between the fast decode and the legacy decode box-reduced to the same size."""
+    legacy = Image.open(io.BytesIO(data)).convert("RGB")
+    factor = legacy.size[0] // fast.shape[1]
+    if factor >= 2:
+        legacy = legacy.reduce(factor)
+    return float(np.abs(np.asarray(legacy, dtype=np.float32) - fast.astype(np.float32)).mean())
+
+
+def time_ms(fn, data: bytes, repeat: int) -> list:
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--size", default="4000x3000", help="WxH of the synthetic upload")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--max-side", type=int, default=main.DECODE_MAX_SIDE)
+    args = ap.parse_args()
+    w, h = (int(v) for v in args.size.lower().split("x"))
+
+    print(f"{'format':<11} {'path':<8} {'p50 ms':>9} {'mean ms':>9}  output")
+    failed = []
+    for fmt, mode in CASES:
+        label = f"{fmt}/{mode}"
+        data = synthetic_upload(w, h, fmt, mode)
+        legacy = time_ms(legacy_decode, data, args.repeat)
+        try:
+            fast = time_ms(lambda d: main._decode_rgb(d, args.max_side), data, args.repeat)
+            arr, scale = main._decode_rgb(data, args.max_side)
+        except Exception as e:
+            print(f"{label:<11} {'fast':<8} FAILED: {type(e).__name__}: {e}")
+            failed.append(label)
+            continue
+        # JPEG draft decodes in the DCT domain, so it is not pixel-identical
+        diff = drift(data, arr)
+        if fmt != "JPEG" and diff > 1.0:
+            failed.append(label)
+        for name, samples, shape in (
+            ("legacy", legacy, f"{w}x{h}"),
+            ("fast", fast, f"{arr.shape[1]}x{arr.shape[0]} (scale {scale:.2f}, drift {diff:.2f})"),
+        ):
+            print(f"{label:<11} {name:<8} {statistics.median(samples):>9.1f} {statistics.mean(samples):>9.1f}  {shape}")
+    if failed:
+        sys.exit(f"fast decode failed or drifted for: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,200 @@
+"""
+Offline check of the model downloader (main._download_once / _fetch_resumable).
+
+Serves a random "weights" file from a local HTTP server that honours Range
+requests, and can drop the connection part-way through a response, ignore
+Range, or answer 416. Then it walks the cases the downloader has to get
+right:
+
+  interrupted      a dropped connection leaves a partial <name>.part
+  resume           the next attempt sends Range: bytes=<part size>- and only
+                   the remainder crosses the wire; the file is renamed into
+                   place and matches the sha256
+  cached           a second call returns the file without a request
+  retry            a drop inside _download_once is retried and resumed
+  no-range         a server that ignores Range (200) restarts from zero
+  stale-part       a .part longer than the remote (416) starts over
+  sha-mismatch     a wrong sha256 raises, leaving neither the file nor .part
+
+    python benchmarks/download_check.py --size-mb 4
+
+Exits non-zero when a case fails. Needs nothing beyond requirements.txt.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+import main  # noqa: E402
+
+
+class Origin(BaseHTTPRequestHandler):
+    """GET-only file server; class attributes are the knobs each case turns."""
+
+    body = b""
+    honor_range = True
+    cut_after = None  # send only this many body bytes, then drop the connection (once)
+    log = []  # (Range header, status, body bytes sent) per request
+
+    def do_GET(self):
+        cls = type(self)
+        rng = self.headers.get("Range")
+        start, status = 0, 200
+        if rng and cls.honor_range:
+            start = int(re.match(r"bytes=(\d+)-$", rng).group(1))
+            if start >= len(cls.body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(cls.body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                cls.log.append((rng, 416, 0))
+                return
+            status = 206
+        data = cls.body[start:]
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(cls.body) - 1}/{len(cls.body)}")
+        self.end_headers()
+        n = len(data)
+        if cls.cut_after is not None:
+            n, cls.cut_after = min(n, cls.cut_after), None
+        self.wfile.write(data[:n])
+        cls.log.append((rng, status, n))
+        if n < len(data):
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def serve() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Origin)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def reset(**knobs):
+    Origin.honor_range, Origin.cut_after = True, None
+    Origin.log = []
+    for key, value in knobs.items():
+        setattr(Origin, key, value)
+
+
+def run_cases(base: str, size: int) -> list:
+    body = Origin.body
+    sha = hashlib.sha256(body).hexdigest()
+    cut = size // 3
+
+    def target(name: str) -> str:
+        return os.path.join(main.MODEL_DIR, main._fname_from_url(f"{base}/{name}"))
+
+    def interrupted():
+        reset(cut_after=cut)
+        part = target("a.pt") + ".part"
+        try:
+            main._fetch_resumable(f"{base}/a.pt", part)
+        except (requests.RequestException, IOError):
+            pass
+        else:
+            raise AssertionError("dropped connection did not raise")
+        got = os.path.getsize(part)
+        assert 0 < got < size, f".part has {got} of {size} bytes"
+        return f"{got} of {size} bytes kept in .part"
+
+    def resume():
+        part_size = os.path.getsize(target("a.pt") + ".part")
+        reset()
+        path = main._download_once(f"{base}/a.pt", sha)
+        assert Origin.log == [(f"bytes={part_size}-", 206, size - part_size)], Origin.log
+        assert open(path, "rb").read() == body, "content differs"
+        assert not os.path.exists(path + ".part"), ".part left behind"
+        return f"Range bytes={part_size}-, {size - part_size} bytes transferred"
+
+    def cached():
+        reset()
+        main._download_once(f"{base}/a.pt", sha)
+        assert not Origin.log, Origin.log
+        return "no request"
+
+    def retry():
+        reset(cut_after=cut)
+        path = main._download_once(f"{base}/b.pt", sha)
+        statuses = [status for _, status, _ in Origin.log]
+        assert statuses == [200, 206], Origin.log
+        assert open(path, "rb").read() == body, "content differs"
+        return f"requests {Origin.log}"
+
+    def no_range():
+        reset(honor_range=False)
+        part = target("c.pt") + ".part"
+        with open(part, "wb") as f:
+            f.write(b"x" * cut)  # would corrupt the file if appended to
+        path = main._download_once(f"{base}/c.pt", sha)
+        assert Origin.log == [(f"bytes={cut}-", 200, size)], Origin.log
+        assert open(path, "rb").read() == body, "content differs"
+        return "200 answer rewrote .part from zero"
+
+    def stale_part():
+        reset()
+        part = target("d.pt") + ".part"
+        with open(part, "wb") as f:
+            f.write(b"x" * (size + 10))
+        path = main._download_once(f"{base}/d.pt", sha)
+        assert [status for _, status, _ in Origin.log] == [416, 200], Origin.log
+        assert open(path, "rb").read() == body, "content differs"
+        return "416, then a full download"
+
+    def sha_mismatch():
+        reset()
+        try:
+            main._download_once(f"{base}/e.pt", "0" * 64)
+        except RuntimeError as e:
+            assert "Checksum mismatch" in str(e), e
+        else:
+            raise AssertionError("wrong sha256 was accepted")
+        path = target("e.pt")
+        assert not os.path.exists(path) and not os.path.exists(path + ".part"), "leftover file"
+        return "RuntimeError, nothing left on disk"
+
+    results = []
+    for case in (interrupted, resume, cached, retry, no_range, stale_part, sha_mismatch):
+        try:
+            results.append((case.__name__, True, case()))
+        except Exception as e:
+            results.append((case.__name__, False, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--size-mb", type=float, default=4.0, help="size of the served file")
+    args = ap.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    Origin.body = os.urandom(size)
+    server = serve()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    with tempfile.TemporaryDirectory(prefix="pd-download-") as tmp:
+        main.MODEL_DIR = tmp
+        results = run_cases(base, size)
+    server.shutdown()
+
+    for name, ok, detail in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<13} {detail}")
+    failed = [name for name, ok, _ in results if not ok]
+    if failed:
+        sys.exit(f"{len(failed)} case(s) failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,391 @@
+"""
+Load test for the inference API: throughput, tail latency, per-stage time.
+
+Starts main.py on a local port with a one-task manifest (built-in tasks
+disabled, nothing downloaded): either --model <local .pt> or, by default,
+the offline StubYOLO from benchmarks/stub_model.py. It then replays a
+corpus of images against /v1/predict in one of two ways:
+
+  closed loop  --concurrency C   C clients, each sends its next request as
+                                 soon as the previous one returns
+  open loop    --rate R          Poisson arrivals at R req/s regardless of
+                                 how fast the server answers; latency is
+                                 measured from the scheduled arrival, so
+                                 client-side queueing is counted
+
+The report has throughput, p50/p95/p99 latency and status counts, plus the
+mean time per stage (decode, inference, plot, encode, ...) and the mean batch
+size, taken from the difference between /metrics before and after the run.
+--out writes all of it, with the configuration and git revision, as JSON
+for comparing runs.
+
+    python benchmarks/load_test.py --concurrency 8 --duration 30 --out base.json
+    python benchmarks/load_test.py --rate 40 --duration 30 --corpus ./samples --model ./best.pt
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --task fracture --concurrency 4
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+BENCH_TASK = "bench"
+
+
+# ----------------------------
+# Server
+# ----------------------------
+def serve(port: int, stub: bool):
+    """Child process entry: run main.app, optionally with StubYOLO instead of ultralytics."""
+    sys.path.insert(0, REPO)
+    sys.path.insert(0, HERE)
+    import uvicorn
+    import main
+
+    if stub:
+        from stub_model import StubYOLO
+        main.YOLO = StubYOLO  # load_yolo() only imports ultralytics while YOLO is None
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_server(args, workdir: str) -> subprocess.Popen:
+    sys.path.insert(0, REPO)
+    from main import BUILTIN_TASKS
+
+    if args.model:
+        weights = os.path.abspath(args.model)
+    else:
+        weights = os.path.join(workdir, "stub.pt")
+        with open(weights, "wb") as f:
+            f.write(b"stub weights")
+    manifest = {name: {"enabled": False} for name in BUILTIN_TASKS}
+    manifest[BENCH_TASK] = {"path": weights, "mode": args.mode, "warmup": True, "enabled": True}
+    manifest_path = os.path.join(workdir, "models.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+    env = dict(os.environ)
+    env.update({
+        "MODEL_MANIFEST": manifest_path,
+        "MODEL_DIR": workdir,
+        "WARMUP_ON_STARTUP": "1",
+        "RESULT_CACHE_MB": env.get("RESULT_CACHE_MB", "64") if args.cache else "0",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    cmd = [sys.executable, os.path.abspath(__file__), "--serve-port", str(args.port)]
+    if not args.model:
+        cmd.append("--serve-stub")
+    # stderr to a file, not a pipe: nobody drains a pipe during the run
+    with open(os.path.join(workdir, "server.stderr"), "wb") as err:
+        return subprocess.Popen(cmd, cwd=REPO, env=env, start_new_session=True, stderr=err)
+
+
+def server_stderr(workdir: str, limit: int = 4000) -> str:
+    try:
+        with open(os.path.join(workdir, "server.stderr"), "rb") as f:
+            return f.read().decode("utf-8", "replace")[-limit:]
+    except OSError:
+        return ""
+
+
+def wait_ready(base: str, timeout_s: float, proc: subprocess.Popen = None) -> bool:
+    """Poll /readyz; False on timeout, or as soon as the spawned server exits."""
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        try:
+            if requests.get(f"{base}/readyz", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+# ----------------------------
+# Corpus
+# ----------------------------
+def load_corpus(folder: str, n: int, size: str) -> list:
+    if folder:
+        paths = sorted(p for ext in ("png", "jpg", "jpeg") for p in glob.glob(os.path.join(folder, f"*.{ext}")))
+        if not paths:
+            sys.exit(f"no images in {folder}")
+        return [(os.path.basename(p), open(p, "rb").read()) for p in paths]
+    w, h = (int(v) for v in size.lower().split("x"))
+    out = []
+    for i in range(n):
+        rng = np.random.default_rng(i)
+        x = np.linspace(0, 255, w, dtype=np.float32)[None, :]
+        y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+        gray = (0.5 * x + 0.5 * y + rng.normal(0, 12, (h, w))).clip(0, 255).astype(np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(np.stack([gray] * 3, axis=-1)).save(buf, format="JPEG", quality=90)
+        out.append((f"synthetic_{i}.jpg", buf.getvalue()))
+    return out
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+_SAMPLE = re.compile(r'^(\w+)\{([^}]*)\}\s+(\S+)$')
+
+
+def scrape(base: str) -> dict:
+    """(metric, labels) -> value for the histogram sums/counts we diff."""
+    text = requests.get(f"{base}/metrics", timeout=10).text
+    out = {}
+    for line in text.splitlines():
+        m = _SAMPLE.match(line)
+        if not m or not m.group(1).endswith(("_sum", "_count")):
+            continue
+        labels = tuple(sorted(re.findall(r'(\w+)="([^"]*)"', m.group(2))))
+        out[(m.group(1), labels)] = float(m.group(3))
+    return out
+
+
+def stage_breakdown(before: dict, after: dict, task: str) -> dict:
+    def delta(metric, labels):
+        return after.get((metric, labels), 0.0) - before.get((metric, labels), 0.0)
+
+    stages = {}
+    for (metric, labels) in after:
+        if metric != "pd_stage_seconds_count" or ("task", task) not in labels:
+            continue
+        n = delta(metric, labels)
+        if n <= 0:
+            continue
+        stage = dict(labels)["stage"]
+        stages[stage] = {"count": int(n), "mean_ms": round(delta("pd_stage_seconds_sum", labels) / n * 1000, 2)}
+    batch_labels = (("task", task),)
+    n = delta("pd_batch_size_count", batch_labels)
+    batch = round(delta("pd_batch_size_sum", batch_labels) / n, 2) if n > 0 else None
+    return {"stages": stages, "mean_batch_size": batch, "forward_passes": int(n)}
+
+
+# ----------------------------
+# Load generation
+# ----------------------------
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []  # (status, latency_ms)
+
+    def add(self, status, ms):
+        with self.lock:
+            self.samples.append((status, ms))
+
+
+def make_request(session, base, task, corpus, annotation, start, rec: Recorder):
+    name, body = random.choice(corpus)
+    try:
+        r = session.post(f"{base}/v1/predict", files={"file": (name, body)},
+                         data={"task": task, "annotation": annotation}, timeout=120)
+        status = r.status_code
+    except requests.RequestException:
+        status = "error"
+    rec.add(status, (time.perf_counter() - start) * 1000)
+
+
+def closed_loop(args, base, corpus, rec: Recorder):
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    remaining = [args.requests]
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if deadline is None:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            make_request(session, base, args.task, corpus, args.annotation, time.perf_counter(), rec)
+
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def open_loop(args, base, corpus, rec: Recorder):
+    sessions = threading.local()
+
+    def fire(start):
+        if not hasattr(sessions, "s"):
+            sessions.s = requests.Session()
+        make_request(sessions.s, base, args.task, corpus, args.annotation, start, rec)
+
+    rng = random.Random(0)
+    t0 = time.perf_counter()
+    next_at = t0
+    sent = 0
+    with ThreadPoolExecutor(max_workers=args.max_inflight) as pool:
+        while True:
+            next_at += rng.expovariate(args.rate)
+            if args.duration and next_at - t0 >= args.duration:
+                break
+            if not args.duration and sent >= args.requests:
+                break
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, next_at)  # latency counted from the scheduled arrival
+            sent += 1
+
+
+def summarize(rec: Recorder, wall_s: float) -> dict:
+    statuses = {}
+    for status, _ in rec.samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = sorted(ms for status, ms in rec.samples if status == 200)
+
+    def pct(p):
+        return round(ok[min(len(ok) - 1, int(round(p * (len(ok) - 1))))], 1) if ok else None
+
+    return {
+        "requests": len(rec.samples),
+        "ok": len(ok),
+        "statuses": statuses,
+        "wall_s": round(wall_s, 2),
+        "throughput_rps": round(len(ok) / wall_s, 2) if wall_s else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(ok), 1) if ok else None,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": round(ok[-1], 1) if ok else None,
+        },
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--url", default="", help="test a running server instead of starting one")
+    ap.add_argument("--task", default=BENCH_TASK, help="task to request (with --url)")
+    ap.add_argument("--model", default="", help="local weights to serve (default: offline stub model)")
+    ap.add_argument("--mode", default="xray", help="catalog mode of the benchmark task")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--cache", action="store_true", help="keep the result cache on (default: off)")
+    ap.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the server, repeatable")
+    ap.add_argument("--corpus", default="", help="folder of images (default: synthetic)")
+    ap.add_argument("--synthetic", type=int, default=16, help="number of synthetic images")
+    ap.add_argument("--size", default="1600x1200", help="WxH of synthetic images")
+    ap.add_argument("--annotation", default="none", help="annotation form field (png, jpeg, url, boxes, none)")
+    ap.add_argument("--concurrency", type=int, default=8, help="closed-loop clients")
+    ap.add_argument("--rate", type=float, default=0.0, help="open-loop arrivals per second (overrides --concurrency)")
+    ap.add_argument("--max-inflight", type=int, default=256, help="open-loop client thread cap")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds (0 = use --requests)")
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    ap.add_argument("--timeout", type=float, default=300, help="seconds to wait for /readyz")
+    ap.add_argument("--out", default="", help="write JSON results here")
+    ap.add_argument("--serve-port", type=int, default=0, help=argparse.SUPPRESS)
+    ap.add_argument("--serve-stub", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.serve_port:
+        serve(args.serve_port, args.serve_stub)
+        return
+
+    corpus = load_corpus(args.corpus, args.synthetic, args.size)
+    proc = None
+    workdir = None
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        args.task = BENCH_TASK
+        workdir = tempfile.mkdtemp(prefix="pd-load-")
+        proc = start_server(args, workdir)
+        base = f"http://127.0.0.1:{args.port}"
+    try:
+        if not wait_ready(base, args.timeout, proc):
+            if proc is not None and proc.poll() is not None:
+                sys.exit(f"server exited with code {proc.returncode} before it was ready:\n{server_stderr(workdir)}")
+            sys.exit(f"server at {base} not ready after {args.timeout}s")
+        warm = Recorder()
+        session = requests.Session()
+        for _ in range(args.warmup):
+            make_request(session, base, args.task, corpus, args.annotation, time.perf_counter(), warm)
+
+        before = scrape(base)
+        rec = Recorder()
+        t0 = time.perf_counter()
+        if args.rate > 0:
+            open_loop(args, base, corpus, rec)
+        else:
+            closed_loop(args, base, corpus, rec)
+        wall = time.perf_counter() - t0
+        after = scrape(base)
+    finally:
+        if proc is not None and proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGTERM)
+            try:
+                proc.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "config": {
+            "mode": "open" if args.rate > 0 else "closed",
+            "rate": args.rate or None,
+            "concurrency": None if args.rate > 0 else args.concurrency,
+            "duration_s": args.duration or None,
+            "task": args.task,
+            "model": args.model or ("stub" if not args.url else args.url),
+            "annotation": args.annotation,
+            "corpus": args.corpus or f"synthetic {args.synthetic} x {args.size}",
+            "cache": args.cache,
+            "env": args.env,
+        },
+        "git": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **summarize(rec, wall),
+        **stage_breakdown(before, after, args.task),
+    }
+
+    lat = report["latency_ms"]
+    print(f"{report['ok']}/{report['requests']} ok in {report['wall_s']}s -> {report['throughput_rps']} req/s  "
+          f"statuses {report['statuses']}")
+    print(f"latency ms: mean {lat['mean']}  p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"forward passes {report['forward_passes']}, mean batch {report['mean_batch_size']}")
+    for stage, s in sorted(report["stages"].items(), key=lambda kv: -kv[1]["mean_ms"]):
+        print(f"  {stage:<12} {s['mean_ms']:>8} ms  x{s['count']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,162 @@
+"""
+Synthetic DICOM radiographs for exercising the API's DICOM path offline.
+
+Writes a small set of Part 10 files covering the cases main.py handles
+differently, all with a knee-like phantom (two bright "bones" with a gap,
+soft tissue, noise) in 12-bit values stored in 16 bits:
+
+  mono2_window.dcm     MONOCHROME2, rescale slope/intercept + VOI window
+  mono1_nowindow.dcm   MONOCHROME1 (inverted), no window (percentile path)
+  signed.dcm           signed pixels with junk above BitsStored
+  multiframe.dcm       N frames of a slowly moving phantom
+  compressed.dcm       RLE Lossless (decoded by pydicom, not mapped)
+
+    python benchmarks/make_dicom.py --out /tmp/dicom --size 2048 --frames 16
+    curl -F file=@/tmp/dicom/multiframe.dcm -F task=fracture -F annotation=boxes \\
+         http://127.0.0.1:8000/v1/predict
+
+--check decodes every file through main.py's own reader and prints the
+decoded size, time and intensity range per frame (no models needed).
+Needs pydicom; compressed.dcm is skipped when its encoder is unavailable.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, RLELossless, generate_uid
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECONDARY_CAPTURE = "1.2.840.10008.5.1.4.1.1.7"
+
+
+def phantom(size: int, shift: float = 0.0, seed: int = 0) -> np.ndarray:
+    """12-bit knee-ish phantom: soft tissue, two bones with a joint gap, noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    img = 600 + 400 * np.exp(-((x - 0.5) ** 2) / 0.08)  # soft tissue
+    bone_x = np.abs(x - 0.5 - 0.02 * shift) < 0.12
+    img = img + 2200 * (bone_x & (y < 0.46 + 0.01 * shift))  # femur
+    img = img + 2000 * (bone_x & (y > 0.52 + 0.01 * shift))  # tibia
+    img = img + rng.normal(0, 40, img.shape)
+    return np.clip(img, 0, 4095).astype(np.uint16)
+
+
+def base_dataset(rows: int, cols: int, frames: int = 1, syntax=ExplicitVRLittleEndian) -> Dataset:
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SECONDARY_CAPTURE
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = syntax
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = SECONDARY_CAPTURE
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.StudyInstanceUID = generate_uid()
+    ds.SeriesInstanceUID = generate_uid()
+    ds.PatientName = "SYNTHETIC^PHANTOM"
+    ds.PatientID = "0"
+    ds.Modality = "DX"
+    ds.Rows, ds.Columns = rows, cols
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = 16, 12, 11
+    ds.PixelRepresentation = 0
+    if frames > 1:
+        ds.NumberOfFrames = frames
+    if int(pydicom.__version__.split(".")[0]) < 3:
+        ds.is_little_endian, ds.is_implicit_VR = True, False
+    return ds
+
+
+def save(ds: Dataset, path: str):
+    try:
+        ds.save_as(path, enforce_file_format=True)  # pydicom >= 3
+    except TypeError:
+        ds.save_as(path, write_like_original=False)
+
+
+def build(out: str, size: int, frames: int) -> list:
+    os.makedirs(out, exist_ok=True)
+    written = []
+
+    ds = base_dataset(size, size)
+    ds.RescaleSlope, ds.RescaleIntercept = 1, -1024
+    ds.WindowCenter, ds.WindowWidth = 900, 2600
+    ds.PixelData = phantom(size).tobytes()
+    written.append(os.path.join(out, "mono2_window.dcm"))
+    save(ds, written[-1])
+
+    ds = base_dataset(size, size)
+    ds.PhotometricInterpretation = "MONOCHROME1"
+    ds.PixelData = (4095 - phantom(size, seed=1)).astype(np.uint16).tobytes()
+    written.append(os.path.join(out, "mono1_nowindow.dcm"))
+    save(ds, written[-1])
+
+    ds = base_dataset(size, size)
+    ds.PixelRepresentation = 1
+    values = phantom(size, seed=2).astype(np.int16) - 2048
+    junk = np.int16(0x5000)  # bits 12-15 set on every pixel: only BitsStored count
+    ds.PixelData = ((values.view(np.uint16) & 0x0FFF) | junk.view(np.uint16)).tobytes()
+    written.append(os.path.join(out, "signed.dcm"))
+    save(ds, written[-1])
+
+    side = max(256, size // 2)
+    ds = base_dataset(side, side, frames)
+    ds.WindowCenter, ds.WindowWidth = 1900, 3200
+    ds.PixelData = np.stack([phantom(side, shift=i / max(1, frames - 1), seed=i) for i in range(frames)]).tobytes()
+    written.append(os.path.join(out, "multiframe.dcm"))
+    save(ds, written[-1])
+
+    ds = base_dataset(side, side)
+    ds.WindowCenter, ds.WindowWidth = 1900, 3200
+    try:
+        ds.compress(RLELossless, phantom(side, seed=3))
+    except Exception as e:  # no encoder plugin for this pydicom
+        print(f"skipping compressed.dcm: {e}")
+    else:
+        written.append(os.path.join(out, "compressed.dcm"))
+        save(ds, written[-1])
+    return written
+
+
+def check(paths: list, max_side: int):
+    sys.path.insert(0, REPO)
+    import main
+
+    for path in paths:
+        with open(path, "rb") as fp:
+            t0 = time.perf_counter()
+            ds, frames = main._open_dicom(fp)
+            opened = (time.perf_counter() - t0) * 1000
+            mapped = isinstance(frames, np.memmap)
+            for i in range(len(frames)):
+                t0 = time.perf_counter()
+                img, scale = main._dicom_frame_rgb(ds, frames, i, max_side)
+                ms = (time.perf_counter() - t0) * 1000
+                if i == 0 or i == len(frames) - 1:
+                    print(f"{os.path.basename(path):<20} frame {i:>3}  {img.shape[1]}x{img.shape[0]}  "
+                          f"scale {scale:.2f}  range {img.min()}-{img.max()}  mean {img.mean():.0f}  "
+                          f"{ms:.1f} ms  (open {opened:.1f} ms, {'mapped' if mapped else 'decoded'})")
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--out", default="dicom_samples")
+    ap.add_argument("--size", type=int, default=2048, help="rows/columns of the single-frame files")
+    ap.add_argument("--frames", type=int, default=16, help="frames in multiframe.dcm")
+    ap.add_argument("--check", action="store_true", help="decode the files with main.py's reader")
+    ap.add_argument("--max-side", type=int, default=1280)
+    args = ap.parse_args()
+
+    paths = build(args.out, args.size, args.frames)
+    for p in paths:
+        print(f"wrote {p} ({os.path.getsize(p) / 1e6:.1f} MB)")
+    if args.check:
+        check(paths, args.max_side)
+
+
+if __name__ == "__main__":
+    main_cli()
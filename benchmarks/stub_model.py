@@ -0,0 +1,73 @@
+"""
+Stand-in for ultralytics.YOLO so the API can be load-tested offline.
+
+StubYOLO(path) answers model(img_or_list, **kwargs) with objects shaped like
+Ultralytics Results (boxes.xyxy / conf / cls, names, probs=None, plot(),
+update(boxes=...)), which is all main.py uses. A forward pass resizes each
+image to imgsz and then sleeps for a cost model of a small CPU detector:
+``base_ms * (1 + batch_factor * (n - 1))`` for a batch of n. Sleeping
+releases the GIL the way torch kernels do.
+
+Set STUB_BASE_MS / STUB_BATCH_FACTOR to change the cost.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+class _Boxes:
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class _Result:
+    def __init__(self, img: np.ndarray, boxes: _Boxes, names: dict):
+        self.orig_img = img
+        self.boxes = boxes
+        self.names = names
+        self.probs = None
+
+    def update(self, boxes=None):
+        """Replace the boxes with an (N, 6) xyxy/conf/cls array (TTA fusion)."""
+        if boxes is not None:
+            boxes = np.asarray(boxes, np.float32).reshape(-1, 6)
+            self.boxes = _Boxes(boxes[:, :4], boxes[:, 4], boxes[:, 5])
+
+    def plot(self) -> np.ndarray:
+        out = self.orig_img.copy()
+        for x1, y1, x2, y2 in self.boxes.xyxy.astype(int):
+            cv2.rectangle(out, (x1, y1), (x2, y2), (255, 0, 0), 2)
+        return out
+
+
+class StubYOLO:
+    names = {0: "negative", 1: "positive"}
+
+    def __init__(self, path: str = "", task: str = "detect"):
+        self.path = path
+        self.base_ms = float(os.getenv("STUB_BASE_MS", "40"))
+        self.batch_factor = float(os.getenv("STUB_BATCH_FACTOR", "0.35"))
+
+    def _one(self, img: np.ndarray, imgsz: int) -> _Result:
+        h, w = img.shape[:2]
+        cv2.resize(img, (imgsz, imgsz), interpolation=cv2.INTER_LINEAR)
+        # deterministic per image content, so repeated uploads give the same answer
+        seed = int(img[::max(1, h // 8), ::max(1, w // 8)].sum()) % (2 ** 32)
+        rng = np.random.default_rng(seed)
+        n = int(rng.integers(0, 3))
+        x1 = rng.uniform(0, w * 0.7, n)
+        y1 = rng.uniform(0, h * 0.7, n)
+        xyxy = np.stack([x1, y1, x1 + w * 0.2, y1 + h * 0.2], 1).astype(np.float32).reshape(-1, 4)
+        boxes = _Boxes(xyxy, rng.uniform(0.3, 0.95, n).astype(np.float32), rng.integers(0, 2, n).astype(np.float32))
+        return _Result(img, boxes, self.names)
+
+    def __call__(self, source, imgsz: int = 640, **kwargs):
+        imgs = source if isinstance(source, (list, tuple)) else [source]
+        results = [self._one(np.asarray(img), imgsz or 640) for img in imgs]
+        time.sleep(self.base_ms * (1 + self.batch_factor * (len(imgs) - 1)) / 1000.0)
+        return results
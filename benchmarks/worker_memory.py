@@ -0,0 +1,189 @@
+"""
+Memory per worker and throughput: `uvicorn --workers N` vs `serve.py` (pre-fork).
+
+Starts each server in turn, waits until every worker reports ready, fires a
+fixed batch of /v1/predict requests and then reads RSS and PSS of each
+worker from /proc. PSS splits shared pages between the processes sharing
+them, so the PSS sum is the real RAM cost; RSS double-counts shared weights.
+
+    python benchmarks/worker_memory.py --workers 4 --task fracture --requests 200 --concurrency 8
+
+Linux only (/proc). Needs the app's full dependencies and the task's model
+(downloaded on first start).
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def children(pid: int) -> list:
+    """All descendants of pid (via /proc/<pid>/stat ppid)."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # comm may contain spaces; ppid is the 2nd field after the closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    out, todo = [], [pid]
+    while todo:
+        for c in parents.get(todo.pop(), []):
+            out.append(c)
+            todo.append(c)
+    return out
+
+
+def memory_kb(pid: int) -> dict:
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return {"rss_kb": rss, "pss_kb": pss}
+
+
+def is_worker(pid: int) -> bool:
+    """Server workers hold a listening socket's accept loop; skip helpers like the resource tracker."""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            cmd = f.read().replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return False
+    return "resource_tracker" not in cmd
+
+
+def wait_ready(base: str, workers: int, timeout_s: float) -> bool:
+    """/readyz lands on an arbitrary worker: require several consecutive 200s."""
+    deadline = time.time() + timeout_s
+    streak = 0
+    while time.time() < deadline:
+        try:
+            ok = requests.get(f"{base}/readyz", timeout=2).status_code == 200
+        except requests.RequestException:
+            ok = False
+        streak = streak + 1 if ok else 0
+        if streak >= 3 * workers:
+            return True
+        time.sleep(0.2 if ok else 1.0)
+    return False
+
+
+def synthetic_png(size: int = 1024) -> bytes:
+    rng = np.random.default_rng(0)
+    gray = rng.normal(128, 30, (size, size)).clip(0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(gray).convert("RGB").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def load(base: str, task: str, body: bytes, n: int, concurrency: int) -> dict:
+    def one(_):
+        t0 = time.perf_counter()
+        r = requests.post(f"{base}/v1/predict", files={"file": ("x.png", body, "image/png")},
+                          data={"task": task, "annotation": "none"}, timeout=120)
+        return r.status_code, (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n)))
+    wall = time.perf_counter() - t0
+    lat = sorted(ms for code, ms in results if code == 200)
+    return {
+        "ok": len(lat),
+        "errors": n - len(lat),
+        "req_per_s": round(len(lat) / wall, 2),
+        "p50_ms": round(statistics.median(lat), 1) if lat else None,
+        "p95_ms": round(lat[int(0.95 * (len(lat) - 1))], 1) if lat else None,
+    }
+
+
+def bench(label: str, cmd: list, port: int, args, body: bytes) -> dict:
+    env = dict(os.environ, PORT=str(port))
+    proc = subprocess.Popen(cmd, cwd=REPO, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL if not args.verbose else None,
+                            stderr=subprocess.STDOUT if not args.verbose else None)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        if not wait_ready(base, args.workers, args.timeout):
+            raise RuntimeError(f"{label}: not ready after {args.timeout}s")
+        throughput = load(base, args.task, body, args.requests, args.concurrency)
+        workers = [p for p in children(proc.pid) if is_worker(p)]
+        mem = {p: memory_kb(p) for p in workers}
+        launcher = memory_kb(proc.pid)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+    rss = [m["rss_kb"] / 1024 for m in mem.values()]
+    pss = [m["pss_kb"] / 1024 for m in mem.values()]
+    return {
+        "mode": label,
+        "workers": len(mem),
+        "rss_mb_per_worker": round(statistics.mean(rss), 1) if rss else None,
+        "pss_mb_per_worker": round(statistics.mean(pss), 1) if pss else None,
+        "pss_mb_total": round(sum(pss) + launcher["pss_kb"] / 1024, 1),
+        **throughput,
+    }
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--task", default="fracture")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--port", type=int, default=8700)
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--out", default="", help="write JSON results here")
+    ap.add_argument("--verbose", action="store_true", help="show server logs")
+    args = ap.parse_args()
+
+    py = sys.executable
+    modes = [
+        ("uvicorn --workers", [py, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                               "--port", str(args.port), "--workers", str(args.workers)]),
+        ("serve.py pre-fork", [py, "serve.py", "--host", "127.0.0.1", "--port", str(args.port + 1),
+                               "--workers", str(args.workers)]),
+    ]
+    body = synthetic_png()
+    rows = []
+    for i, (label, cmd) in enumerate(modes):
+        row = bench(label, cmd, args.port + i, args, body)
+        rows.append(row)
+        print(f"{label:<20} workers {row['workers']}  RSS/worker {row['rss_mb_per_worker']} MB  "
+              f"PSS/worker {row['pss_mb_per_worker']} MB  PSS total {row['pss_mb_total']} MB  "
+              f"{row['req_per_s']} req/s  p50 {row['p50_ms']} ms  p95 {row['p95_ms']} ms  errors {row['errors']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -2,17 +2,44 @@ import os
 import io
 import base64
 import hashlib
+import functools
 import time
-from typing import Dict, Any, Optional
+import json
+import shutil
+import zipfile
+import zlib
+import tempfile
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import fcntl  # cross-process download lock (POSIX)
+except ImportError:  # pragma: no cover - Windows dev boxes
+    fcntl = None
+
+try:
+    import pydicom  # optional: DICOM uploads (pip install pydicom)
+    try:
+        from pydicom.pixels import apply_modality_lut, apply_voi_lut  # pydicom >= 3
+    except ImportError:
+        from pydicom.pixel_data_handlers.util import apply_modality_lut, apply_voi_lut
+except ImportError:
+    pydicom = None
 
 import numpy as np
 from PIL import Image
 import requests
 import cv2
 
-from fastapi import FastAPI, File, UploadFile, Form
+from fastapi import FastAPI, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+from metrics import REGISTRY, process_resident_bytes
 
 # ----------------------------
 # Config & Model URLs
@@ -45,6 +72,74 @@ MELANOMA_URL = os.getenv(
 MODEL_DIR = os.getenv("MODEL_DIR", "/tmp/models")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# Optional JSON task catalog (see "Model registry" below; models.example.json)
+MODEL_MANIFEST = os.getenv("MODEL_MANIFEST", "")
+# Inference runtime for .pt weights: torch (default), onnx or openvino. Non-torch
+# backends export each model once into MODEL_DIR. INFER_THREADS tunes intra-op
+# threads (0 = runtime default). Per task: "backend" in the manifest. On CPU,
+# openvino measured ~2.5x faster than torch (README, benchmarks/backends.py).
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch").strip().lower()
+# fp32, or int8 to serve the quantized artifact written by quantize.py
+MODEL_VARIANT = os.getenv("MODEL_VARIANT", "fp32").strip().lower()
+INFER_THREADS = int(os.getenv("INFER_THREADS", "0"))
+# Loaded models are evicted least-recently-used beyond this budget (0 = unlimited)
+MODEL_RAM_BUDGET_MB = float(os.getenv("MODEL_RAM_BUDGET_MB", "0"))
+MODEL_DOWNLOAD_WORKERS = int(os.getenv("MODEL_DOWNLOAD_WORKERS", "4"))
+MODEL_DOWNLOAD_RETRIES = int(os.getenv("MODEL_DOWNLOAD_RETRIES", "3"))
+
+# Micro-batching: concurrent uploads for the same task share one forward pass
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+# /v1/predict/batch: max (file, task) items in flight per streamed request
+BATCH_STREAM_WINDOW = int(os.getenv("BATCH_STREAM_WINDOW", "16"))
+
+# Inference executor: worker threads and admitted requests per task.
+# Override per task with e.g. INFER_WORKERS_FRACTURE / INFER_QUEUE_MAX_GONARTHROSIS.
+INFER_WORKERS = int(os.getenv("INFER_WORKERS", "2"))
+INFER_QUEUE_MAX = int(os.getenv("INFER_QUEUE_MAX", "32"))
+INFER_RETRY_AFTER_S = int(os.getenv("INFER_RETRY_AFTER_S", "2"))
+
+# Uploads are decoded to at most ~DECODE_MAX_SIDE px on the long side
+# (models run at 640); 0 keeps full resolution
+DECODE_MAX_SIDE = int(os.getenv("DECODE_MAX_SIDE", "1280"))
+
+# Upload limits, enforced while the body streams in (413 before it is all read):
+# per /v1/predict request, per /v1/predict/batch request (and per zip member),
+# and on the pixel count read from the image header before decoding
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "25"))
+BATCH_UPLOAD_MAX_MB = float(os.getenv("BATCH_UPLOAD_MAX_MB", "512"))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(60_000_000)))
+# DICOM uploads (needs pydicom): MAX_IMAGE_PIXELS applies per frame, and a
+# multi-frame study may hold at most DICOM_MAX_FRAMES frames
+DICOM_MAX_FRAMES = int(os.getenv("DICOM_MAX_FRAMES", "256"))
+
+# Test-time augmentation, opt-in per task ("tta": true in the manifest) or per
+# request (tta=on|off|auto). Only when the top-1 confidence falls inside
+# [TTA_BAND_LOW, TTA_BAND_HIGH] are flipped / zoomed variants run, as one
+# extra batched forward pass, and fused with the first result
+TTA_BAND_LOW = float(os.getenv("TTA_BAND_LOW", "0.3"))
+TTA_BAND_HIGH = float(os.getenv("TTA_BAND_HIGH", "0.7"))
+TTA_SCALES = tuple(float(v) for v in os.getenv("TTA_SCALES", "0.9,1.1").split(",") if v.strip())
+TTA_FLIP = os.getenv("TTA_FLIP", "1") == "1"
+TTA_IOU = float(os.getenv("TTA_IOU", "0.55"))
+TTA_MODES = ("auto", "on", "off")
+
+# Result cache for re-uploaded images (0 MB disables it)
+RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", "64"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "3600"))
+
+# Annotation output: formats accepted by /v1/predict and the bounded store
+# behind GET /v1/annotations/{id}
+ANNOTATION_FORMATS = ("png", "jpeg", "webp", "url", "boxes", "none")
+ANNOTATION_URL_FORMAT = os.getenv("ANNOTATION_URL_FORMAT", "jpeg")
+ANNOTATION_STORE_MB = float(os.getenv("ANNOTATION_STORE_MB", "64"))
+ANNOTATION_TTL_S = float(os.getenv("ANNOTATION_TTL_S", "600"))
+
+# Warmup runs in a background thread after startup; requests for a model that
+# is still warming wait up to MODEL_WAIT_S (0 = fail fast with 503)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+MODEL_WAIT_S = float(os.getenv("MODEL_WAIT_S", "30"))
+
 # ----------------------------
 # App init
 # ----------------------------
@@ -58,6 +153,110 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ----------------------------
+# Metrics (served on /metrics)
+# ----------------------------
+HTTP_REQUESTS = REGISTRY.counter(
+    "pd_http_requests_total", "HTTP requests by route, method and status.", ("path", "method", "status"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "pd_http_request_seconds", "HTTP request latency until response start.", ("path",))
+PREDICTIONS = REGISTRY.counter(
+    "pd_predictions_total", "Predictions by task, status and cache outcome.", ("task", "status", "cache"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "pd_stage_seconds",
+    "Time spent per prediction stage (upload_read, decode, model_load, inference, tta, plot, encode).",
+    ("stage", "task"))
+TTA_RUNS = REGISTRY.counter(
+    "pd_tta_total", "Predictions re-run with test-time augmentation, by whether the label changed.",
+    ("task", "changed"))
+BATCH_SIZE = REGISTRY.histogram(
+    "pd_batch_size", "Images per batched forward pass.", ("task",), buckets=(1, 2, 4, 8, 16, 32, 64))
+
+def _staged(stage: str, task: str, fn, *args):
+    """Call fn(*args) and record its duration as a prediction stage."""
+    with STAGE_SECONDS.time(stage=stage, task=task):
+        return fn(*args)
+
+class _UploadTooLarge(Exception):
+    pass
+
+class UploadLimitMiddleware:
+    """413 for oversized prediction uploads: from Content-Length before any of
+    the body is read, else as soon as the streamed body passes the cap (so a
+    chunked upload is never spooled in full)."""
+
+    SLACK = 64 * 1024  # multipart boundaries and the small form fields
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _limit_mb(scope) -> float:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return 0.0
+        return {"/v1/predict": UPLOAD_MAX_MB, "/v1/predict/batch": BATCH_UPLOAD_MAX_MB}.get(scope["path"], 0.0)
+
+    @staticmethod
+    async def _reject(send, limit_mb: float):
+        body = json.dumps({"error": f"Upload too large (limit {limit_mb:g} MB)"}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        limit_mb = self._limit_mb(scope)
+        if limit_mb <= 0:
+            return await self.app(scope, receive, send)
+        limit = int(limit_mb * 1024 * 1024) + self.SLACK
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            return await self._reject(send, limit_mb)
+
+        seen = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal seen, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                seen += len(message.get("body", b""))
+                if seen > limit:
+                    exceeded = True
+                    raise _UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded:
+                return  # whatever the app answers to the aborted parse is replaced by 413
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _UploadTooLarge:
+            pass
+        if exceeded and not started:
+            await self._reject(send, limit_mb)
+
+# added before http_metrics, so 413s are still counted there
+app.add_middleware(UploadLimitMiddleware)
+
+@app.middleware("http")
+async def http_metrics(request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")  # route template keeps cardinality low
+        HTTP_SECONDS.observe(time.perf_counter() - t0, path=path)
+        HTTP_REQUESTS.inc(path=path, method=request.method, status=status)
+
 # ----------------------------
 # Utilities
 # ----------------------------
@@ -69,23 +268,113 @@ def _fname_from_url(url: str) -> str:
         base = base + ".pt"
     return f"{h}-{base}"
 
-def _download_once(url: str) -> str:
-    """Download to MODEL_DIR if missing; return local path."""
-    if not url:
-        raise RuntimeError("Empty model URL")
-    fname = _fname_from_url(url)
-    path = os.path.join(MODEL_DIR, fname)
-    if os.path.exists(path) and os.path.getsize(path) > 0:
-        return path
-    # stream download
-    with requests.get(url, stream=True, timeout=300) as r:
+_FILE_HASHES: Dict[Tuple[str, int, int], str] = {}
+
+def _file_sha256(path: str) -> str:
+    """SHA-256 of a file, memoized on (path, mtime, size)."""
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    if key not in _FILE_HASHES:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        _FILE_HASHES[key] = h.hexdigest()
+    return _FILE_HASHES[key]
+
+def _load_manifest() -> Dict[str, Any]:
+    if not MODEL_MANIFEST:
+        return {}
+    with open(MODEL_MANIFEST, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock shared by all worker processes using MODEL_DIR."""
+    with open(path, "a+b") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+def _fetch_resumable(url: str, part: str):
+    """Stream url into part, resuming from its current size via HTTP Range."""
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, stream=True, timeout=300, headers=headers) as r:
+        if r.status_code == 416:
+            # stale partial file (e.g. remote changed); start over
+            os.remove(part)
+            return _fetch_resumable(url, part)
         r.raise_for_status()
-        with open(path, "wb") as f:
+        if r.status_code != 206:
+            offset = 0  # server ignored Range
+        total = None
+        if r.status_code == 206 and "/" in r.headers.get("Content-Range", ""):
+            size = r.headers["Content-Range"].rsplit("/", 1)[1]
+            total = int(size) if size.isdigit() else None
+        elif r.headers.get("Content-Length", "").isdigit():
+            total = int(r.headers["Content-Length"])
+        with open(part, "ab" if offset else "wb") as f:
             for chunk in r.iter_content(chunk_size=1024 * 256):
                 if chunk:
                     f.write(chunk)
+    got = os.path.getsize(part)
+    if total is not None and got != total:
+        raise IOError(f"Incomplete download of {url}: {got}/{total} bytes")
+
+def _download_once(url: str, sha256: Optional[str] = None) -> str:
+    """Download to MODEL_DIR if missing; return local path.
+
+    Data goes to '<name>.part' and is renamed into place only when complete
+    (and matching sha256, if given), so a file at the final path is always
+    whole. Interrupted downloads resume; a lock file serializes workers.
+    """
+    if not url:
+        raise RuntimeError("Empty model URL")
+    fname = _fname_from_url(url)
+    path = os.path.join(MODEL_DIR, fname)
+    with _file_lock(path + ".lock"):
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            if sha256 is None or _file_sha256(path) == sha256:
+                return path
+            os.remove(path)  # checksum mismatch: fetch again
+        part = path + ".part"
+        for attempt in range(1, MODEL_DOWNLOAD_RETRIES + 1):
+            try:
+                _fetch_resumable(url, part)
+                break
+            except (requests.RequestException, IOError):
+                if attempt == MODEL_DOWNLOAD_RETRIES:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+        if sha256 is not None and _file_sha256(part) != sha256:
+            os.remove(part)
+            raise RuntimeError(f"Checksum mismatch for {url}")
+        os.replace(part, path)
     return path
 
+def download_all_models(tasks: Optional[list] = None) -> Dict[str, Any]:
+    """Fetch models concurrently (default: every URL task); return task -> path or exception."""
+    if tasks is None:
+        tasks = list(MODEL_URLS)
+    catalog = TASKS  # one snapshot; a manifest reload rebinds TASKS
+    tasks = [t for t in tasks if MODEL_URLS.get(t) and t in catalog and not catalog[t]["path"]]
+    out: Dict[str, Any] = {}
+    if not tasks:
+        return out
+    with ThreadPoolExecutor(max_workers=max(1, MODEL_DOWNLOAD_WORKERS)) as pool:
+        futures = {t: pool.submit(_download_once, MODEL_URLS[t], catalog[t]["sha256"]) for t in tasks}
+        for t, fut in futures.items():
+            try:
+                out[t] = fut.result()
+            except Exception as e:
+                out[t] = e
+    return out
+
 def _to_data_url_png(img_rgb: np.ndarray) -> str:
     """img_rgb expected in RGB uint8, return data:image/png;base64,..."""
     if img_rgb is None:
@@ -99,139 +388,923 @@ def _to_data_url_png(img_rgb: np.ndarray) -> str:
         raise RuntimeError("PNG encode failed")
     return "data:image/png;base64," + base64.b64encode(buf.tobytes()).decode("utf-8")
 
+def _encoding_error(quality: int, max_dim: int) -> Optional[str]:
+    """Why quality/max_dim are unusable (None when they are fine); 0 means no downscale."""
+    if not 1 <= quality <= 100:
+        return f"quality must be between 1 and 100, got {quality}"
+    if max_dim < 0:
+        return f"max_dim must be >= 0, got {max_dim}"
+    return None
+
+def _encode_image(img_rgb: np.ndarray, fmt: str, quality: int = 85, max_dim: int = 0) -> Tuple[bytes, str]:
+    """Encode RGB uint8 as jpeg/webp/png bytes, downscaled so the long side <= max_dim."""
+    bad = _encoding_error(quality, max_dim)
+    if bad is not None:
+        raise ValueError(bad)
+    if img_rgb.dtype != np.uint8:
+        img_rgb = np.clip(img_rgb, 0, 255).astype(np.uint8)
+    h, w = img_rgb.shape[:2]
+    if max_dim and max(h, w) > max_dim:
+        scale = max_dim / float(max(h, w))
+        img_rgb = cv2.resize(img_rgb, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
+    quality = int(quality)
+    if fmt == "jpeg":
+        ok, buf = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    elif fmt == "webp":
+        ok, buf = cv2.imencode(".webp", bgr, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    else:
+        ok, buf = cv2.imencode(".png", bgr)
+        fmt = "png"
+    if not ok:
+        raise RuntimeError(f"{fmt.upper()} encode failed")
+    return buf.tobytes(), f"image/{fmt}"
+
 # ----------------------------
-# Load Ultralytics YOLO lazily
+# Model registry
 # ----------------------------
-YOLO = None
-MODELS: Dict[str, Any] = {
-    "fracture": None,
-    "gonarthrosis": None,  # KL 0-4
-    # "melanoma": None,    # add back later if needed
+# Built-in catalog. MODEL_MANIFEST entries use the same fields and either add
+# tasks or override these (e.g. {"fracture": {"sha256": "..."}}):
+#   url | path      download URL, or local file (relative to the manifest)
+#   sha256          expected checksum of the weights
+#   mode            "xray" | "photo"
+#   class_names     {"0": "name", ...}, overrides the model's own names
+#   num_classes     reported as label_map_keys when class_names is absent
+#   imgsz/conf/iou  Ultralytics predict() arguments
+#   backend         "torch" | "onnx" | "openvino" (default MODEL_BACKEND)
+#   variant         "fp32" | "int8" (default MODEL_VARIANT; int8 needs onnx/openvino)
+#   postprocess     "top_box" (most confident box's class) | "kl_grade" (KL 0-4)
+#   details         fixed clinical note returned with every prediction
+#   warmup          load and warm at startup instead of on first use
+#   tta             test-time augmentation for borderline results (TTA_*)
+#   enabled         false keeps the task listed on /models but unservable
+BUILTIN_TASKS: Dict[str, Dict[str, Any]] = {
+    "fracture": {
+        "url": FRACTURE_URL,
+        "mode": "xray",
+        "num_classes": 2,
+        "postprocess": "top_box",
+        "warmup": True,
+        "details": (
+            "AI fracture screening highlights suspicious regions; absence of a box does not exclude fracture. "
+            "Projection, positioning and artifacts can affect results. Consider clinical exam and follow-up imaging."
+        ),
+    },
+    "gonarthrosis": {  # KL 0-4
+        "url": KNEE_URL,
+        "mode": "xray",
+        "num_classes": 5,
+        "postprocess": "kl_grade",
+        "warmup": True,
+        "details": (
+            "Kellgren–Lawrence (KL) grading estimates radiographic OA severity from 0 (none) to 4 (severe). "
+            "Features include osteophytes, joint-space narrowing, subchondral sclerosis and bony deformity. "
+            "This is an automated estimate; correlate with clinical exam."
+        ),
+    },
+    # currently disabled; set "enabled": true in the manifest to bring it back
+    "melanoma": {"url": MELANOMA_URL, "mode": "photo", "enabled": False},
 }
-MODEL_URLS: Dict[str, Optional[str]] = {
-    "fracture": FRACTURE_URL,
-    "gonarthrosis": KNEE_URL,
-    # "melanoma": MELANOMA_URL,
+TASK_DEFAULTS: Dict[str, Any] = {
+    "url": None, "path": None, "sha256": None, "mode": "photo", "class_names": None,
+    "num_classes": None, "imgsz": None, "conf": None, "iou": None, "postprocess": "top_box",
+    "details": None, "warmup": False, "enabled": True, "backend": None, "variant": None, "tta": False,
 }
+BACKENDS = ("torch", "onnx", "openvino")
+VARIANTS = ("fp32", "int8")
+# fields that identify the weights; changing one on reload drops the loaded model
+_IDENTITY_FIELDS = ("url", "path", "sha256", "backend", "variant", "imgsz")
+
+YOLO = None
+TASKS: Dict[str, Dict[str, Any]] = {}         # every catalog entry, enabled or not
+MODELS: Dict[str, Any] = {}                   # enabled task -> loaded model (None until first use)
+MODEL_URLS: Dict[str, Optional[str]] = {}     # enabled task -> download URL
+MODEL_BYTES: Dict[str, float] = {}            # loaded task -> estimated resident size
+_LAST_USED: Dict[str, float] = {}
+WARMED: set = set()                           # loaded task -> warm-up forward done (warm_model)
+_LOAD_LOCKS: Dict[str, threading.Lock] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def build_catalog() -> Dict[str, Dict[str, Any]]:
+    """Built-in tasks merged with MODEL_MANIFEST, every field filled in."""
+    manifest = _load_manifest()
+    base_dir = os.path.dirname(os.path.abspath(MODEL_MANIFEST)) if MODEL_MANIFEST else os.getcwd()
+    catalog = {}
+    for name in list(BUILTIN_TASKS) + [n for n in manifest if n not in BUILTIN_TASKS]:
+        entry = {**TASK_DEFAULTS, **BUILTIN_TASKS.get(name, {}), **(manifest.get(name) or {})}
+        if entry["path"] and not os.path.isabs(entry["path"]):
+            entry["path"] = os.path.join(base_dir, entry["path"])
+        if entry["sha256"]:
+            entry["sha256"] = entry["sha256"].lower()
+        entry["backend"] = (entry["backend"] or MODEL_BACKEND).lower()
+        if entry["backend"] not in BACKENDS:
+            raise ValueError(f"Unknown backend '{entry['backend']}' for task '{name}'")
+        entry["variant"] = (entry["variant"] or MODEL_VARIANT).lower()
+        if entry["variant"] not in VARIANTS:
+            raise ValueError(f"Unknown variant '{entry['variant']}' for task '{name}'")
+        if entry["variant"] != "fp32" and entry["backend"] == "torch":
+            # the quantized artifact only exists for the CPU runtimes
+            entry["backend"] = "onnx"
+        catalog[name.strip().lower()] = entry
+    return catalog
+
+def apply_catalog(catalog: Dict[str, Dict[str, Any]]) -> Dict[str, list]:
+    """Install a catalog; models whose weights changed are dropped.
+
+    TASKS is swapped in with one rebinding, so readers that never take the
+    lock always see either the old or the new catalog, never a partial one.
+    """
+    global TASKS
+    with _REGISTRY_LOCK:
+        old = TASKS
+        changes = {"added": [], "removed": [], "changed": []}
+        for name, entry in catalog.items():
+            if name not in old:
+                changes["added"].append(name)
+            elif any(old[name][f] != entry[f] for f in _IDENTITY_FIELDS) or old[name]["enabled"] != entry["enabled"]:
+                changes["changed"].append(name)
+        changes["removed"] = [n for n in old if n not in catalog]
+
+        # bookkeeping for new tasks first, so nothing that finds them in TASKS misses it
+        for name, entry in catalog.items():
+            if entry["enabled"]:
+                _LOAD_LOCKS.setdefault(name, threading.Lock())
+                MODEL_STATE.setdefault(name, {"state": "pending", "error": None, "timings_s": {}})
+        # removed / disabled tasks stop being servable (400) before they leave TASKS
+        for name in list(MODELS):
+            if name not in catalog or not catalog[name]["enabled"]:
+                MODELS.pop(name, None)
+                MODEL_URLS.pop(name, None)
+        TASKS = dict(catalog)
+        for name in changes["changed"] + changes["removed"]:
+            _unload(name)
+            RESULT_CACHE.drop_task(name)
+            if MODEL_STATE.get(name, {}).get("state") not in (None, "pending"):
+                _set_state(name, "unloaded")
+        for name, entry in catalog.items():
+            if entry["enabled"]:
+                MODEL_URLS[name] = entry["url"]
+                MODELS.setdefault(name, None)
+        return changes
+
+def _unload(task: str):
+    if MODELS.get(task) is not None:
+        MODELS[task] = None
+    MODEL_BYTES.pop(task, None)
+    _LAST_USED.pop(task, None)
+    WARMED.discard(task)
+    _TASK_FINGERPRINTS.pop(task, None)
+
+def model_path(task: str) -> Optional[str]:
+    """Local weights file for a task (may not exist yet for URL entries)."""
+    entry = TASKS.get(task) or {}
+    if entry.get("path"):
+        return entry["path"]
+    if entry.get("url"):
+        return os.path.join(MODEL_DIR, _fname_from_url(entry["url"]))
+    return None
+
+def _predict_kwargs(task: str) -> Dict[str, Any]:
+    entry = TASKS.get(task) or {}
+    return {k: entry[k] for k in ("imgsz", "conf", "iou") if entry.get(k) is not None}
+
+def _model_param_bytes(model) -> float:
+    try:
+        return float(sum(p.numel() * p.element_size() for p in model.model.parameters()))
+    except Exception:
+        return 0.0
+
+def _enforce_ram_budget(keep: str):
+    """Evict least recently used models until the loaded set fits MODEL_RAM_BUDGET_MB."""
+    budget = MODEL_RAM_BUDGET_MB * 1024 * 1024
+    if budget <= 0:
+        return
+    while sum(MODEL_BYTES.values()) > budget:
+        victims = sorted((t for t in MODEL_BYTES if t != keep), key=lambda t: _LAST_USED.get(t, 0.0))
+        if not victims:
+            break
+        _unload(victims[0])
+        if MODEL_STATE.get(victims[0], {}).get("state") == "ready":
+            _set_state(victims[0], "evicted")
 
 def load_yolo():
     global YOLO
     if YOLO is None:
         from ultralytics import YOLO as _YOLO
         YOLO = _YOLO
+        if INFER_THREADS > 0:
+            import torch
+            torch.set_num_threads(INFER_THREADS)
+
+# ----------------------------
+# CPU runtimes (ONNX Runtime / OpenVINO)
+# ----------------------------
+def export_model(weights: str, backend: str, imgsz: int, target: str) -> str:
+    """Export .pt weights to an onnx file / openvino dir at target (no-op if present)."""
+    with _file_lock(target + ".lock"):
+        if os.path.exists(target):
+            return target
+        load_yolo()
+        # export into a scratch copy: weights may live in a read-only checkout
+        parent = os.path.dirname(os.path.abspath(target))
+        work = tempfile.mkdtemp(prefix="export-", dir=parent)
+        try:
+            stem = os.path.splitext(os.path.basename(weights))[0]
+            scratch = os.path.join(work, stem + ".pt")
+            shutil.copyfile(weights, scratch)
+            exported = YOLO(scratch).export(format=backend, imgsz=imgsz, dynamic=True, half=False)
+            os.replace(str(exported), target)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+    return target
+
+def artifact_path(weights: str, backend: str, imgsz: int, variant: str = "fp32", out_dir: str = MODEL_DIR) -> str:
+    """Where the exported (variant "fp32") or quantized ("int8") model for weights lives."""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    name = f"{stem}-{_file_sha256(weights)[:12]}-{imgsz}"
+    if variant != "fp32":
+        name += f"-{variant}"
+    return os.path.join(out_dir, name + (".onnx" if backend == "onnx" else "_openvino_model"))
+
+def runtime_artifact(task: str, weights: str) -> str:
+    """Exported model for the task's backend/variant, cached in MODEL_DIR and keyed by the weights hash.
+
+    Ultralytics loads the artifact like a .pt and returns the same Results,
+    so box/probs extraction is unchanged. INT8 artifacts need calibration
+    data and are produced offline by quantize.py.
+    """
+    entry = TASKS[task]
+    imgsz = int(entry["imgsz"] or 640)
+    target = artifact_path(weights, entry["backend"], imgsz, entry["variant"])
+    if entry["variant"] != "fp32":
+        if not os.path.exists(target):
+            raise RuntimeError(
+                f"{entry['variant'].upper()} model for '{task}' not found at {target}; "
+                f"run: python quantize.py --task {task} --images <calibration folder> --backend {entry['backend']}"
+            )
+        return target
+    return export_model(weights, entry["backend"], imgsz, target)
+
+def _tune_runtime_threads(model, backend: str, artifact: str):
+    """Rebuild the Ultralytics-created session with INFER_THREADS intra-op threads.
+
+    Ultralytics exposes no thread setting for these runtimes, so the session
+    is swapped after the first predict created it. Best-effort: attribute
+    names differ between Ultralytics releases.
+    """
+    if INFER_THREADS <= 0:
+        return
+    runtime = getattr(getattr(model, "predictor", None), "model", None)
+    try:
+        if backend == "onnx" and hasattr(runtime, "session"):
+            import onnxruntime as ort
+            opts = ort.SessionOptions()
+            opts.intra_op_num_threads = INFER_THREADS
+            opts.inter_op_num_threads = 1
+            runtime.session = ort.InferenceSession(
+                artifact, sess_options=opts, providers=runtime.session.get_providers()
+            )
+        elif backend == "openvino" and hasattr(runtime, "ov_compiled_model"):
+            import openvino as ov
+            core = ov.Core()
+            xml = next(f for f in os.listdir(artifact) if f.endswith(".xml"))
+            runtime.ov_compiled_model = core.compile_model(
+                core.read_model(os.path.join(artifact, xml)),
+                "CPU",
+                {"PERFORMANCE_HINT": "THROUGHPUT", "INFERENCE_NUM_THREADS": INFER_THREADS},
+            )
+    except Exception:
+        pass  # keep the runtime's default threading
 
 def load_model(task: str):
     """Load a YOLO model for a given task if not loaded."""
     if task not in MODELS:
         raise RuntimeError(f"Unknown task: {task}")
+    _LAST_USED[task] = time.monotonic()
     if MODELS[task] is not None:
         return MODELS[task]
+    with _LOAD_LOCKS[task]:  # warmup thread and requests may race here
+        if MODELS[task] is not None:
+            return MODELS[task]
+        try:
+            return _load_locked(task)
+        except Exception as e:
+            # a failed lazy load must not leave the task pending: /readyz reports it
+            if task in MODEL_STATE:
+                _set_state(task, "failed", str(e))
+            raise
+
+def _load_locked(task: str):
+    """load_model's body; the caller holds the task's load lock."""
     load_yolo()
-    url = MODEL_URLS.get(task)
-    has_url = bool(url)
-    if has_url:
-        local = _download_once(url)
-        model = YOLO(local)
+    entry = TASKS.get(task)
+    if entry is None:  # removed by a manifest reload meanwhile
+        raise RuntimeError(f"Unknown task: {task}")
+    if entry["path"]:
+        local = entry["path"]
+        if not os.path.exists(local):
+            raise RuntimeError(f"Model file for '{task}' not found: {local}")
+    elif entry["url"]:
+        local = _download_once(entry["url"], entry["sha256"])
     else:
-        raise RuntimeError(f"No URL for model '{task}'")
+        raise RuntimeError(f"No URL or path for model '{task}'")
+    with STAGE_SECONDS.time(stage="model_load", task=task):
+        backend = entry["backend"]
+        if backend == "torch":
+            model = YOLO(local)
+        else:
+            artifact = runtime_artifact(task, local)
+            model = YOLO(artifact)  # task/names come from the export metadata
+            # first predict builds the runtime session, which is then tuned
+            model(np.zeros((64, 64, 3), dtype=np.uint8), **_predict_kwargs(task))
+            _tune_runtime_threads(model, backend, artifact)
+    model_fingerprint(task)  # labels pd_model_info with the file hash
+    MODEL_BYTES[task] = _model_param_bytes(model) or float(os.path.getsize(local))
     MODELS[task] = model
+    if MODEL_STATE[task]["state"] in ("pending", "evicted", "unloaded", "failed"):
+        _set_state(task, "ready")
+    _enforce_ram_budget(keep=task)
     return model
 
-def warmup_models():
-    """Optional: warmup both models once to reduce first-pred latency."""
-    try:
-        for t in ["fracture", "gonarthrosis"]:
-            m = load_model(t)
-            # warmup with tiny white image
-            dummy = np.full((320, 320, 3), 255, dtype=np.uint8)
-            _ = m(dummy)
-    except Exception:
-        # warmup is best-effort; don't crash startup
-        pass
+# ----------------------------
+# Background warmup & readiness
+# ----------------------------
+WARMING_STATES = ("downloading", "loading", "warming")
 
-# Warm up in background-ish manner
-try:
-    warmup_models()
-except Exception:
-    pass
+# per-model state: pending -> downloading -> loading -> warming -> ready | failed;
+# ready models pushed out by the RAM budget become evicted, and models dropped
+# by a manifest reload unloaded (both reload on use)
+MODEL_STATE: Dict[str, Dict[str, Any]] = {}
+
+def warmup_tasks() -> list:
+    return [t for t, e in TASKS.items() if e["enabled"] and e["warmup"]]
+
+def _set_state(task: str, state: str, error: Optional[str] = None):
+    MODEL_STATE[task]["state"] = state
+    MODEL_STATE[task]["error"] = error
+
+def warm_model(task: str):
+    """One forward on a tiny white image. Ultralytics fuses Conv+BN and builds
+    its predictor on the first call, replacing the weight tensors."""
+    model = load_model(task)
+    dummy = np.full((320, 320, 3), 255, dtype=np.uint8)
+    model(dummy, **_predict_kwargs(task))
+    WARMED.add(task)
+
+def warmup_models(tasks: Optional[list] = None):
+    """Download, load and warm the catalog's warmup tasks (or the given subset
+    of them), recording per-model state and timings."""
+    wanted = warmup_tasks() if tasks is None else [t for t in warmup_tasks() if t in tasks]
+    tasks = [t for t in wanted if not (t in WARMED and MODELS.get(t) is not None)]
+    for t in tasks:
+        _set_state(t, "downloading")
+    t0 = time.perf_counter()
+    downloaded = download_all_models(tasks)  # parallel fetch; load_model reuses the files
+    download_s = time.perf_counter() - t0
+    for t in tasks:
+        timings = MODEL_STATE[t]["timings_s"]
+        timings["download"] = round(download_s, 3)
+        if isinstance(downloaded.get(t), Exception):
+            _set_state(t, "failed", f"download: {downloaded[t]}")
+            continue
+        try:
+            _set_state(t, "loading")
+            t0 = time.perf_counter()
+            load_model(t)
+            timings["load"] = round(time.perf_counter() - t0, 3)
+
+            _set_state(t, "warming")
+            t0 = time.perf_counter()
+            warm_model(t)
+            timings["warmup"] = round(time.perf_counter() - t0, 3)
+            _set_state(t, "ready")
+        except Exception as e:
+            # warmup is best-effort; requests retry the lazy load
+            _set_state(t, "failed", str(e))
+
+async def wait_until_ready(task: str, timeout_s: float = MODEL_WAIT_S) -> bool:
+    """Wait while the task's model is warming; False if it is still warming after timeout_s."""
+    deadline = time.monotonic() + timeout_s
+    while MODEL_STATE[task]["state"] in WARMING_STATES:
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
 
 # ----------------------------
-# Endpoints
+# Inference executor & backpressure
 # ----------------------------
-@app.get("/healthz")
-def healthz():
-    return {"ok": True, "ts": int(time.time())}
+EXECUTORS: Dict[str, ThreadPoolExecutor] = {}
+INFLIGHT: Dict[str, int] = {}
+_ADMIT_WAITERS: Dict[str, deque] = {}  # task -> futures of callers parked in _admit_wait
 
-@app.get("/models")
-def models_status():
-    out = {}
-    for name in ["fracture", "gonarthrosis", "melanoma"]:
-        url = MODEL_URLS.get(name)
-        loaded = MODELS.get(name) is not None
-        if name == "melanoma":
-            # currently disabled (per your last request to remove)
-            out[name] = {
-                "has_url": bool(url),
-                "loaded": False,
-                "backend": None,
-                "mode": "photo",
-                "label_map_keys": None,
-            }
+def _task_setting(name: str, task: str, default: int) -> int:
+    """Per-task override of an int setting, e.g. INFER_WORKERS_FRACTURE."""
+    return int(os.getenv(f"{name}_{task.upper()}", str(default)))
+
+def get_executor(task: str) -> ThreadPoolExecutor:
+    """Bounded thread pool for blocking work (decode, forward, plot, encode) of one task."""
+    if task not in EXECUTORS:
+        workers = max(1, _task_setting("INFER_WORKERS", task, INFER_WORKERS))
+        EXECUTORS[task] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"infer-{task}")
+    return EXECUTORS[task]
+
+def _admit(task: str) -> bool:
+    """Reserve a slot for one request; False when the task's queue is full."""
+    limit = _task_setting("INFER_QUEUE_MAX", task, INFER_QUEUE_MAX)
+    if INFLIGHT.get(task, 0) >= limit:
+        return False
+    INFLIGHT[task] = INFLIGHT.get(task, 0) + 1
+    return True
+
+def _release(task: str):
+    INFLIGHT[task] = max(0, INFLIGHT.get(task, 0) - 1)
+    _wake_next(task)
+
+def _wake_next(task: str):
+    waiters = _ADMIT_WAITERS.get(task)
+    while waiters:
+        fut = waiters.popleft()
+        if not fut.done():
+            fut.set_result(None)
+            return
+
+async def _admit_wait(task: str):
+    """Wait (in arrival order) for a slot instead of bouncing with 503; woken by _release."""
+    waiters = _ADMIT_WAITERS.setdefault(task, deque())
+    first = True
+    while not _admit(task):
+        fut = asyncio.get_running_loop().create_future()
+        if first:
+            waiters.append(fut)
+            first = False
         else:
-            out[name] = {
-                "has_url": bool(url),
-                "loaded": loaded,
-                "backend": "yolo" if loaded else None,
-                "mode": "xray" if name in ("fracture", "gonarthrosis") else "photo",
-                "label_map_keys": ["0", "1"] if name == "fracture" else ["0", "1", "2", "3", "4"],
+            waiters.appendleft(fut)  # lost its slot to a new request: back to the front
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                _wake_next(task)  # woken but leaving: hand the slot on
+            else:
+                try:
+                    waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+
+def _busy_response(task: str, reason: str = "Server busy") -> JSONResponse:
+    return JSONResponse(
+        {"error": f"{reason} for task '{task}', retry later"},
+        status_code=503,
+        headers={"Retry-After": str(INFER_RETRY_AFTER_S)},
+    )
+
+async def run_blocking(task: str, fn, *args):
+    """Run a blocking call on the task's executor without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(task), fn, *args)
+
+# ----------------------------
+# Micro-batching
+# ----------------------------
+class TaskBatcher:
+    """Per-task queue that groups pending images into one forward pass.
+
+    The first image waits at most ``max_wait_ms`` for company; a batch is
+    dispatched as soon as it reaches ``max_size``. Groups (submit_group) are
+    never split, so the last one may take a batch past ``max_size``. Forward passes for a task
+    run one at a time on a worker thread (Ultralytics models are not
+    thread-safe), while new requests keep queueing for the next batch.
+    """
+
+    def __init__(self, task: str, max_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.task = task
+        self.max_size = max(1, int(max_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+
+    async def submit(self, img_np: np.ndarray):
+        """Queue one RGB image and return its Ultralytics result."""
+        return (await self.submit_group([img_np]))[0]
+
+    async def submit_group(self, imgs: list) -> list:
+        """Queue images that must share one forward pass; returns their results in order."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+            self._loop = loop
+        fut = loop.create_future()
+        await self._queue.put((imgs, fut))
+        return await fut
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+            size += len(batch[-1][0])
+        # callers that disconnected while waiting don't need a forward pass
+        return [(imgs, fut) for imgs, fut in batch if not fut.cancelled()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            try:
+                results = await run_blocking(self.task, self._forward, [img for imgs, _ in batch for img in imgs])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            start = 0
+            for imgs, fut in batch:
+                if not fut.done():
+                    fut.set_result(results[start:start + len(imgs)])
+                start += len(imgs)
+
+    def _forward(self, imgs):
+        model = load_model(self.task)
+        BATCH_SIZE.observe(len(imgs), task=self.task)
+        with STAGE_SECONDS.time(stage="inference", task=self.task):
+            return model(imgs, **_predict_kwargs(self.task))  # Ultralytics API, one Results per image
+
+BATCHERS: Dict[str, TaskBatcher] = {}
+
+def get_batcher(task: str) -> TaskBatcher:
+    if task not in BATCHERS:
+        BATCHERS[task] = TaskBatcher(task)
+    return BATCHERS[task]
+
+# ----------------------------
+# Result cache
+# ----------------------------
+class ResultCache:
+    """Thread-safe LRU + TTL cache under a byte budget (prediction payloads, annotation images)."""
+
+    def __init__(self, max_bytes: int, ttl_s: float):
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s)
+        self._entries: "OrderedDict[str, Tuple[float, int, str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, _, _, payload = entry
+            if time.time() - stored_at > self.ttl_s:
+                self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key: str, task: str, payload: Any, size: Optional[int] = None):
+        if size is None:
+            size = len(json.dumps(payload))
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.time(), size, task, payload)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def drop_task(self, task: str):
+        """Forget every entry for a task (its model file changed)."""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e[2] == task]:
+                self._pop(key)
+
+    def _pop(self, key: str):
+        _, size, _, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
             }
-    return out
 
-@app.post("/v1/predict")
-async def predict(file: UploadFile = File(...), task: str = Form(...)):
-    task = task.strip().lower()
-    if task not in MODELS:
-        return JSONResponse({"error": f"Unsupported task '{task}'"}, status_code=400)
+RESULT_CACHE = ResultCache(int(RESULT_CACHE_MB * 1024 * 1024), RESULT_CACHE_TTL_S)
+ANNOTATIONS = ResultCache(int(ANNOTATION_STORE_MB * 1024 * 1024), ANNOTATION_TTL_S)
+
+_TASK_FINGERPRINTS: Dict[str, str] = {}
 
-    # Read image
-    data = await file.read()
+def model_fingerprint(task: str) -> Optional[str]:
+    """SHA-256 of the task's model file, None if not downloaded yet.
+
+    Hashes are memoized on (path, mtime, size), so steady state costs one stat().
+    A changed file drops the task's cached results and its loaded model.
+    """
+    path = model_path(task)
+    if not path:
+        return None
     try:
-        img = Image.open(io.BytesIO(data)).convert("RGB")
-    except Exception as e:
-        return JSONResponse({"error": f"Invalid image: {e}"}, status_code=400)
-    img_np = np.array(img)
+        digest = _file_sha256(path)
+    except OSError:
+        return None
+    previous = _TASK_FINGERPRINTS.get(task)
+    if previous is not None and previous != digest:
+        RESULT_CACHE.drop_task(task)
+        if MODELS.get(task) is not None:
+            MODELS[task] = None  # reload from the new file on next use
+            WARMED.discard(task)
+    _TASK_FINGERPRINTS[task] = digest
+    return digest
+
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _sha256_file(fp, chunk: int = 1 << 20) -> str:
+    """sha256 of a file object read in chunks; fp is rewound."""
+    h = hashlib.sha256()
+    fp.seek(0)
+    for block in iter(lambda: fp.read(chunk), b""):
+        h.update(block)
+    fp.seek(0)
+    return h.hexdigest()
 
-    # Load model (lazy) & run
+def _cache_variant(annotation: str, quality: int, max_dim: int, tta: str = "auto") -> Optional[str]:
+    # url payloads point into the annotation store, which may expire first
+    if annotation == "url":
+        return None
+    variant = f"{annotation}:{quality}:{max_dim}"
+    return variant if tta == "auto" else f"{variant}:tta-{tta}"
+
+def _cache_key(task: str, digest: str, variant: str = "png") -> Optional[str]:
+    """Content address of (upload digest, task, model file, output variant); None when uncacheable."""
+    if not RESULT_CACHE.enabled:
+        return None
+    fingerprint = model_fingerprint(task)
+    if fingerprint is None:
+        return None
+    return digest + ":" + task + ":" + fingerprint + ":" + variant
+
+def _payload_size(payload: Dict[str, Any]) -> int:
+    """Bytes a payload is charged in RESULT_CACHE. The annotated image (a
+    base64 data URL) dominates, so it is counted by length and only the rest
+    is serialized."""
+    image = payload.get("annotated_image") or ""
+    rest = {k: v for k, v in payload.items() if k != "annotated_image"}
+    return len(image) + len(json.dumps(rest))
+
+def _cache_slot(task: str, digest: str, variant: str, payload: Dict[str, Any]) -> Tuple[Optional[str], int]:
+    """Cache key and size for a fresh payload (blocking: may hash the model file)."""
+    key = _cache_key(task, digest, variant)
+    return key, (_payload_size(payload) if key is not None else 0)
+
+apply_catalog(build_catalog())
+
+# ----------------------------
+# Prediction helpers
+# ----------------------------
+# Modes whose box-filter average converts to the same RGB as averaging after
+# convert("RGB"); everything else is converted before reduce()
+_REDUCE_MODES = ("L", "LA", "RGB", "RGBA", "RGBX", "CMYK")
+
+def _decode_rgb(data: bytes, max_side: int = DECODE_MAX_SIDE) -> Tuple[np.ndarray, float]:
+    """Decode uploaded bytes to an RGB uint8 array no larger than ~max_side.
+
+    JPEGs use draft mode (DCT-domain 1/2, 1/4, 1/8 scaling during decode);
+    other formats are reduced by an integer box filter after decode. Returns
+    (array, scale) where scale maps array pixels back to the original image.
+    """
+    img = Image.open(io.BytesIO(data))
+    orig_w = img.size[0]
+    if max_side and max(img.size) > max_side:
+        # draft only ever scales down to >= the requested size; no-op for non-JPEG
+        w, h = img.size
+        ratio = max_side / float(max(w, h))
+        img.draft("RGB", (max(1, int(w * ratio)), max(1, int(h * ratio))))
+        factor = int(max(img.size) // max_side)
+        if factor >= 2:
+            if img.mode not in _REDUCE_MODES:
+                # palette / 1-bit / 16-bit / float: reduce() refuses them or
+                # would average palette indices, so go to RGB first
+                img = img.convert("RGB")
+            img = img.reduce(factor)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    # asarray wraps PIL's buffer instead of copying it a second time (read-only)
+    img_np = np.asarray(img)
+    return img_np, orig_w / float(img_np.shape[1])
+
+# Uncompressed little-endian transfer syntaxes: stored pixel values can be
+# mapped straight from the file
+_DICOM_NATIVE_SYNTAXES = ("1.2.840.10008.1.2", "1.2.840.10008.1.2.1")
+
+def _is_dicom(fp) -> bool:
+    """True for a DICOM Part 10 file (preamble + "DICM"); fp is rewound."""
     try:
-        model = load_model(task)
-        results = model(img_np)  # Ultralytics API
-        res = results[0]
-    except Exception as e:
-        return JSONResponse({"error": f"Inference failed: {e}"}, status_code=500)
+        return _sniff_image(fp.read(132)) == "dicom"
+    finally:
+        fp.seek(0)
 
-    # Build annotated image
+def _dicom_value(ds, keyword: str) -> Optional[float]:
+    """First value of a possibly multi-valued numeric attribute, None if absent."""
+    value = ds.get(keyword)
+    if value is None or value == "":
+        return None
+    return float(np.ravel(np.asarray(value, dtype=np.float64))[0])
+
+def _map_pixels(fp, offset: int, dtype: np.dtype, shape: Tuple[int, ...]) -> np.ndarray:
+    """Read-only view of shape/dtype starting at byte offset of fp, memory-mapped when fp is on disk."""
+    raw = getattr(fp, "_file", fp)  # SpooledTemporaryFile: BytesIO until it rolls over to disk
+    if not isinstance(raw, io.BytesIO):
+        try:
+            return np.memmap(raw, dtype=dtype, mode="r", offset=offset, shape=shape)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            pass
+    raw.seek(0)
+    buf = raw.getvalue() if isinstance(raw, io.BytesIO) else raw.read()
+    return np.frombuffer(buf, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+def _open_dicom(fp) -> Tuple[Any, np.ndarray]:
+    """Parse a DICOM file; returns (dataset, frames) with frames[i] the stored
+    values of frame i, shaped (rows, cols) or (rows, cols, samples).
+
+    Large elements are not read while parsing. Uncompressed little-endian
+    grayscale pixel data is never read here either: frames is a view mapped
+    from the file at the pixel data offset, so a frame's pages are only
+    touched when it is windowed. Anything else (JPEG, JPEG 2000, RLE, colour)
+    is decoded up front by pydicom with whatever decoder plugins are installed.
+    """
+    if pydicom is None:
+        raise RuntimeError("DICOM support needs pydicom (pip install pydicom)")
+    fp.seek(0)
+    ds = pydicom.dcmread(fp, defer_size=4096)
+    rows, cols = int(ds.Rows), int(ds.Columns)
+    n = int(_dicom_value(ds, "NumberOfFrames") or 1)
+    samples = int(ds.get("SamplesPerPixel", 1))
     try:
-        plotted = res.plot()  # Ultralytics returns RGB np.ndarray
-        # Some builds may return BGR; detect by a quick heuristic if needed
-        # We'll trust it's RGB; PNG encode downstream handles conversion
-        annotated_data_url = _to_data_url_png(plotted)
-        annotated_ok = True
-    except Exception:
-        # fallback: original
-        annotated_data_url = _to_data_url_png(img_np)
-        annotated_ok = False
+        elem = ds.get_item(0x7FE00010, keep_deferred=True)  # PixelData: offset + length, value unread
+    except TypeError:  # pydicom < 3: get_item has no keep_deferred, the raw element sits in _dict
+        elem = ds._dict.get(0x7FE00010)
+    if elem is None:
+        raise ValueError("no pixel data")
+
+    syntax = str(ds.file_meta.get("TransferSyntaxUID", ""))
+    bits = int(ds.get("BitsAllocated", 0))
+    offset = getattr(elem, "value_tell", None)
+    if syntax in _DICOM_NATIVE_SYNTAXES and samples == 1 and bits in (8, 16, 32) and offset is not None:
+        dtype = np.dtype(("<i" if int(ds.get("PixelRepresentation", 0)) == 1 else "<u") + str(bits // 8))
+        if elem.length >= n * rows * cols * dtype.itemsize:
+            return ds, _map_pixels(fp, offset, dtype, (n, rows, cols))
+
+    # re-read without deferral: pydicom cannot reopen a spooled upload later
+    fp.seek(0)
+    ds = pydicom.dcmread(fp)
+    pixels = ds.pixel_array
+    return ds, pixels.reshape((n, rows, cols) + ((samples,) if samples > 1 else ()))
+
+def _dicom_stored(pixels: np.ndarray, ds) -> np.ndarray:
+    """Drop whatever sits above BitsStored (mapped values still carry it),
+    sign-extending signed data."""
+    bits = int(ds.get("BitsAllocated", 16))
+    stored = int(ds.get("BitsStored", bits))
+    if stored >= bits or pixels.dtype.kind not in "iu":
+        return pixels
+    shift = bits - stored
+    return np.right_shift(np.left_shift(pixels, shift), shift)
+
+def _dicom_unit(pixels: np.ndarray, ds) -> np.ndarray:
+    """Grayscale stored values -> float32 display intensities in [0, 1].
+
+    Modality LUT (rescale slope/intercept) first, then the file's first VOI
+    window, or its VOI LUT, else a 0.5-99.5 percentile window. MONOCHROME1
+    is inverted so bone comes out bright, as in the exports the X-ray
+    models were trained on.
+    """
+    if "ModalityLUTSequence" in ds:
+        arr = apply_modality_lut(pixels, ds)
+    else:
+        # rescale slope/intercept in float32 (pydicom's version returns float64)
+        arr = pixels.astype(np.float32)
+        slope, intercept = _dicom_value(ds, "RescaleSlope"), _dicom_value(ds, "RescaleIntercept")
+        if slope is not None and slope != 1:
+            arr *= slope
+        if intercept:
+            arr += intercept
+    center, width = _dicom_value(ds, "WindowCenter"), _dicom_value(ds, "WindowWidth")
+    if center is not None and width is not None and width > 0:
+        lo, hi = center - width / 2.0, center + width / 2.0
+        arr = arr.astype(np.float32, copy=False)
+    elif "VOILUTSequence" in ds:
+        arr = apply_voi_lut(arr, ds).astype(np.float32, copy=False)
+        lo, hi = float(arr.min()), float(arr.max())
+    else:
+        arr = arr.astype(np.float32, copy=False)
+        lo, hi = (float(v) for v in np.percentile(arr[::4, ::4], (0.5, 99.5)))
+    out = (arr - lo) * (1.0 / max(hi - lo, 1e-6))
+    np.clip(out, 0.0, 1.0, out=out)
+    if str(ds.get("PhotometricInterpretation", "")).strip() == "MONOCHROME1":
+        out = 1.0 - out
+    return out
 
-    # Extract prediction summary
+def _dicom_frame_rgb(ds, frames: np.ndarray, index: int,
+                     max_side: int = DECODE_MAX_SIDE) -> Tuple[np.ndarray, float]:
+    """One frame as an RGB uint8 array no larger than ~max_side, plus the
+    scale back to the stored resolution (the _decode_rgb contract).
+
+    Values keep the stored bit depth (then float) until a single 8-bit
+    quantisation at the end. With a purely linear pipeline (rescale +
+    window) the stored frame is area-downsampled first and windowed at
+    model size; LUT sequences are applied at full resolution instead.
+    """
+    frame = np.asarray(frames[index])  # mapped data: reads this frame's pages only
+    h, w = frame.shape[:2]
+    size = None
+    if max_side and max(h, w) > max_side:
+        ratio = max_side / float(max(h, w))
+        size = (max(1, round(w * ratio)), max(1, round(h * ratio)))
+    if frame.ndim == 2:
+        frame = _dicom_stored(frame, ds)
+        if size is not None and "ModalityLUTSequence" not in ds and "VOILUTSequence" not in ds:
+            if frame.dtype not in (np.uint8, np.uint16, np.int16):  # cv2 has no 32-bit integer resize
+                frame = frame.astype(np.float32)
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            size = None
+        img = _dicom_unit(frame, ds)
+    elif frame.dtype == np.uint8:
+        img = frame.astype(np.float32) * (1.0 / 255.0)
+    else:
+        img = frame.astype(np.float32) * (1.0 / max(float(frame.max()), 1.0))
+    if size is not None:
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    img = (img * 255.0 + 0.5).astype(np.uint8)
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    return img, w / float(img.shape[1])
+
+def _dicom_meta(ds, frames: int) -> Dict[str, Any]:
+    """Acquisition facts echoed in the response; no patient identifiers."""
+    center, width = _dicom_value(ds, "WindowCenter"), _dicom_value(ds, "WindowWidth")
+    return {
+        "frames": frames,
+        "rows": int(ds.Rows),
+        "columns": int(ds.Columns),
+        "modality": str(ds.get("Modality", "")) or None,
+        "photometric": str(ds.get("PhotometricInterpretation", "")) or None,
+        "bits_stored": int(ds.get("BitsStored", 0)) or None,
+        "window": [center, width] if center is not None and width is not None else None,
+    }
+
+def _class_names(task: str, res) -> Dict[int, str]:
+    """Catalog class_names when configured, else the model's own names."""
+    configured = (TASKS.get(task) or {}).get("class_names")
+    if configured:
+        return {int(k): v for k, v in configured.items()}
+    return getattr(res, "names", {}) or {}
+
+def _summarize(task: str, res) -> Dict[str, Any]:
+    """label/confidence/details for one Ultralytics result."""
+    entry = TASKS.get(task) or TASK_DEFAULTS
+    names = _class_names(task, res)
     label = "No finding"
     conf = 0.0
-    details = None
-    caveat = None
 
     # 1) If classification probs exist (rare for your use), prefer them
     if getattr(res, "probs", None) is not None and res.probs is not None:
         # res.probs.top1, res.names dict, res.probs.data (Tensor)
         top1 = int(res.probs.top1)
-        label = res.names.get(top1, f"class_{top1}")
+        label = names.get(top1, f"class_{top1}")
         try:
             conf = float(res.probs.top1conf)
         except Exception:
@@ -244,40 +1317,718 @@ async def predict(file: UploadFile = File(...), task: str = Form(...)):
             confs = boxes.conf.detach().cpu().numpy() if hasattr(boxes.conf, "detach") else np.array(boxes.conf)
             idx = int(np.argmax(confs))
             cls_id = int(boxes.cls[idx])
-            names = getattr(res, "names", {}) or {}
             raw_label = names.get(cls_id, f"class_{cls_id}")
-            if task == "gonarthrosis":
+            if entry["postprocess"] == "kl_grade":
                 # map to KL wording
                 # Expect classes 0..4 -> KL 0..4
                 label = f"KL grade {cls_id}"
-                details = "Automated Kellgren–Lawrence estimate; confirm clinically."
             else:
-                # fracture: assume 1=fracture, 0=no fracture in your training
+                # top_box, e.g. fracture: assume 1=fracture, 0=no fracture in your training
                 label = raw_label
             conf = float(confs[idx])
 
-    # Clinical notes (fixed brief)
-    if task == "gonarthrosis":
-        details = (
-            "Kellgren–Lawrence (KL) grading estimates radiographic OA severity from 0 (none) to 4 (severe). "
-            "Features include osteophytes, joint-space narrowing, subchondral sclerosis and bony deformity. "
-            "This is an automated estimate; correlate with clinical exam."
-        )
-    elif task == "fracture":
-        details = (
-            "AI fracture screening highlights suspicious regions; absence of a box does not exclude fracture. "
-            "Projection, positioning and artifacts can affect results. Consider clinical exam and follow-up imaging."
-        )
+    # Clinical notes (fixed brief, from the catalog)
+    return {"label": label, "confidence": conf, "details": entry["details"]}
+
+def _as_numpy(t) -> np.ndarray:
+    return t.detach().cpu().numpy() if hasattr(t, "detach") else np.asarray(t)
+
+def _extract_boxes(task: str, res, scale: float = 1.0) -> list:
+    """Detection boxes as plain dicts (original-image pixel xyxy), for clients that draw their own overlay."""
+    boxes = getattr(res, "boxes", None)
+    if boxes is None or len(boxes) == 0:
+        return []
+    xyxy, confs, classes = _as_numpy(boxes.xyxy) * scale, _as_numpy(boxes.conf), _as_numpy(boxes.cls)
+    names = _class_names(task, res)
+    out = []
+    for (x1, y1, x2, y2), c, k in zip(xyxy.tolist(), confs.tolist(), classes.astype(int).tolist()):
+        out.append({
+            "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+            "confidence": c, "class_id": k, "label": names.get(k, f"class_{k}"),
+        })
+    return out
+
+def _build_payload(task: str, res, img_np: np.ndarray, annotation: str = "png",
+                   quality: int = 85, max_dim: int = 0, scale: float = 1.0) -> Dict[str, Any]:
+    """Annotate and summarize one Ultralytics result (blocking; run on the executor).
+
+    annotation: png (default data URL), jpeg/webp (data URL at quality/max_dim),
+    url (stored, fetched via /v1/annotations/{id}), boxes (raw boxes only), none.
+    """
+    payload = _summarize(task, res)
+    payload["caveat"] = None
+    if annotation not in ("png", "none"):
+        payload["boxes"] = _extract_boxes(task, res, scale)
+    if annotation in ("none", "boxes"):
+        return payload
 
+    # Build annotated image
+    try:
+        with STAGE_SECONDS.time(stage="plot", task=task):
+            plotted = res.plot()  # Ultralytics returns RGB np.ndarray
+        # Some builds may return BGR; detect by a quick heuristic if needed
+        # We'll trust it's RGB; encode downstream handles conversion
+        annotated_ok = True
+    except Exception:
+        # fallback: original
+        plotted = img_np
+        annotated_ok = False
     # If we failed to annotate, set caveat
     if not annotated_ok:
-        caveat = "Showing original image (annotation unavailable)."
-
-    payload = {
-        "label": label,
-        "confidence": conf,
-        "details": details,
-        "caveat": caveat,
-        "annotated_image": annotated_data_url,  # <-- frontend displays this
-    }
-    return JSONResponse(payload)
+        payload["caveat"] = "Showing original image (annotation unavailable)."
+
+    if annotation == "png":
+        with STAGE_SECONDS.time(stage="encode", task=task):
+            payload["annotated_image"] = _to_data_url_png(plotted)  # <-- frontend displays this
+        return payload
+    if annotation == "url":
+        fmt = ANNOTATION_URL_FORMAT
+        body, media_type = _staged("encode", task, _encode_image, plotted, fmt, quality, max_dim)
+        ann_id = hashlib.sha256(body).hexdigest()[:32]
+        ANNOTATIONS.put(ann_id, task, (media_type, body), size=len(body))
+        payload["annotated_url"] = f"/v1/annotations/{ann_id}"
+        return payload
+    body, media_type = _staged("encode", task, _encode_image, plotted, annotation, quality, max_dim)
+    payload["annotated_image"] = f"data:{media_type};base64," + base64.b64encode(body).decode("utf-8")
+    return payload
+
+# ----------------------------
+# Endpoints
+# ----------------------------
+@app.on_event("startup")
+def start_warmup():
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=warmup_models, name="model-warmup", daemon=True).start()
+
+@app.get("/healthz")
+def healthz():
+    return {"ok": True, "ts": int(time.time())}
+
+@app.get("/readyz")
+def readyz():
+    """200 once every warmup model is ready; 503 with per-model states before that."""
+    models = {t: MODEL_STATE[t] for t in warmup_tasks() if t in MODEL_STATE}
+    ready = all(m["state"] in ("ready", "evicted", "unloaded") for m in models.values())
+    return JSONResponse({"ready": ready, "models": models}, status_code=200 if ready else 503)
+
+def _label_map_keys(name: str) -> Optional[list]:
+    entry = TASKS.get(name) or TASK_DEFAULTS
+    if entry["class_names"]:
+        return [str(k) for k in entry["class_names"]]
+    if entry["num_classes"]:
+        return [str(i) for i in range(int(entry["num_classes"]))]
+    model = MODELS.get(name)
+    names = getattr(model, "names", None) if model is not None else None
+    return [str(k) for k in names] if names else None
+
+@app.get("/models")
+def models_status():
+    out = {}
+    for name, entry in list(TASKS.items()):
+        has_url = bool(entry["url"] or entry["path"])
+        if not entry["enabled"]:
+            out[name] = {
+                "has_url": has_url,
+                "loaded": False,
+                "backend": None,
+                "mode": entry["mode"],
+                "label_map_keys": None,
+            }
+            continue
+        loaded = MODELS.get(name) is not None
+        out[name] = {
+            "has_url": has_url,
+            "loaded": loaded,
+            "state": MODEL_STATE[name]["state"],
+            "backend": ("yolo" if entry["backend"] == "torch" else entry["backend"]) if loaded else None,
+            "mode": entry["mode"],
+            "label_map_keys": _label_map_keys(name),
+            "postprocess": entry["postprocess"],
+            "variant": entry["variant"],
+            "tta": entry["tta"],
+            "resident_mb": round(MODEL_BYTES.get(name, 0.0) / (1024 * 1024), 1),
+        }
+    return out
+
+@app.post("/v1/models/reload")
+def models_reload():
+    """Re-read MODEL_MANIFEST; tasks whose weights changed are unloaded and reload on next use.
+
+    Added or changed tasks marked "warmup" are warmed in the background like
+    at startup, since /readyz waits for them.
+    """
+    try:
+        changes = apply_catalog(build_catalog())
+    except (OSError, ValueError) as e:
+        return JSONResponse({"error": f"Manifest reload failed: {e}"}, status_code=400)
+    rewarm = [t for t in warmup_tasks() if t in changes["added"] or t in changes["changed"]]
+    if rewarm:
+        threading.Thread(target=warmup_models, args=(rewarm,), name="model-warmup", daemon=True).start()
+    return {"ok": True, **changes, "warming": rewarm}
+
+@app.get("/v1/cache/stats")
+def cache_stats():
+    return {"results": RESULT_CACHE.stats(), "annotations": ANNOTATIONS.stats()}
+
+def _model_info() -> Dict[Tuple, float]:
+    out = {}
+    for t, url in MODEL_URLS.items():
+        sha = _TASK_FINGERPRINTS.get(t) or ""
+        out[(t, url or "", sha[:16])] = 1.0 if MODELS.get(t) is not None else 0.0
+    return out
+
+def _cache_gauge(field: str):
+    return lambda: {(name,): float(c.stats()[field]) for name, c in (("results", RESULT_CACHE), ("annotations", ANNOTATIONS))}
+
+REGISTRY.gauge("pd_inflight_requests", "Admitted requests in flight per task.", ("task",),
+               callback=lambda: {(t,): float(n) for t, n in INFLIGHT.items()})
+REGISTRY.gauge("pd_batch_queue_depth", "Submissions (images or TTA groups) waiting in the micro-batch queue per task.", ("task",),
+               callback=lambda: {(t,): float(b._queue.qsize() if b._queue else 0) for t, b in BATCHERS.items()})
+REGISTRY.gauge("pd_model_info", "1 when the task's model is loaded; labels identify the model file.",
+               ("task", "url", "sha256"), callback=_model_info)
+REGISTRY.gauge("pd_model_param_bytes", "Parameter memory of each loaded model.", ("task",),
+               callback=lambda: {(t,): _model_param_bytes(m) for t, m in MODELS.items() if m is not None})
+REGISTRY.gauge("pd_process_resident_bytes", "Resident set size of this worker process.",
+               callback=lambda: {(): process_resident_bytes()})
+REGISTRY.gauge("pd_cache_hits", "Cache hits since start.", ("cache",), callback=_cache_gauge("hits"))
+REGISTRY.gauge("pd_cache_misses", "Cache misses since start.", ("cache",), callback=_cache_gauge("misses"))
+REGISTRY.gauge("pd_cache_hit_ratio", "Cache hit ratio since start.", ("cache",), callback=_cache_gauge("hit_ratio"))
+REGISTRY.gauge("pd_cache_bytes", "Bytes held by each cache.", ("cache",), callback=_cache_gauge("bytes"))
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/v1/annotations/{ann_id}")
+def get_annotation(ann_id: str):
+    stored = ANNOTATIONS.get(ann_id)
+    if stored is None:
+        return JSONResponse({"error": "Annotation not found or expired"}, status_code=404)
+    media_type, body = stored
+    return Response(content=body, media_type=media_type)
+
+# ----------------------------
+# Test-time augmentation
+# ----------------------------
+def _tta_wanted(task: str, tta: str) -> bool:
+    if tta == "auto":
+        return bool((TASKS.get(task) or TASK_DEFAULTS)["tta"])
+    return tta == "on"
+
+def _tta_variants(img_np: np.ndarray) -> Tuple[list, list]:
+    """Augmented copies of img_np and, per copy, (flip, x0, y0, width): where
+    the copy's origin sits in img_np (before the horizontal flip, if any).
+
+    Zoom is a centre crop (scale > 1) or padding (scale < 1), not a resize:
+    the model letterboxes every input to imgsz anyway, so only a change in
+    field of view changes the scale it sees.
+    """
+    h, w = img_np.shape[:2]
+    imgs, specs = [], []
+    for s in (1.0,) + TTA_SCALES:
+        if s > 1.0:
+            cw, ch = max(1, round(w / s)), max(1, round(h / s))
+            x0, y0 = (w - cw) // 2, (h - ch) // 2
+            base = np.ascontiguousarray(img_np[y0:y0 + ch, x0:x0 + cw])
+        elif 0.0 < s < 1.0:
+            px, py = round(w / s) - w, round(h / s) - h
+            x0, y0 = -(px // 2), -(py // 2)
+            base = cv2.copyMakeBorder(img_np, py // 2, py - py // 2, px // 2, px - px // 2,
+                                      cv2.BORDER_CONSTANT, value=(114, 114, 114))  # letterbox grey
+        elif s == 1.0:
+            x0 = y0 = 0
+            base = img_np
+        else:
+            continue
+        for flip in ((False, True) if TTA_FLIP else (False,)):
+            if s == 1.0 and not flip:
+                continue  # the first pass already ran on the original
+            imgs.append(np.ascontiguousarray(base[:, ::-1]) if flip else base)
+            specs.append((flip, x0, y0, base.shape[1]))
+    return imgs, specs
+
+def _tta_boxes(res, spec: Tuple, shape: Tuple[int, int]) -> np.ndarray:
+    """(N, 6) xyxy/conf/cls of one variant's result in original image pixels."""
+    boxes = getattr(res, "boxes", None)
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 6), np.float32)
+    flip, x0, y0, width = spec
+    xyxy = _as_numpy(boxes.xyxy).astype(np.float32)
+    if flip:
+        xyxy[:, [0, 2]] = width - xyxy[:, [2, 0]]
+    xyxy[:, [0, 2]] += x0
+    xyxy[:, [1, 3]] += y0
+    h, w = shape
+    xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, w)
+    xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, h)
+    conf = _as_numpy(boxes.conf).astype(np.float32)
+    cls = _as_numpy(boxes.cls).astype(np.float32)
+    return np.column_stack([xyxy, conf, cls])
+
+def _weighted_box_fusion(dets: list, iou_thr: float = TTA_IOU) -> np.ndarray:
+    """Fuse per-pass (N, 6) xyxy/conf/cls arrays into one.
+
+    Boxes are taken by descending confidence; one joins the same-class
+    cluster it overlaps most (IoU >= iou_thr) or starts a new one. A
+    cluster's box is the confidence-weighted mean of its members, its
+    confidence their mean scaled by the share of passes that found it, so a
+    box seen by one pass out of six keeps a sixth of its score.
+    """
+    passes = len(dets)
+    rows = np.concatenate(dets) if dets else np.zeros((0, 6), np.float32)
+    if not len(rows):
+        return rows
+    rows = rows[np.argsort(-rows[:, 4], kind="stable")]
+    clusters: list = []
+    fused = np.zeros((0, 6), np.float32)
+    for row in rows:
+        match = -1
+        if len(fused):
+            x1 = np.maximum(fused[:, 0], row[0])
+            y1 = np.maximum(fused[:, 1], row[1])
+            x2 = np.minimum(fused[:, 2], row[2])
+            y2 = np.minimum(fused[:, 3], row[3])
+            inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+            union = ((fused[:, 2] - fused[:, 0]) * (fused[:, 3] - fused[:, 1])
+                     + (row[2] - row[0]) * (row[3] - row[1]) - inter)
+            iou = np.where(fused[:, 5] == row[5], inter / np.maximum(union, 1e-9), -1.0)
+            best = int(np.argmax(iou))
+            if iou[best] >= iou_thr:
+                match = best
+        if match < 0:
+            clusters.append([row])
+            fused = np.vstack([fused, row[None]])
+            continue
+        clusters[match].append(row)
+        members = np.stack(clusters[match])
+        weights = members[:, 4]
+        fused[match, :4] = (members[:, :4] * weights[:, None]).sum(0) / max(float(weights.sum()), 1e-9)
+        fused[match, 4] = weights.mean()
+    counts = np.array([len(c) for c in clusters], np.float32)
+    fused[:, 4] *= np.minimum(counts, passes) / passes
+    return fused[np.argsort(-fused[:, 4], kind="stable")]
+
+def _like(ref, arr: np.ndarray):
+    """arr as the same array type (torch tensor on ref's device, or numpy) as ref."""
+    return ref.new_tensor(arr) if hasattr(ref, "new_tensor") else arr
+
+def _tta_fuse(task: str, res, variants: list, specs: list, shape: Tuple[int, int]):
+    """Merge the variant results into res (in place): probabilities are
+    averaged, detection boxes fused with _weighted_box_fusion."""
+    probs = getattr(res, "probs", None)
+    if probs is not None:
+        mean = sum(_as_numpy(r.probs.data).astype(np.float32) for r in [res] + variants) / (len(variants) + 1)
+        res.probs = type(probs)(_like(probs.data, mean))
+        return res
+    if getattr(res, "boxes", None) is None:
+        return res
+    dets = [_tta_boxes(res, (False, 0, 0, shape[1]), shape)]
+    dets += [_tta_boxes(r, spec, shape) for r, spec in zip(variants, specs)]
+    res.update(boxes=_like(res.boxes.xyxy, _weighted_box_fusion(dets)))
+    return res
+
+async def _apply_tta(task: str, res, img_np: np.ndarray) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """TTA for results inside the uncertainty band; returns (result, report or None)."""
+    before = _summarize(task, res)
+    if not TTA_BAND_LOW <= before["confidence"] <= TTA_BAND_HIGH:
+        return res, None
+    imgs, specs = await run_blocking(task, _tta_variants, img_np)
+    if not imgs:
+        return res, None
+    # one group: all variants go through the same forward pass
+    variants = await get_batcher(task).submit_group(imgs)
+    res = await run_blocking(task, _staged, "tta", task, _tta_fuse, task, res, variants, specs, img_np.shape[:2])
+    after = _summarize(task, res)
+    TTA_RUNS.inc(task=task, changed=str(after["label"] != before["label"]).lower())
+    return res, {"passes": len(imgs) + 1, "label_before": before["label"], "confidence_before": before["confidence"]}
+
+async def _infer_task(task: str, img_np: np.ndarray, scale: float, digest: Optional[str],
+                      annotation: str, quality: int, max_dim: int, tta: str = "auto") -> Tuple[int, Dict[str, Any]]:
+    """Run one task on an already decoded image and cache the payload."""
+    if not await wait_until_ready(task):
+        return 503, {"error": f"Model still warming up for task '{task}', retry later"}
+
+    # Load model (lazy) & run, batched with concurrent uploads for this task
+    try:
+        res = await get_batcher(task).submit(img_np)
+        report = None
+        if _tta_wanted(task, tta):
+            res, report = await _apply_tta(task, res, img_np)
+    except Exception as e:
+        return 500, {"error": f"Inference failed: {e}"}
+
+    payload = await run_blocking(task, _build_payload, task, res, img_np, annotation, quality, max_dim, scale)
+    if report is not None:
+        payload["tta"] = report
+    if digest is not None:
+        # model file exists after the first load, so the key is computed now;
+        # sizing the payload happens off the loop as well
+        cache_key, size = await run_blocking(
+            task, _cache_slot, task, digest, _cache_variant(annotation, quality, max_dim, tta), payload
+        )
+        if cache_key is not None:
+            RESULT_CACHE.put(cache_key, task, payload, size=size)
+    return 200, payload
+
+async def _predict_decoded(tasks: list, digest: Optional[str], decode, annotation: str, quality: int,
+                           max_dim: int, tta: str = "auto") -> Dict[str, Tuple[int, Dict[str, Any]]]:
+    """Serve tasks from the result cache, else decode() once (-> (array, scale))
+    and run the remaining models concurrently on the shared array."""
+    variant = _cache_variant(annotation, quality, max_dim, tta)
+    if variant is None:
+        digest = None
+    out: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    for task in tasks:
+        cache_key = await run_blocking(task, _cache_key, task, digest, variant) if digest else None
+        cached = RESULT_CACHE.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            out[task] = (200, cached)
+            PREDICTIONS.inc(task=task, status=200, cache="hit")
+    todo = [t for t in tasks if t not in out]
+    if not todo:
+        return out
+
+    try:
+        img_np, scale = await run_blocking(todo[0], _staged, "decode", todo[0], decode)
+    except Exception as e:
+        results = [(400, {"error": f"Invalid image: {e}"})] * len(todo)
+    else:
+        results = await asyncio.gather(
+            *[_infer_task(t, img_np, scale, digest, annotation, quality, max_dim, tta) for t in todo]
+        )
+    for task, (status, payload) in zip(todo, results):
+        out[task] = (status, payload)
+        PREDICTIONS.inc(task=task, status=status, cache="miss")
+    return out
+
+async def _predict_tasks(tasks: list, data: bytes, annotation: str = "png", quality: int = 85,
+                         max_dim: int = 0, tta: str = "auto") -> Dict[str, Tuple[int, Dict[str, Any]]]:
+    """Predict one upload for several tasks; returns task -> (HTTP status, payload or error body).
+
+    The image is decoded once and the models run concurrently on the shared
+    array. The caller must hold an admission slot for every task.
+    """
+    if _sniff_image(data[:132]) == "dicom":
+        return await _predict_dicom(tasks, io.BytesIO(data), annotation, quality, max_dim, tta)
+    digest = None
+    if _cache_variant(annotation, quality, max_dim, tta) is not None and RESULT_CACHE.enabled:
+        digest = await run_blocking(tasks[0], _sha256_hex, data)
+    return await _predict_decoded(tasks, digest, functools.partial(_decode_rgb, data),
+                                  annotation, quality, max_dim, tta)
+
+async def _predict_dicom(tasks: list, fp, annotation: str = "png", quality: int = 85,
+                         max_dim: int = 0, tta: str = "auto") -> Dict[str, Tuple[int, Dict[str, Any]]]:
+    """_predict_tasks for a DICOM file object (read from disk, never as one bytes blob).
+
+    Every frame is windowed and downsampled on its own and goes through the
+    same cache / batcher path as an uploaded image, at most
+    BATCH_STREAM_WINDOW frames at a time, so the frames of a multi-frame
+    study fill the batched forward passes. A single-frame file answers like
+    an image plus a "dicom" block; otherwise the payload is
+    {"dicom": ..., "frames": [per-frame payload with its "frame" index]}.
+    """
+    digest = None
+    if _cache_variant(annotation, quality, max_dim, tta) is not None and RESULT_CACHE.enabled:
+        digest = await run_blocking(tasks[0], _sha256_file, fp)
+    try:
+        ds, frames = await run_blocking(tasks[0], _staged, "decode", tasks[0], _open_dicom, fp)
+    except Exception as e:
+        return {t: (400, {"error": f"Invalid DICOM: {e}"}) for t in tasks}
+    meta = _dicom_meta(ds, len(frames))
+    window = asyncio.Semaphore(max(1, BATCH_STREAM_WINDOW))
+
+    async def one(index: int):
+        async with window:
+            return await _predict_decoded(
+                tasks, f"{digest}:{index}" if digest else None,
+                functools.partial(_dicom_frame_rgb, ds, frames, index), annotation, quality, max_dim, tta,
+            )
+
+    per_frame = await asyncio.gather(*[one(i) for i in range(len(frames))])
+    out: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    for task in tasks:
+        results = [r[task] for r in per_frame]
+        if len(results) == 1:
+            status, payload = results[0]
+            out[task] = (status, {**payload, "dicom": meta})
+            continue
+        statuses = [status for status, _ in results]
+        items = [
+            {"frame": i, **(payload if status == 200 else {**payload, "status": status})}
+            for i, (status, payload) in enumerate(results)
+        ]
+        out[task] = (200 if 200 in statuses else statuses[0], {"dicom": meta, "frames": items})
+    return out
+
+async def _predict_bytes(task: str, data: bytes, annotation: str = "png", quality: int = 85,
+                         max_dim: int = 0, tta: str = "auto") -> Tuple[int, Dict[str, Any]]:
+    """Single-task form of _predict_tasks."""
+    return (await _predict_tasks([task], data, annotation, quality, max_dim, tta))[task]
+
+_MAGIC = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+
+def _sniff_image(head: bytes) -> Optional[str]:
+    """Image format from the leading bytes, None if it is not one we decode."""
+    for magic, fmt in _MAGIC:
+        if head.startswith(magic):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[128:132] == b"DICM":  # Part 10: 128-byte preamble, then the magic
+        return "dicom"
+    return None
+
+def _inspect_dicom(fp) -> Optional[Tuple[int, str]]:
+    """_inspect_image for DICOM: dimensions and frame count from the header."""
+    if pydicom is None:
+        return 415, "DICOM uploads are not enabled on this server (pydicom is not installed)"
+    try:
+        ds = pydicom.dcmread(fp, stop_before_pixels=True, defer_size=4096)
+        rows, cols = int(ds.Rows), int(ds.Columns)
+        frames = int(_dicom_value(ds, "NumberOfFrames") or 1)
+    except Exception:
+        return 400, "Unreadable DICOM file"
+    if rows * cols > MAX_IMAGE_PIXELS:
+        return 413, f"DICOM frames are {cols}x{rows}; at most {MAX_IMAGE_PIXELS} pixels are accepted"
+    if DICOM_MAX_FRAMES > 0 and frames > DICOM_MAX_FRAMES:
+        return 413, f"DICOM has {frames} frames; at most {DICOM_MAX_FRAMES} are accepted"
+    return None
+
+def _inspect_image(fp) -> Optional[Tuple[int, str]]:
+    """(status, error) if fp is not an acceptable image, judged from its magic
+    bytes and header dimensions only (no pixel decode); fp is rewound."""
+    try:
+        fmt = _sniff_image(fp.read(132))
+        if fmt is None:
+            return 415, "Unsupported file type (expected PNG, JPEG, WebP, BMP, TIFF, GIF or DICOM)"
+        fp.seek(0)
+        if fmt == "dicom":
+            return _inspect_dicom(fp)
+        try:
+            with Image.open(fp) as img:  # parses the header, pixels stay on disk
+                w, h = img.size
+        except Image.DecompressionBombError:
+            return 413, "Image dimensions too large"
+        except Exception:
+            return 400, f"Unreadable {fmt.upper()} image"
+        if w * h > MAX_IMAGE_PIXELS:
+            return 413, f"Image is {w}x{h}; at most {MAX_IMAGE_PIXELS} pixels are accepted"
+        return None
+    finally:
+        fp.seek(0)
+
+def _check_upload(file: UploadFile) -> Optional[JSONResponse]:
+    size = getattr(file, "size", None)
+    if UPLOAD_MAX_MB > 0 and size is not None and size > UPLOAD_MAX_MB * 1024 * 1024:
+        return JSONResponse({"error": f"Upload too large (limit {UPLOAD_MAX_MB:g} MB)"}, status_code=413)
+    bad = _inspect_image(file.file)
+    if bad is not None:
+        return JSONResponse({"error": bad[1]}, status_code=bad[0])
+    return None
+
+def _check_annotation(annotation: str) -> Optional[JSONResponse]:
+    if annotation not in ANNOTATION_FORMATS:
+        return JSONResponse(
+            {"error": f"Unsupported annotation '{annotation}', use one of {list(ANNOTATION_FORMATS)}"},
+            status_code=400,
+        )
+    return None
+
+def _check_encoding(quality: int, max_dim: int) -> Optional[JSONResponse]:
+    bad = _encoding_error(quality, max_dim)
+    if bad is not None:
+        return JSONResponse({"error": bad}, status_code=400)
+    return None
+
+def _check_tta(tta: str) -> Optional[JSONResponse]:
+    if tta not in TTA_MODES:
+        return JSONResponse({"error": f"Unsupported tta '{tta}', use one of {list(TTA_MODES)}"}, status_code=400)
+    return None
+
+@app.post("/v1/predict")
+async def predict(
+    file: UploadFile = File(...),
+    task: str = Form(...),
+    annotation: str = Form("png"),
+    quality: int = Form(85),
+    max_dim: int = Form(0),
+    tta: str = Form("auto"),
+):
+    """Predict one upload. task may list several tasks ("fracture,gonarthrosis");
+    the image is then decoded once and the response is {"results": {task: payload}}.
+    DICOM files are accepted as well (see _predict_dicom for the payload).
+    tta: auto (the task's catalog setting), on or off; see TTA_BAND_LOW.
+    """
+    tasks = list(dict.fromkeys(t.strip().lower() for t in task.split(",") if t.strip()))
+    unknown = [t for t in tasks if t not in MODELS]
+    if not tasks or unknown:
+        return JSONResponse({"error": f"Unsupported task '{', '.join(unknown) or task.strip()}'"}, status_code=400)
+    annotation = annotation.strip().lower()
+    bad = _check_annotation(annotation) or _check_encoding(quality, max_dim)
+    if bad is None:
+        tta = tta.strip().lower()
+        bad = _check_tta(tta)
+    if bad is not None:
+        return bad
+    # cheap checks on the spooled upload before it takes an inference slot
+    bad = _check_upload(file)
+    if bad is not None:
+        return bad
+
+    admitted = []
+    for t in tasks:
+        if not _admit(t):
+            for a in admitted:
+                _release(a)
+            return _busy_response(t)
+        admitted.append(t)
+    try:
+        if _is_dicom(file.file):
+            # frames are mapped from the spooled upload instead of read into memory
+            results = await _predict_dicom(tasks, file.file, annotation, quality, max_dim, tta)
+        else:
+            with STAGE_SECONDS.time(stage="upload_read", task=",".join(tasks)):
+                data = await file.read()
+            results = await _predict_tasks(tasks, data, annotation, quality, max_dim, tta)
+    finally:
+        for t in admitted:
+            _release(t)
+
+    if len(tasks) == 1:
+        status, payload = results[tasks[0]]
+        headers = {"Retry-After": str(INFER_RETRY_AFTER_S)} if status == 503 else None
+        return JSONResponse(payload, status_code=status, headers=headers)
+
+    combined = {}
+    for t, (status, payload) in results.items():
+        combined[t] = payload if status == 200 else {**payload, "status": status}
+    statuses = [status for status, _ in results.values()]
+    status = 200 if 200 in statuses else statuses[0]
+    return JSONResponse({"results": combined}, status_code=status)
+
+async def _iter_batch_inputs(files: list):
+    """Yield (name, bytes) for each upload, expanding zip archives member by member.
+
+    Archives are parsed and inflated on a worker thread, never on the event
+    loop. A member is inflated only after its declared size passed the
+    limit, and zipfile never returns more than that declared size.
+    """
+    loop = asyncio.get_running_loop()
+    for f in files:
+        name = f.filename or "upload"
+        head = await f.read(4)
+        await f.seek(0)
+        if name.lower().endswith(".zip") or head == b"PK\x03\x04":
+            try:
+                archive = await loop.run_in_executor(None, zipfile.ZipFile, f.file)
+            except zipfile.BadZipFile as e:
+                yield name, e
+                continue
+            for info in archive.infolist():
+                base = os.path.basename(info.filename)
+                if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                if UPLOAD_MAX_MB > 0 and info.file_size > UPLOAD_MAX_MB * 1024 * 1024:
+                    # judged from the central directory, before inflating anything
+                    yield f"{name}/{info.filename}", ValueError(f"member larger than {UPLOAD_MAX_MB:g} MB")
+                    continue
+                try:
+                    data = await loop.run_in_executor(None, archive.read, info)
+                except (zipfile.BadZipFile, zlib.error, EOFError) as e:  # bad CRC, truncated member
+                    data = zipfile.BadZipFile(f"{info.filename}: {e}")
+                yield f"{name}/{info.filename}", data
+        elif UPLOAD_MAX_MB > 0 and (getattr(f, "size", None) or 0) > UPLOAD_MAX_MB * 1024 * 1024:
+            yield name, ValueError(f"file larger than {UPLOAD_MAX_MB:g} MB")
+        else:
+            yield name, await f.read()
+
+async def _batch_item(index: int, name: str, task: str, data, annotation: str,
+                      quality: int, max_dim: int, tta: str = "auto") -> Dict[str, Any]:
+    head = {"index": index, "file": name, "task": task}
+    if isinstance(data, zipfile.BadZipFile):
+        return {**head, "status": 400, "error": f"Invalid archive: {data}"}
+    if isinstance(data, Exception):
+        return {**head, "status": 413, "error": f"Upload too large: {data}"}
+    bad = _inspect_image(io.BytesIO(data))
+    if bad is not None:
+        return {**head, "status": bad[0], "error": bad[1]}
+    # streamed jobs wait for a slot instead of bouncing with 503
+    await _admit_wait(task)
+    try:
+        status, payload = await _predict_bytes(task, data, annotation, quality, max_dim, tta)
+    except Exception as e:
+        # one bad item must not end the whole stream
+        status, payload = 500, {"error": f"Prediction failed: {e}"}
+    finally:
+        _release(task)
+    return {**head, "status": status, **payload}
+
+@app.post("/v1/predict/batch")
+async def predict_batch(request: Request):
+    """Predict many images (or zip archives of images) for one or more tasks.
+
+    multipart/form-data fields: files (repeated), tasks (comma separated),
+    optional annotation (default boxes), quality, max_dim, tta. Results stream back
+    as NDJSON, one line per (file, task) in completion order. At most
+    BATCH_STREAM_WINDOW items are in flight, so memory stays bounded however
+    large the upload set is.
+    """
+    # Parsed by hand: FastAPI closes UploadFile params when the endpoint
+    # returns, before a streamed body has read them.
+    form = await request.form()
+    files = [f for f in form.getlist("files") if hasattr(f, "read")]
+    tasks = str(form.get("tasks") or form.get("task") or "")
+    task_list = [t.strip().lower() for t in tasks.split(",") if t.strip()]
+    unknown = [t for t in task_list if t not in MODELS]
+    annotation = str(form.get("annotation") or "boxes").strip().lower()
+    tta = str(form.get("tta") or "auto").strip().lower()
+    try:
+        quality = int(form.get("quality") or 85)
+        max_dim = int(form.get("max_dim") or 0)
+    except ValueError:
+        quality = None
+    error = None
+    if not files:
+        error = JSONResponse({"error": "No files uploaded"}, status_code=400)
+    elif not task_list or unknown:
+        error = JSONResponse({"error": f"Unsupported task(s) {unknown or tasks!r}"}, status_code=400)
+    elif quality is None:
+        error = JSONResponse({"error": "quality and max_dim must be integers"}, status_code=400)
+    else:
+        error = _check_annotation(annotation) or _check_encoding(quality, max_dim) or _check_tta(tta)
+    if error is not None:
+        await form.close()
+        return error
+
+    async def stream():
+        pending = set()
+        index = 0
+        try:
+            async for name, data in _iter_batch_inputs(files):
+                for task in task_list:
+                    if len(pending) >= BATCH_STREAM_WINDOW:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for fut in done:
+                            yield json.dumps(fut.result()) + "\n"
+                    pending.add(asyncio.ensure_future(
+                        _batch_item(index, name, task, data, annotation, quality, max_dim, tta)
+                    ))
+                    index += 1
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    yield json.dumps(fut.result()) + "\n"
+        finally:
+            for fut in pending:
+                fut.cancel()
+            await form.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -0,0 +1,289 @@
+"""
+INT8 post-training quantization for the YOLO models served by main.py and
+aesthetic_routes.py.
+
+Exports the FP32 model (ONNX or OpenVINO IR), calibrates on a folder of
+sample images, writes the INT8 model where the serving layer looks for it,
+and reports the accuracy delta against FP32 (box mAP@0.5 using the FP32
+detections as reference, plus top-1 agreement) and the CPU speedup.
+
+    # a task from the main.py catalog -> MODEL_DIR, served with MODEL_VARIANT=int8
+    python quantize.py --task fracture --images calib/fracture --backend onnx
+
+    # any weights file (e.g. an aesthetic model) -> next to the weights,
+    # served with AESTHETIC_MODEL_VARIANT=int8
+    python quantize.py --weights "Modeller/Medical Aesthetic/Acne.pt" --images calib/acne
+
+ONNX uses onnxruntime.quantization (static QDQ by default, --dynamic for
+weight-only); OpenVINO uses NNCF. Both are optional dependencies.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+import main  # noqa: E402
+
+IMAGE_EXTS = ("png", "jpg", "jpeg", "bmp", "webp")
+
+
+# -------------------------
+# Calibration data
+# -------------------------
+def load_samples(folder: str, bgr: bool, limit: int) -> List[np.ndarray]:
+    """Images exactly as the serving path hands them to Ultralytics.
+
+    main.py passes RGB arrays from _decode_rgb; aesthetic_routes.py passes
+    BGR frames from cv2.imdecode.
+    """
+    paths = sorted(p for ext in IMAGE_EXTS for p in glob.glob(os.path.join(folder, f"*.{ext}")))
+    if not paths:
+        raise SystemExit(f"No images found in {folder}")
+    out = []
+    for p in paths[:limit]:
+        with open(p, "rb") as f:
+            data = f.read()
+        if bgr:
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        else:
+            img = main._decode_rgb(data)[0]
+        if img is not None:
+            out.append(img)
+    return out
+
+
+def letterbox_tensor(img: np.ndarray, size: int) -> np.ndarray:
+    """Ultralytics-style preprocessing: letterbox to size, channel flip, NCHW float32 in [0, 1]."""
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    resized = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas[top:top + nh, left:left + nw] = resized
+    # Ultralytics treats numpy input as BGR and flips it
+    chw = canvas[..., ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(chw, dtype=np.float32)[None] / 255.0
+
+
+# -------------------------
+# Quantizers
+# -------------------------
+def quantize_onnx(fp32: str, int8: str, samples: List[np.ndarray], imgsz: int, dynamic: bool):
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static,
+    )
+
+    if dynamic:
+        quantize_dynamic(fp32, int8, weight_type=QuantType.QInt8)
+    else:
+        input_name = onnx.load(fp32, load_external_data=False).graph.input[0].name
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self._it = iter({input_name: letterbox_tensor(s, imgsz)} for s in samples)
+
+            def get_next(self):
+                return next(self._it, None)
+
+        quantize_static(
+            fp32, int8, Reader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+    # Ultralytics reads task/names/stride from the ONNX metadata
+    src, dst = onnx.load(fp32), onnx.load(int8)
+    del dst.metadata_props[:]
+    dst.metadata_props.extend(src.metadata_props)
+    onnx.save(dst, int8)
+
+
+def quantize_openvino(fp32_dir: str, int8_dir: str, samples: List[np.ndarray], imgsz: int):
+    import nncf
+    import openvino as ov
+
+    xml = next(f for f in os.listdir(fp32_dir) if f.endswith(".xml"))
+    core = ov.Core()
+    model = core.read_model(os.path.join(fp32_dir, xml))
+    dataset = nncf.Dataset(samples, lambda s: letterbox_tensor(s, imgsz))
+    quantized = nncf.quantize(
+        model, dataset, preset=nncf.QuantizationPreset.MIXED, subset_size=len(samples)
+    )
+    tmp = int8_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    ov.save_model(quantized, os.path.join(tmp, xml))
+    for extra in os.listdir(fp32_dir):
+        if extra.endswith(".yaml"):  # metadata.yaml: task, names, stride
+            shutil.copy(os.path.join(fp32_dir, extra), tmp)
+    shutil.rmtree(int8_dir, ignore_errors=True)
+    os.replace(tmp, int8_dir)
+
+
+# -------------------------
+# Evaluation
+# -------------------------
+def _iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def _detections(res) -> Dict[str, np.ndarray]:
+    boxes = getattr(res, "boxes", None)
+    if boxes is None or len(boxes) == 0:
+        return {"xyxy": np.zeros((0, 4)), "conf": np.zeros(0), "cls": np.zeros(0, int)}
+    def _np(t):
+        return t.detach().cpu().numpy() if hasattr(t, "detach") else np.asarray(t)
+    return {"xyxy": _np(boxes.xyxy), "conf": _np(boxes.conf), "cls": _np(boxes.cls).astype(int)}
+
+
+def map50_against_reference(ref: List[Dict], pred: List[Dict]) -> Optional[float]:
+    """mAP@0.5 of pred detections, treating the FP32 detections as ground truth."""
+    classes = sorted({int(c) for r in ref for c in r["cls"]})
+    if not classes:
+        return None
+    aps = []
+    for c in classes:
+        n_gt = sum(int((r["cls"] == c).sum()) for r in ref)
+        scored = []  # (conf, is_true_positive)
+        for r, p in zip(ref, pred):
+            gt = r["xyxy"][r["cls"] == c]
+            used = np.zeros(len(gt), dtype=bool)
+            mask = p["cls"] == c
+            for i in np.argsort(-p["conf"][mask]):
+                box = p["xyxy"][mask][i]
+                tp = False
+                if len(gt):
+                    ious = _iou(box, gt)
+                    ious[used] = 0
+                    j = int(np.argmax(ious))
+                    if ious[j] >= 0.5:
+                        used[j] = tp = True
+                scored.append((float(p["conf"][mask][i]), tp))
+        if not scored:
+            aps.append(0.0)
+            continue
+        scored.sort(key=lambda x: -x[0])
+        tps = np.cumsum([t for _, t in scored])
+        fps = np.cumsum([not t for _, t in scored])
+        recall = tps / float(n_gt)
+        precision = tps / np.maximum(tps + fps, 1e-9)
+        # all-point interpolation
+        mrec = np.concatenate(([0.0], recall, [1.0]))
+        mpre = np.concatenate(([1.0], precision, [0.0]))
+        mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+        idx = np.where(mrec[1:] != mrec[:-1])[0]
+        aps.append(float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1])))
+    return float(np.mean(aps))
+
+
+def _top1(res) -> Optional[int]:
+    if getattr(res, "probs", None) is not None:
+        return int(res.probs.top1)
+    det = _detections(res)
+    return int(det["cls"][int(np.argmax(det["conf"]))]) if len(det["conf"]) else None
+
+
+def evaluate(fp32_path: str, int8_path: str, samples: List[np.ndarray], kwargs: Dict) -> Dict:
+    main.load_yolo()
+    timings, outputs = {}, {}
+    for name, path in (("fp32", fp32_path), ("int8", int8_path)):
+        model = main.YOLO(path)
+        model(samples[0], **kwargs)  # warm
+        per_image, results = [], []
+        for s in samples:
+            t0 = time.perf_counter()
+            results.append(model(s, verbose=False, **kwargs)[0])
+            per_image.append((time.perf_counter() - t0) * 1000)
+        timings[name] = statistics.median(per_image)
+        outputs[name] = results
+    ref = [_detections(r) for r in outputs["fp32"]]
+    pred = [_detections(r) for r in outputs["int8"]]
+    agree = [_top1(a) == _top1(b) for a, b in zip(outputs["fp32"], outputs["int8"])]
+    return {
+        "images": len(samples),
+        "fp32_p50_ms": round(timings["fp32"], 2),
+        "int8_p50_ms": round(timings["int8"], 2),
+        "speedup": round(timings["fp32"] / max(timings["int8"], 1e-9), 2),
+        "box_map50_vs_fp32": map50_against_reference(ref, pred),
+        "top1_agreement": round(sum(agree) / float(len(agree)), 4),
+        "fp32_size_mb": round(_size(fp32_path) / 1e6, 2),
+        "int8_size_mb": round(_size(int8_path) / 1e6, 2),
+    }
+
+
+def _size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+# -------------------------
+# CLI
+# -------------------------
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--task", help="task name from the main.py catalog")
+    src.add_argument("--weights", help="path to a .pt file (output goes next to it)")
+    ap.add_argument("--images", required=True, help="folder of calibration images")
+    ap.add_argument("--eval-images", help="held-out folder for the accuracy report (default: --images)")
+    ap.add_argument("--backend", choices=("onnx", "openvino"), default="onnx")
+    ap.add_argument("--imgsz", type=int, default=0, help="input size (default: catalog imgsz or 640)")
+    ap.add_argument("--dynamic", action="store_true", help="ONNX weight-only dynamic quantization")
+    ap.add_argument("--limit", type=int, default=300, help="max calibration images")
+    args = ap.parse_args()
+
+    if args.task:
+        task = args.task.strip().lower()
+        if task not in main.TASKS:
+            raise SystemExit(f"Unknown task '{task}'")
+        entry = main.TASKS[task]
+        weights = entry["path"] or main._download_once(entry["url"], entry["sha256"])
+        imgsz = args.imgsz or int(entry["imgsz"] or 640)
+        out_dir, bgr, kwargs = main.MODEL_DIR, False, main._predict_kwargs(task)
+        kwargs.pop("imgsz", None)
+    else:
+        weights = args.weights
+        imgsz = args.imgsz or 640
+        out_dir, bgr, kwargs = os.path.dirname(os.path.abspath(weights)), True, {}
+
+    fp32 = main.export_model(weights, args.backend, imgsz, main.artifact_path(weights, args.backend, imgsz, "fp32", out_dir))
+    int8 = main.artifact_path(weights, args.backend, imgsz, "int8", out_dir)
+    samples = load_samples(args.images, bgr, args.limit)
+    print(f"Calibrating {os.path.basename(weights)} on {len(samples)} images ({args.backend}, imgsz {imgsz})")
+    if args.backend == "onnx":
+        quantize_onnx(fp32, int8, samples, imgsz, args.dynamic)
+    else:
+        quantize_openvino(fp32, int8, samples, imgsz)
+
+    eval_samples = load_samples(args.eval_images, bgr, args.limit) if args.eval_images else samples
+    report = {"weights": weights, "backend": args.backend, "imgsz": imgsz, "fp32": fp32, "int8": int8,
+              **evaluate(fp32, int8, eval_samples, {**kwargs, "imgsz": imgsz})}
+    report_path = (int8[:-5] if int8.endswith(".onnx") else int8) + ".report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Report written to {report_path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,187 @@
+"""
+Result file store for generated reports (annotated images, PDFs).
+
+Names are content-addressed by the caller (e.g. the upload's SHA-256), so two
+requests never overwrite each other's output and identical uploads share one
+file. Writes go to a unique temporary name and are moved into place with
+os.replace, which keeps concurrent writers of the same name safe.
+
+A background sweeper drops entries older than ``ttl_s`` and then the oldest
+entries until the total size is under ``max_bytes``. With ``mode="memory"``
+nothing touches the disk: bytes live in an LRU dict under the same limits,
+for small deployments without a writable volume.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+class ResultStore:
+    def __init__(self, root: Path, mode: str = "disk", ttl_s: float = 86400.0,
+                 max_bytes: int = 512 * 1024 * 1024, sweep_every_s: float = 60.0):
+        if mode not in ("disk", "memory"):
+            raise ValueError(f"Unknown result store mode: {mode}")
+        self.root = Path(root)
+        self.mode = mode
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.sweep_every_s = sweep_every_s
+        self._lock = threading.Lock()
+        # memory mode: name -> (bytes, stored_at), oldest first
+        self._mem: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._mem_bytes = 0
+        self._sweeper: Optional[threading.Thread] = None
+        if mode == "disk":
+            self.root.mkdir(parents=True, exist_ok=True)
+
+    # ---- read / write ----
+
+    def exists(self, name: str) -> bool:
+        if self.mode == "memory":
+            with self._lock:
+                return name in self._mem
+        return (self.root / name).is_file()
+
+    def path(self, name: str) -> Optional[Path]:
+        """On-disk path of a stored entry (None in memory mode or if missing)."""
+        if self.mode == "memory":
+            return None
+        p = self.root / name
+        return p if p.is_file() else None
+
+    def read(self, name: str) -> Optional[bytes]:
+        if self.mode == "memory":
+            with self._lock:
+                item = self._mem.get(name)
+                if item is None:
+                    return None
+                self._mem.move_to_end(name)
+                return item[0]
+        try:
+            return (self.root / name).read_bytes()
+        except OSError:
+            return None
+
+    def write(self, name: str, data: bytes):
+        if os.sep in name or name.startswith("."):
+            raise ValueError(f"Invalid result name: {name}")
+        if self.mode == "memory":
+            with self._lock:
+                old = self._mem.pop(name, None)
+                if old is not None:
+                    self._mem_bytes -= len(old[0])
+                self._mem[name] = (data, time.time())
+                self._mem_bytes += len(data)
+                self._evict_memory()
+            return
+        target = self.root / name
+        tmp = self.root / f".{name}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def touch(self, name: str):
+        """Refresh an entry's age when an identical result is requested again."""
+        if self.mode == "memory":
+            with self._lock:
+                if name in self._mem:
+                    data, _ = self._mem.pop(name)
+                    self._mem[name] = (data, time.time())
+            return
+        try:
+            os.utime(self.root / name)
+        except OSError:
+            pass
+
+    # ---- retention ----
+
+    def _evict_memory(self):
+        cutoff = time.time() - self.ttl_s
+        while self._mem:
+            name, (data, stored_at) = next(iter(self._mem.items()))
+            if stored_at >= cutoff and self._mem_bytes <= self.max_bytes:
+                break
+            self._mem.popitem(last=False)
+            self._mem_bytes -= len(data)
+
+    def sweep(self) -> Dict[str, int]:
+        """Apply TTL and the size cap once; returns {"removed": n, "bytes": remaining}."""
+        if self.mode == "memory":
+            with self._lock:
+                before = len(self._mem)
+                self._evict_memory()
+                return {"removed": before - len(self._mem), "bytes": self._mem_bytes}
+
+        now = time.time()
+        entries = []
+        removed = 0
+        with os.scandir(self.root) as it:
+            for e in it:
+                if not e.is_file():
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                # leftovers of crashed writers
+                if e.name.endswith(".part"):
+                    if now - st.st_mtime > 3600:
+                        self._unlink(e.path)
+                    continue
+                if now - st.st_mtime > self.ttl_s:
+                    removed += self._unlink(e.path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if self._unlink(p):
+                removed += 1
+                total -= size
+        return {"removed": removed, "bytes": total}
+
+    @staticmethod
+    def _unlink(p) -> int:
+        try:
+            os.unlink(p)
+            return 1
+        except OSError:
+            return 0
+
+    def start_sweeper(self):
+        if self._sweeper is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.sweep_every_s)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[results] sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=loop, name="results-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stats(self) -> dict:
+        if self.mode == "memory":
+            with self._lock:
+                return {"mode": self.mode, "entries": len(self._mem), "bytes": self._mem_bytes,
+                        "max_bytes": self.max_bytes, "ttl_s": self.ttl_s}
+        n = size = 0
+        with os.scandir(self.root) as it:
+            for e in it:
+                if e.is_file() and not e.name.endswith(".part"):
+                    n += 1
+                    size += e.stat().st_size
+        return {"mode": self.mode, "entries": n, "bytes": size, "max_bytes": self.max_bytes, "ttl_s": self.ttl_s}
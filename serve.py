@@ -0,0 +1,149 @@
+"""
+Pre-fork server for main.py: load the models once, then fork the workers.
+
+`uvicorn main:app --workers N` starts N fresh interpreters and every one of
+them loads its own copy of every model, so RAM caps the worker count. Here
+the parent imports main, downloads, loads and warms the warmup models,
+freezes the GC (so collections in the children don't write to the shared
+objects' headers) and only then forks. The workers inherit the weights
+copy-on-write: inference reads them but never writes, so the pages stay
+shared and each worker only adds its own activations and interpreter state.
+
+The warm-up forward has to happen here, not in the workers: Ultralytics
+fuses Conv+BN on the first predict, which allocates new weight tensors. A
+worker doing that itself ends up with a private fused copy of every model.
+
+    python serve.py --workers 4 --port 8000
+
+The workers share one listening socket; the parent restarts a worker that
+dies and forwards SIGINT / SIGTERM. Linux / macOS only (needs fork).
+
+Only torch-backend models are loaded before the fork. ONNX Runtime and
+OpenVINO sessions own thread pools that do not survive fork, so tasks on
+those backends are loaded by each worker as before.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def preload(main) -> list:
+    """Download, load and warm (fuse) the warmup tasks that can be shared; returns their names.
+
+    Workers find these in main.WARMED and skip their own startup warm-up.
+    """
+    shared = [t for t in main.warmup_tasks() if main.TASKS[t]["backend"] == "torch"]
+    skipped = sorted(set(main.warmup_tasks()) - set(shared))
+    if skipped:
+        print(f"[serve] not preloading {', '.join(skipped)} (non-torch backend; loaded per worker)")
+    main.download_all_models(shared)
+    loaded = []
+    for task in shared:
+        try:
+            t0 = time.perf_counter()
+            main.load_model(task)
+            main.warm_model(task)
+            main.MODEL_STATE[task]["timings_s"]["preload"] = round(time.perf_counter() - t0, 3)
+            main._set_state(task, "ready")
+            loaded.append(task)
+            print(f"[serve] loaded and warmed {task} in {time.perf_counter() - t0:.1f}s")
+        except Exception as e:
+            print(f"[serve] preload {task} failed, workers will retry: {e}")
+    return loaded
+
+
+def bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, args):
+    import uvicorn
+
+    # the parent's signal handlers must not leak into uvicorn
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config("main:app", log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, args)
+        except BaseException as e:
+            print(f"[serve] worker {os.getpid()} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    ap.add_argument("--log-level", default="info")
+    ap.add_argument("--keep-alive", type=int, default=5)
+    ap.add_argument("--no-preload", action="store_true", help="fork first (per-worker loading, for comparison)")
+    args = ap.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs os.fork; use `uvicorn main:app --workers N` on this platform")
+
+    import main
+
+    if not args.no_preload:
+        preload(main)
+    sock = bind(args.host, args.port)
+
+    # everything allocated so far is shared with the workers; keep the
+    # cyclic GC from touching (and so copying) those objects' pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {spawn(sock, args) for _ in range(args.workers)}
+    print(f"[serve] {len(workers)} workers on {args.host}:{args.port}: {sorted(workers)}")
+
+    stopping = False
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"[serve] worker {pid} exited ({status}); restarting")
+            workers.add(spawn(sock, args))
+    sock.close()
+
+
+if __name__ == "__main__":
+    main_cli()